@@ -11,6 +11,10 @@ class Carrito:
     """
     Clase que gestiona el carrito de compras usando sesiones de Django.
     
+    Las líneas del carrito se cargan de la base de datos como máximo una vez
+    por petición; las líneas, el total y la cantidad se memorizan hasta que
+    el carrito se modifica.
+    
     Atributos:
         session: Sesión de Django donde se almacena el carrito.
         carrito: Diccionario con los items del carrito.
@@ -20,17 +24,21 @@ class Carrito:
         """
         Inicializa el carrito desde la sesión del usuario.
         
+        Un carrito vacío no se escribe en la sesión: solo se guarda al
+        agregar el primer producto (ver guardar()).
+        
         Args:
             request: Objeto HttpRequest de Django.
         """
         self.session = request.session
-        carrito = self.session.get('carrito')
-        
-        if not carrito:
-            # Crear carrito vacío en la sesión
-            carrito = self.session['carrito'] = {}
-        
-        self.carrito = carrito
+        self.carrito = self.session.get('carrito') or {}
+        self._olvidar_calculos()
+    
+    def _olvidar_calculos(self):
+        """Descarta las líneas y totales memorizados."""
+        self._items = None
+        self._total = None
+        self._cantidad = None
     
     def agregar(self, presentacion, cantidad=1):
         """
@@ -82,50 +90,107 @@ class Carrito:
             self.guardar()
     
     def guardar(self):
-        """Marca la sesión como modificada para guardar cambios."""
+        """
+        Escribe el carrito en la sesión y la marca como modificada.
+        
+        Si el carrito quedó vacío se elimina de la sesión en lugar de
+        guardar un diccionario vacío.
+        """
+        if self.carrito:
+            self.session['carrito'] = self.carrito
+        else:
+            self.session.pop('carrito', None)
         self.session.modified = True
+        self._olvidar_calculos()
     
     def limpiar(self):
         """Vacía completamente el carrito."""
-        del self.session['carrito']
+        self.carrito = {}
         self.guardar()
     
-    def __iter__(self):
+    def _cargar_items(self):
         """
-        Itera sobre los items del carrito con información completa.
+        Construye las líneas del carrito con una sola consulta.
         
-        Yields:
-            dict: Diccionario con datos del item (presentacion, cantidad, precio, subtotal).
+        Los diccionarios retornados son nuevos: no se modifica el contenido
+        de la sesión, que debe seguir siendo serializable.
+        
+        Returns:
+            list: Líneas con presentacion, cantidad, precio y subtotal.
         """
-        presentacion_ids = self.carrito.keys()
-        presentaciones = Presentacion.objects.filter(id__in=presentacion_ids).select_related(
+        if not self.carrito:
+            return []
+        
+        presentaciones = Presentacion.objects.select_related(
             'producto', 'producto__categoria', 'producto__marca'
-        )
+        ).in_bulk([int(pk) for pk in self.carrito])
         
-        carrito = self.carrito.copy()
+        items = []
+        for presentacion_id, datos in self.carrito.items():
+            presentacion = presentaciones.get(int(presentacion_id))
+            if presentacion is None:
+                continue
+            precio = Decimal(datos['precio'])
+            items.append({
+                'presentacion': presentacion,
+                'cantidad': datos['cantidad'],
+                'precio': precio,
+                'subtotal': precio * datos['cantidad'],
+            })
+        return items
+    
+    @property
+    def items(self):
+        """
+        Retorna las líneas del carrito, consultándolas solo la primera vez.
         
-        for presentacion in presentaciones:
-            carrito[str(presentacion.id)]['presentacion'] = presentacion
+        Returns:
+            list: Diccionarios con presentacion, cantidad, precio y subtotal.
+        """
+        if self._items is None:
+            self._items = self._cargar_items()
+        return self._items
+    
+    def __iter__(self):
+        """
+        Itera sobre los items del carrito con información completa.
         
-        for item in carrito.values():
-            if 'presentacion' in item:
-                item['precio'] = Decimal(item['precio'])
-                item['subtotal'] = item['precio'] * item['cantidad']
-                yield item
+        Yields:
+            dict: Diccionario con datos del item (presentacion, cantidad, precio, subtotal).
+        """
+        return iter(self.items)
     
     def __len__(self):
         """Retorna el número total de items en el carrito."""
-        return sum(item['cantidad'] for item in self.carrito.values())
+        if self._cantidad is None:
+            self._cantidad = sum(item['cantidad'] for item in self.carrito.values())
+        return self._cantidad
     
     @property
     def total(self):
         """Calcula el total del carrito."""
-        return sum(
-            Decimal(item['precio']) * item['cantidad']
-            for item in self.carrito.values()
-        )
+        if self._total is None:
+            self._total = sum(
+                (Decimal(item['precio']) * item['cantidad']
+                 for item in self.carrito.values()),
+                Decimal('0')
+            )
+        return self._total
     
     @property
     def cantidad_items(self):
         """Retorna la cantidad de items únicos en el carrito."""
         return len(self.carrito)
+    
+    @property
+    def resumen(self):
+        """
+        Resumen del carrito para la cabecera, calculado sin consultar la base de datos.
+        
+        Returns:
+            dict: Cantidad total de unidades y monto total del carrito.
+        """
+        return {
+            'cantidad': len(self),
+            'total': self.total,
+        }
@@ -3,6 +3,8 @@ Context processors para el carrito.
 
 Hace disponible el carrito en todas las plantillas.
 """
+from django.utils.functional import SimpleLazyObject
+
 from .carrito import Carrito
 
 
@@ -10,7 +12,16 @@ def carrito(request):
     """
     Añade el carrito al contexto de todas las plantillas.
     
+    El carrito es perezoso: la sesión solo se lee cuando una plantilla
+    usa 'carrito', y nunca se escribe si el carrito está vacío.
+    
+    Si la página se está renderizando para la caché compartida del catálogo,
+    se entrega un carrito vacío y 'carrito_diferido' para que el navegador
+    complete el contador consultando 'carrito:resumen'.
+    
     Retorna:
         dict: Diccionario con el carrito disponible como 'carrito'.
     """
-    return {'carrito': Carrito(request)}
+    if getattr(request, 'pagina_en_cache', False):
+        return {'carrito': (), 'carrito_diferido': True}
+    return {'carrito': SimpleLazyObject(lambda: Carrito(request))}
@@ -1,3 +1,170 @@
-from django.test import TestCase
+"""
+Pruebas unitarias para la aplicación del carrito.
 
-# Create your tests here.
+Este módulo contiene las pruebas para la clase Carrito, su context
+processor y las vistas del carrito.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+
+from apps.catalogo.models import Categoria, Producto, Presentacion
+from .carrito import Carrito
+from .context_processors import carrito as carrito_context
+
+
+class CarritoSesionTest(TestCase):
+    """Pruebas de cuándo el carrito lee y escribe la sesión."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.factory = RequestFactory()
+        categoria = Categoria.objects.create(nombre='Plantas')
+        producto = Producto.objects.create(
+            nombre='Anubias',
+            categoria=categoria,
+            descripcion_corta='Planta de acuario'
+        )
+        self.presentacion = Presentacion.objects.create(
+            producto=producto,
+            nombre='Maceta 5cm',
+            precio=Decimal('15.00'),
+            stock=10
+        )
+
+    def _request(self):
+        """Crea una petición con una sesión nueva y vacía."""
+        request = self.factory.get('/')
+        request.session = SessionStore()
+        return request
+
+    def test_carrito_vacio_no_escribe_sesion(self):
+        """Verifica que crear un carrito vacío no modifica la sesión."""
+        request = self._request()
+        carrito = Carrito(request)
+
+        self.assertEqual(len(carrito), 0)
+        self.assertFalse(request.session.modified)
+        self.assertNotIn('carrito', request.session)
+
+    def test_context_processor_no_lee_sesion(self):
+        """Verifica que la sesión solo se lee cuando se usa el carrito."""
+        request = self._request()
+        contexto = carrito_context(request)
+
+        self.assertFalse(request.session.accessed)
+        self.assertEqual(len(contexto['carrito']), 0)
+        self.assertTrue(request.session.accessed)
+        self.assertFalse(request.session.modified)
+
+    def test_agregar_y_vaciar(self):
+        """Verifica que el carrito se guarda al agregar y se borra al vaciarse."""
+        request = self._request()
+        carrito = Carrito(request)
+
+        carrito.agregar(self.presentacion, 2)
+        self.assertEqual(request.session['carrito'][str(self.presentacion.id)]['cantidad'], 2)
+        self.assertEqual(carrito.total, Decimal('30.00'))
+
+        carrito.eliminar(self.presentacion)
+        self.assertNotIn('carrito', request.session)
+
+    def test_limpiar_sin_carrito(self):
+        """Verifica que limpiar un carrito inexistente no falla."""
+        request = self._request()
+        Carrito(request).limpiar()
+
+        self.assertNotIn('carrito', request.session)
+
+    def test_visita_anonima_sin_cookie(self):
+        """Verifica que ver el carrito vacío no crea sesión ni cookie."""
+        response = self.client.get(reverse('carrito:detalle'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_agregar_crea_cookie(self):
+        """Verifica que al agregar un producto sí se crea la sesión."""
+        response = self.client.post(
+            reverse('carrito:agregar', args=[self.presentacion.id]),
+            {'cantidad': 1}
+        )
+
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertIn('carrito', self.client.session)
+
+
+class CarritoMemoriaTest(TestCase):
+    """Pruebas de la carga única de las líneas del carrito."""
+
+    def setUp(self):
+        """Crea un carrito con dos presentaciones."""
+        categoria = Categoria.objects.create(nombre='Filtros')
+        producto = Producto.objects.create(
+            nombre='Filtro externo',
+            categoria=categoria,
+            descripcion_corta='Filtro de cartucho'
+        )
+        self.presentaciones = [
+            Presentacion.objects.create(
+                producto=producto,
+                nombre=nombre,
+                precio=precio,
+                stock=10
+            )
+            for nombre, precio in (('600 L/h', Decimal('120.00')), ('1000 L/h', Decimal('180.50')))
+        ]
+        self.request = RequestFactory().get('/')
+        self.request.session = SessionStore()
+        self.carrito = Carrito(self.request)
+        self.carrito.agregar(self.presentaciones[0], 2)
+        self.carrito.agregar(self.presentaciones[1], 1)
+
+    def test_una_consulta_por_peticion(self):
+        """Verifica que recorrer el carrito varias veces hace una sola consulta."""
+        carrito = Carrito(self.request)
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                items = list(carrito)
+                self.assertEqual(items[0]['presentacion'].producto.categoria.nombre, 'Filtros')
+            self.assertEqual(carrito.total, Decimal('420.50'))
+            self.assertEqual(len(carrito), 3)
+
+        self.assertEqual(items[0]['subtotal'], Decimal('240.00'))
+
+    def test_resumen_sin_consultas(self):
+        """Verifica que el resumen de la cabecera no consulta la base de datos."""
+        carrito = Carrito(self.request)
+        with self.assertNumQueries(0):
+            resumen = carrito.resumen
+
+        self.assertEqual(resumen, {'cantidad': 3, 'total': Decimal('420.50')})
+
+    def test_modificar_recalcula(self):
+        """Verifica que modificar el carrito descarta los valores memorizados."""
+        self.assertEqual(len(list(self.carrito)), 2)
+
+        self.carrito.eliminar(self.presentaciones[1])
+
+        self.assertEqual(len(list(self.carrito)), 1)
+        self.assertEqual(self.carrito.total, Decimal('240.00'))
+        self.assertEqual(len(self.carrito), 2)
+
+    def test_sesion_no_recibe_objetos(self):
+        """Verifica que recorrer el carrito no guarda objetos en la sesión."""
+        list(self.carrito)
+
+        datos = self.request.session['carrito'][str(self.presentaciones[0].id)]
+        self.assertEqual(set(datos), {'cantidad', 'precio'})
+
+    def test_presentacion_eliminada_se_omite(self):
+        """Verifica que una presentación borrada no aparece en el carrito."""
+        self.presentaciones[1].delete()
+
+        items = list(Carrito(self.request))
+
+        self.assertEqual([item['presentacion'] for item in items], [self.presentaciones[0]])
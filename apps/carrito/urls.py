@@ -8,6 +8,7 @@ app_name = 'carrito'
 
 urlpatterns = [
     path('', views.carrito_detalle, name='detalle'),
+    path('resumen/', views.carrito_resumen, name='resumen'),
     path('agregar/<int:presentacion_id>/', views.carrito_agregar, name='agregar'),
     path('eliminar/<int:presentacion_id>/', views.carrito_eliminar, name='eliminar'),
     path('actualizar/<int:presentacion_id>/', views.carrito_actualizar, name='actualizar'),
@@ -2,9 +2,11 @@
 Vistas para el carrito de compras.
 """
 from django.shortcuts import render, redirect, get_object_or_404
+from django.views.decorators.cache import never_cache
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib import messages
+from django.middleware.csrf import get_token
 
 from apps.catalogo.models import Presentacion
 from .carrito import Carrito
@@ -21,6 +23,23 @@ def carrito_detalle(request):
     })
 
 
+@never_cache
+def carrito_resumen(request):
+    """
+    Retorna en JSON el resumen del carrito y el token CSRF del visitante.
+    
+    Lo usan las páginas del catálogo servidas desde caché para completar
+    el contador del carrito y los formularios de "Agregar".
+    """
+    resumen = Carrito(request).resumen
+    
+    return JsonResponse({
+        'cantidad_carrito': resumen['cantidad'],
+        'total_carrito': str(resumen['total']),
+        'csrf_token': get_token(request),
+    })
+
+
 @require_POST
 def carrito_agregar(request, presentacion_id):
     """
@@ -6,12 +6,84 @@ categorías, marcas, productos, presentaciones e imágenes de manera eficiente.
 """
 
 from django.contrib import admin
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
 from django.utils.html import format_html
 
 from .models import (
     Categoria, Marca, Producto, Presentacion, 
-    ImagenProducto, VideoProducto, EspecificacionProducto
+    ImagenProducto, VideoProducto, EspecificacionProducto, TrabajoImagen
 )
+from .busqueda import buscar
+from .utils import url_variante, variantes_vigentes
+
+
+def _con_ultimo_trabajo(queryset, campo):
+    """
+    Anota el estado y el error del último trabajo de la cola de cada registro.
+    
+    Así _estado_optimizacion no consulta la cola por cada fila del listado.
+    
+    Args:
+        queryset: QuerySet del modelo con la imagen.
+        campo (str): Nombre del campo de imagen.
+    
+    Returns:
+        QuerySet: Con los atributos trabajo_estado y trabajo_error.
+    """
+    trabajos = TrabajoImagen.objects.filter(
+        modelo=queryset.model._meta.label,
+        objeto_id=OuterRef('pk'),
+        campo=campo,
+    ).order_by('-creado', '-pk')
+    return queryset.annotate(
+        trabajo_estado=Subquery(trabajos.values('estado')[:1]),
+        trabajo_error=Subquery(trabajos.values('ultimo_error')[:1]),
+    )
+
+
+def _estado_optimizacion(obj, campo, campo_variantes):
+    """
+    Muestra si la imagen ya se optimizó (con sus dimensiones y peso) o el
+    estado de su trabajo en la cola.
+    
+    Usa el último trabajo anotado por _con_ultimo_trabajo si lo hay; si no,
+    lo consulta.
+    
+    Args:
+        obj: Registro con la imagen.
+        campo (str): Nombre del campo de imagen.
+        campo_variantes (str): Nombre del campo de variantes.
+    """
+    imagen = getattr(obj, campo)
+    if not imagen or not obj.pk:
+        return '-'
+    if getattr(obj, campo_variantes) and variantes_vigentes(imagen, getattr(obj, campo_variantes)):
+        ancho, alto, peso = (getattr(obj, f'{campo}_{dato}') for dato in ('ancho', 'alto', 'peso'))
+        if ancho and alto and peso:
+            return format_html(
+                '<span style="color: #28a745;">✔ Optimizada</span><br><small>{}×{} px · {}</small>',
+                ancho, alto, filesizeformat(peso)
+            )
+        return format_html('<span style="color: #28a745;">✔ Optimizada</span>')
+    
+    if not hasattr(obj, 'trabajo_estado'):
+        trabajo = TrabajoImagen.ultimo_de(obj, campo)
+    elif obj.trabajo_estado:
+        trabajo = TrabajoImagen(estado=obj.trabajo_estado, ultimo_error=obj.trabajo_error)
+    else:
+        trabajo = None
+    if trabajo is None:
+        return format_html('<span style="color: #999;">Sin optimizar</span>')
+    colores = {'fallido': '#dc3545', 'procesando': '#0d6efd'}
+    return format_html(
+        '<span style="color: {};" title="{}">{}</span>',
+        colores.get(trabajo.estado, '#fd7e14'),
+        trabajo.ultimo_error,
+        trabajo.get_estado_display()
+    )
 
 
 class ImagenProductoInline(admin.TabularInline):
@@ -23,18 +95,27 @@ class ImagenProductoInline(admin.TabularInline):
     """
     model = ImagenProducto
     extra = 1
-    fields = ['imagen', 'titulo', 'es_principal', 'mostrar_en_galeria', 'mostrar_en_descripcion', 'orden']
-    readonly_fields = ['mostrar_preview']
+    fields = ['imagen', 'titulo', 'es_principal', 'mostrar_en_galeria', 'mostrar_en_descripcion', 'orden', 'mostrar_optimizacion']
+    readonly_fields = ['mostrar_preview', 'mostrar_optimizacion']
+    
+    def get_queryset(self, request):
+        """Incluye el estado de optimización de cada imagen en la misma consulta."""
+        return _con_ultimo_trabajo(super().get_queryset(request), 'imagen')
     
     def mostrar_preview(self, obj):
         """Muestra una miniatura de la imagen."""
         if obj.imagen:
             return format_html(
                 '<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 5px;" />',
-                obj.imagen.url
+                url_variante(obj.variantes, 'thumbnail') or obj.imagen.url
             )
         return '-'
     mostrar_preview.short_description = 'Vista previa'
+    
+    def mostrar_optimizacion(self, obj):
+        """Muestra el estado de la conversión a WebP."""
+        return _estado_optimizacion(obj, 'imagen', 'variantes')
+    mostrar_optimizacion.short_description = 'Optimización'
 
 
 class VideoProductoInline(admin.TabularInline):
@@ -96,7 +177,7 @@ class CategoriaAdmin(admin.ModelAdmin):
     list_filter = ['activo', 'categoria_padre', 'fecha_creacion']
     search_fields = ['nombre', 'descripcion']
     prepopulated_fields = {'slug': ('nombre',)}
-    readonly_fields = ['fecha_creacion', 'fecha_actualizacion', 'mostrar_imagen_grande', 'mostrar_ruta_completa']
+    readonly_fields = ['fecha_creacion', 'fecha_actualizacion', 'mostrar_imagen_grande', 'mostrar_optimizacion', 'mostrar_ruta_completa']
     ordering = ['categoria_padre__nombre', 'orden', 'nombre']
     # No usar autocomplete_fields para poder filtrar con formfield_for_foreignkey
     
@@ -110,7 +191,7 @@ class CategoriaAdmin(admin.ModelAdmin):
                           'Selecciona una categoría padre para crear una subcategoría.'
         }),
         ('Imagen', {
-            'fields': ('imagen', 'mostrar_imagen_grande')
+            'fields': ('imagen', 'mostrar_imagen_grande', 'mostrar_optimizacion')
         }),
         ('Configuración', {
             'fields': ('activo', 'orden')
@@ -126,7 +207,7 @@ class CategoriaAdmin(admin.ModelAdmin):
         if obj.imagen:
             return format_html(
                 '<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 5px;" />',
-                obj.imagen.url
+                url_variante(obj.imagen_variantes, 'thumbnail') or obj.imagen.url
             )
         return '-'
     mostrar_imagen.short_description = 'Imagen'
@@ -136,11 +217,16 @@ class CategoriaAdmin(admin.ModelAdmin):
         if obj.imagen:
             return format_html(
                 '<img src="{}" width="200" style="border-radius: 10px;" />',
-                obj.imagen.url
+                url_variante(obj.imagen_variantes, 'card') or obj.imagen.url
             )
         return 'Sin imagen'
     mostrar_imagen_grande.short_description = 'Vista previa'
     
+    def mostrar_optimizacion(self, obj):
+        """Muestra el estado de la conversión a WebP."""
+        return _estado_optimizacion(obj, 'imagen', 'imagen_variantes')
+    mostrar_optimizacion.short_description = 'Optimización'
+    
     def mostrar_nombre_jerarquico(self, obj):
         """Muestra el nombre con indentación visual según nivel de jerarquía."""
         if obj.categoria_padre:
@@ -202,7 +288,7 @@ class MarcaAdmin(admin.ModelAdmin):
     Proporciona una interfaz para gestionar las marcas de productos.
     """
     
-    list_display = ['nombre', 'slug', 'mostrar_logo', 'activo']
+    list_display = ['nombre', 'slug', 'mostrar_logo', 'mostrar_optimizacion', 'activo']
     list_display_links = ['nombre']
     list_editable = ['activo']
     list_filter = ['activo']
@@ -222,15 +308,24 @@ class MarcaAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        """Incluye el estado de optimización de cada logo en la misma consulta."""
+        return _con_ultimo_trabajo(super().get_queryset(request), 'logo')
+    
     def mostrar_logo(self, obj):
         """Muestra una miniatura del logo en el listado."""
         if obj.logo:
             return format_html(
                 '<img src="{}" width="50" height="50" style="object-fit: contain; border-radius: 5px;" />',
-                obj.logo.url
+                url_variante(obj.logo_variantes, 'thumbnail') or obj.logo.url
             )
         return '-'
     mostrar_logo.short_description = 'Logo'
+    
+    def mostrar_optimizacion(self, obj):
+        """Muestra el estado de la conversión a WebP."""
+        return _estado_optimizacion(obj, 'logo', 'logo_variantes')
+    mostrar_optimizacion.short_description = 'Optimización'
 
 
 @admin.register(Producto)
@@ -287,9 +382,21 @@ class ProductoAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Busca con el índice de texto completo (ver busqueda.py) en lugar de
+        recorrer la tabla con icontains sobre el HTML de la descripción.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return buscar(queryset, search_term), False
+    
     def mostrar_imagen(self, obj):
         """Muestra una miniatura de la imagen principal en el listado."""
-        imagen_url = obj.imagen_principal_url
+        imagen_url = (
+            url_variante(obj.imagen_principal_variantes, 'thumbnail')
+            or obj.imagen_tarjeta_url
+        )
         if imagen_url:
             return format_html(
                 '<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 5px;" />',
@@ -316,7 +423,7 @@ class ProductoAdmin(admin.ModelAdmin):
     
     def mostrar_precio_desde(self, obj):
         """Muestra el precio más bajo de las presentaciones."""
-        precio = obj.precio_desde
+        precio = obj.precio_min
         if precio:
             return format_html('<strong>Desde ${}</strong>', precio)
         return '-'
@@ -390,22 +497,31 @@ class ImagenProductoAdmin(admin.ModelAdmin):
     Permite gestionar las imágenes de productos de forma independiente.
     """
     
-    list_display = ['producto', 'titulo', 'mostrar_imagen', 'es_principal', 'mostrar_en_galeria', 'mostrar_en_descripcion', 'orden']
+    list_display = ['producto', 'titulo', 'mostrar_imagen', 'mostrar_optimizacion', 'es_principal', 'mostrar_en_galeria', 'mostrar_en_descripcion', 'orden']
     list_display_links = ['producto', 'titulo']
     list_editable = ['es_principal', 'mostrar_en_galeria', 'mostrar_en_descripcion', 'orden']
     list_filter = ['producto__categoria', 'es_principal', 'mostrar_en_galeria', 'mostrar_en_descripcion']
     search_fields = ['producto__nombre', 'titulo']
     ordering = ['producto', '-es_principal', 'orden']
     
+    def get_queryset(self, request):
+        """Incluye el estado de optimización de cada imagen en la misma consulta."""
+        return _con_ultimo_trabajo(super().get_queryset(request), 'imagen')
+    
     def mostrar_imagen(self, obj):
         """Muestra una miniatura de la imagen en el listado."""
         if obj.imagen:
             return format_html(
                 '<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 5px;" />',
-                obj.imagen.url
+                url_variante(obj.variantes, 'thumbnail') or obj.imagen.url
             )
         return '-'
     mostrar_imagen.short_description = 'Imagen'
+    
+    def mostrar_optimizacion(self, obj):
+        """Muestra el estado de la conversión a WebP."""
+        return _estado_optimizacion(obj, 'imagen', 'variantes')
+    mostrar_optimizacion.short_description = 'Optimización'
 
 
 @admin.register(VideoProducto)
@@ -444,3 +560,52 @@ class EspecificacionProductoAdmin(admin.ModelAdmin):
 admin.site.site_header = 'TuAcuario - Panel de Administración'
 admin.site.site_title = 'TuAcuario Admin'
 admin.site.index_title = 'Bienvenido al Panel de Administración'
+
+
+@admin.register(TrabajoImagen)
+class TrabajoImagenAdmin(admin.ModelAdmin):
+    """
+    Configuración del admin para la cola de optimización de imágenes.
+    
+    Los trabajos los procesa el comando 'procesar_imagenes'; desde aquí se
+    puede ver su estado y volver a encolar los fallidos.
+    """
+    
+    list_display = ['nombre_original', 'modelo', 'objeto_id', 'estado', 'intentos', 'creado', 'terminado']
+    list_filter = ['estado', 'modelo', 'creado']
+    search_fields = ['nombre_original']
+    readonly_fields = [
+        'modelo', 'objeto_id', 'campo', 'nombre_original', 'estado', 'intentos',
+        'proximo_intento', 'ultimo_error', 'creado', 'terminado'
+    ]
+    actions = ['reintentar']
+    
+    def has_add_permission(self, request):
+        """Los trabajos solo se crean al guardar una imagen nueva."""
+        return False
+    
+    @admin.action(description='Reintentar ahora')
+    def reintentar(self, request, queryset):
+        """
+        Vuelve a poner en cola los trabajos fallidos seleccionados.
+        
+        Solo puede haber un trabajo pendiente por imagen: si ya hay otro
+        (o se eligieron varios fallidos de la misma imagen), se reintenta
+        ese y los fallidos se marcan como reemplazados.
+        """
+        cantidad = 0
+        for trabajo in queryset.filter(estado='fallido').order_by('-creado', '-pk'):
+            try:
+                with transaction.atomic():
+                    TrabajoImagen.objects.filter(pk=trabajo.pk).update(
+                        estado='pendiente',
+                        intentos=0,
+                        proximo_intento=timezone.now(),
+                    )
+                cantidad += 1
+            except IntegrityError:
+                TrabajoImagen.objects.filter(pk=trabajo.pk).update(
+                    estado='reemplazado',
+                    terminado=timezone.now(),
+                )
+        self.message_user(request, f'{cantidad} trabajos vuelven a la cola')
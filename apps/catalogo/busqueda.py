@@ -0,0 +1,197 @@
+"""
+Búsqueda de texto completo en el catálogo.
+
+Cada producto guarda en dos campos desnormalizados el texto en el que se
+busca, ya normalizado (minúsculas, sin acentos ni HTML):
+
+- busqueda_nombre: nombre, modelo, marca y categoría (pesan más).
+- busqueda_descripcion: descripción corta y descripción detallada.
+
+El índice depende de la base de datos:
+
+- PostgreSQL: índice GIN sobre to_tsvector('spanish', ...) de los dos
+  campos (pesos A y B), que la base de datos mantiene sola. La
+  configuración 'spanish' reduce cada palabra a su raíz (stemming).
+- SQLite (desarrollo): tabla virtual FTS5 TABLA_FTS, que Producto.save()
+  mantiene con indexar(). FTS5 no tiene stemming en español; se aproxima
+  buscando cada palabra por prefijo y sin la terminación del plural.
+
+Las consultas se normalizan igual que el texto indexado, así 'planta
+acuatica' encuentra 'Plantas acuáticas'.
+
+Uso:
+    >>> buscar(Producto.objects.filter(activo=True), 'filtro canister')
+"""
+
+import html
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+
+# Configuración de PostgreSQL para el stemming en español
+CONFIGURACION = 'spanish'
+
+# Tabla virtual FTS5 con el índice en SQLite (rowid = id del producto)
+TABLA_FTS = 'catalogo_producto_fts'
+
+# Nombre del índice GIN en PostgreSQL
+INDICE_GIN = 'catalogo_producto_busqueda'
+
+# Peso de busqueda_nombre frente a busqueda_descripcion en el ranking de FTS5
+PESO_NOMBRE_FTS = 10.0
+
+
+def normalizar(texto):
+    """
+    Normaliza un texto para indexarlo o buscarlo.
+    
+    Quita las etiquetas y entidades HTML, los acentos y los espacios
+    repetidos, y lo pasa a minúsculas.
+    
+    Ejemplo:
+        >>> normalizar('<p>Plantas &amp; Acuáticas</p>')
+        'plantas & acuaticas'
+    """
+    texto = html.unescape(strip_tags(texto or ''))
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def textos_busqueda(producto):
+    """
+    Calcula los campos de búsqueda de un producto.
+    
+    Args:
+        producto: Instancia de Producto (lee su marca y su categoría).
+    
+    Returns:
+        dict: 'busqueda_nombre' y 'busqueda_descripcion'.
+    """
+    nombre = [producto.nombre, producto.modelo]
+    if producto.marca_id:
+        nombre.append(producto.marca.nombre)
+    if producto.categoria_id:
+        nombre.append(producto.categoria.nombre)
+    
+    return {
+        'busqueda_nombre': normalizar(' '.join(nombre)),
+        'busqueda_descripcion': normalizar(
+            f'{producto.descripcion_corta} {strip_tags(producto.descripcion or "")}'
+        ),
+    }
+
+
+def indexar(producto, using='default'):
+    """
+    Actualiza la entrada de un producto en el índice FTS5 de SQLite.
+    
+    En PostgreSQL no hace nada: el índice GIN se actualiza con la fila.
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [producto.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLA_FTS} (rowid, busqueda_nombre, busqueda_descripcion) '
+            'VALUES (%s, %s, %s)',
+            [producto.pk, producto.busqueda_nombre, producto.busqueda_descripcion]
+        )
+
+
+def desindexar(pk, using='default'):
+    """Elimina un producto del índice FTS5 de SQLite."""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [pk])
+
+
+def vector_busqueda():
+    """
+    Retorna la expresión tsvector de PostgreSQL de un producto.
+    
+    Es la misma expresión sobre la que está creado el índice GIN, para que
+    PostgreSQL lo use al filtrar.
+    """
+    from django.contrib.postgres.search import SearchVector
+    
+    return (
+        SearchVector('busqueda_nombre', weight='A', config=CONFIGURACION)
+        + SearchVector('busqueda_descripcion', weight='B', config=CONFIGURACION)
+    )
+
+
+def _raiz(palabra):
+    """Quita la terminación del plural: 'macetas' -> 'maceta', 'flores' -> 'flor'."""
+    if len(palabra) > 4 and palabra.endswith('es'):
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith('s'):
+        return palabra[:-1]
+    return palabra
+
+
+def consulta_fts(texto):
+    """
+    Convierte un texto normalizado en una consulta MATCH de FTS5.
+    
+    Cada palabra se busca por prefijo de su raíz y todas deben aparecer.
+    
+    Ejemplo:
+        >>> consulta_fts('plantas acuaticas')
+        '"planta"* "acuatica"*'
+    """
+    return ' '.join(f'"{_raiz(palabra)}"*' for palabra in re.findall(r'\w+', texto))
+
+
+def buscar(queryset, consulta):
+    """
+    Filtra un queryset de productos por una búsqueda de texto completo.
+    
+    Args:
+        queryset: QuerySet de Producto.
+        consulta (str): Texto escrito por el usuario.
+    
+    Returns:
+        QuerySet: Productos que coinciden, anotados con 'relevancia' y
+        ordenados de mayor a menor relevancia.
+    """
+    texto = normalizar(consulta)
+    
+    if connections[queryset.db].vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        
+        vector = vector_busqueda()
+        query = SearchQuery(texto, config=CONFIGURACION, search_type='websearch')
+        return (
+            queryset.alias(vector_busqueda=vector)
+            .filter(vector_busqueda=query)
+            .annotate(relevancia=SearchRank(vector, query))
+            .order_by('-relevancia', 'pk')
+        )
+    
+    terminos = consulta_fts(texto)
+    if not terminos:
+        return queryset.none()
+    
+    tabla = queryset.model._meta.db_table
+    return (
+        queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [terminos])
+        )
+        .annotate(
+            # bm25() es menor cuanto más relevante; se invierte el signo
+            relevancia=RawSQL(
+                f'SELECT -bm25({TABLA_FTS}, {PESO_NOMBRE_FTS}, 1.0) FROM {TABLA_FTS} '
+                f'WHERE {TABLA_FTS} MATCH %s AND rowid = {tabla}.id',
+                [terminos]
+            )
+        )
+        .order_by('-relevancia', 'pk')
+    )
@@ -0,0 +1,300 @@
+"""
+Cachés del catálogo.
+
+Incluye:
+- La caché de resultados de consultas costosas de los listados (conteos de
+  facetas y total de productos), compartida por todas las páginas de un
+  mismo listado.
+- La caché de páginas completas del catálogo. Las páginas públicas (inicio,
+  listados y detalle de producto) se renderizan igual para todos los
+  visitantes anónimos, salvo el contador del carrito y el token CSRF de los
+  formularios. Se guarda el HTML con sus cabeceras por URL y esas dos
+  partes las completa el navegador consultando la vista 'carrito:resumen'.
+- La copia en memoria del árbol de navegación de categorías, compartida por
+  todas las peticiones de un mismo proceso (worker de Gunicorn).
+
+Todas se invalidan cambiando una versión guardada en la caché de Django,
+lo que hacen los métodos save() de los modelos del catálogo.
+"""
+
+import hashlib
+import time
+import uuid
+from functools import partial, wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re
+
+
+# Clave de caché con la versión actual de las páginas del catálogo
+CLAVE_VERSION = 'catalogo:paginas:version'
+
+
+def _obtener_version(clave):
+    """Lee una versión de la caché, creándola si todavía no existe."""
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, uuid.uuid4().hex, None)
+        version = cache.get(clave)
+    return version
+
+
+def version_paginas():
+    """
+    Retorna la versión vigente de las páginas en caché.
+
+    Returns:
+        str: Identificador de la versión actual.
+    """
+    return _obtener_version(CLAVE_VERSION)
+
+
+def _cambiar_version(clave):
+    """
+    Cambia una versión de la caché, también al confirmar la transacción.
+
+    Dentro de una transacción, una petición que llegue antes del commit
+    guardaría los datos anteriores con la versión nueva y quedarían en
+    caché hasta que expiren; por eso la versión vuelve a cambiar con
+    transaction.on_commit. El cambio inmediato hace que la propia
+    transacción ya no lea lo guardado con la versión anterior.
+    """
+    if transaction.get_connection().in_atomic_block:
+        cache.set(clave, uuid.uuid4().hex, None)
+    transaction.on_commit(lambda: cache.set(clave, uuid.uuid4().hex, None))
+
+
+def invalidar_paginas():
+    """Invalida todas las páginas del catálogo guardadas en caché."""
+    _cambiar_version(CLAVE_VERSION)
+
+
+def consulta_en_cache(nombre, clave, calcular):
+    """
+    Guarda en caché el resultado de una consulta del catálogo.
+
+    El resultado se reutiliza hasta que cambia la versión de las páginas
+    (cualquier cambio en los modelos del catálogo) o pasan
+    CACHE_PAGINAS_SEGUNDOS, igual que las páginas completas.
+
+    Args:
+        nombre (str): Tipo de consulta, para separar las claves.
+        clave (str): Texto que identifica la consulta (por ejemplo, la URL).
+        calcular: Función sin argumentos que ejecuta la consulta.
+
+    Returns:
+        El resultado guardado, o el de calcular() si no estaba en caché.
+    """
+    resumen = hashlib.md5(clave.encode('utf-8')).hexdigest()
+    return cache.get_or_set(
+        f'catalogo:{nombre}:{version_paginas()}:{resumen}',
+        calcular,
+        settings.CACHE_PAGINAS_SEGUNDOS
+    )
+
+
+def _clave_pagina(request):
+    """
+    Genera la clave de caché de la petición.
+
+    Usa la ruta y los parámetros GET ordenados por nombre (los valores
+    repetidos, como ?marca=, conservan su orden), así la misma página no
+    se guarda dos veces por el orden de la query string.
+    """
+    parametros = '&'.join(
+        f'{nombre}={valor}'
+        for nombre in sorted(request.GET)
+        for valor in request.GET.getlist(nombre)
+    )
+    ruta = hashlib.md5(f'{request.path}?{parametros}'.encode('utf-8')).hexdigest()
+    return f'catalogo:pagina:{version_paginas()}:{ruta}'
+
+
+def _se_puede_cachear(request, parametros):
+    """
+    Indica si la respuesta a esta petición puede compartirse entre visitantes.
+
+    Se excluyen los usuarios autenticados (administradores), las peticiones
+    con mensajes pendientes, que deben mostrarse solo a quien los generó, y
+    las que traen parámetros GET que la vista no usa: cada combinación
+    inventada (?x=1, ?x=2...) sería una entrada nueva en la caché.
+
+    Args:
+        request: Petición HTTP.
+        parametros (tuple): Parámetros GET que lee la vista.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if not set(request.GET) <= set(parametros):
+        return False
+    if request.user.is_authenticated:
+        return False
+    if len(get_messages(request)) > 0:
+        return False
+    return True
+
+
+def _cabeceras_compartibles(response):
+    """
+    Retorna las cabeceras de una respuesta que se guardan con la página.
+
+    Se descartan las cookies y 'Cookie' de Vary, que dependen del visitante
+    que provocó el renderizado.
+    """
+    cabeceras = {}
+    for nombre, valor in response.headers.items():
+        if nombre.lower() == 'set-cookie':
+            continue
+        if nombre.lower() == 'vary':
+            valor = ', '.join(
+                campo for campo in cc_delim_re.split(valor) if campo.lower() != 'cookie'
+            )
+            if not valor:
+                continue
+        cabeceras[nombre] = valor
+    return cabeceras
+
+
+def cache_pagina_catalogo(vista=None, parametros=()):
+    """
+    Decorador que guarda en caché la página completa para visitantes anónimos.
+
+    Mientras se renderiza una página que irá a la caché, la petición se marca
+    con 'pagina_en_cache' para que el context processor del carrito no
+    incluya datos de la sesión del visitante y los formularios no lleven su
+    token CSRF (ver templatetags/pagina_cache.py). Se guarda el contenido
+    junto con sus cabeceras (Content-Type, Vary, Content-Language...).
+
+    Args:
+        vista: Vista a decorar.
+        parametros (tuple): Parámetros GET que lee la vista. Las peticiones
+            con otros parámetros no se guardan en caché.
+
+    Ejemplo:
+        >>> @cache_pagina_catalogo
+        ... def inicio(request):
+        ...     ...
+        >>> @cache_pagina_catalogo(parametros=('q', 'page'))
+        ... def buscar(request):
+        ...     ...
+    """
+    if vista is None:
+        return partial(cache_pagina_catalogo, parametros=parametros)
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not _se_puede_cachear(request, parametros):
+            return vista(request, *args, **kwargs)
+
+        clave = _clave_pagina(request)
+        guardada = cache.get(clave)
+        if guardada is not None:
+            contenido, cabeceras = guardada
+            response = HttpResponse(contenido, headers=cabeceras)
+            response['X-Cache-Pagina'] = 'HIT'
+            return response
+
+        request.pagina_en_cache = True
+        response = vista(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+
+        if response.status_code == 200:
+            cache.set(
+                clave,
+                (response.content, _cabeceras_compartibles(response)),
+                settings.CACHE_PAGINAS_SEGUNDOS
+            )
+            response['X-Cache-Pagina'] = 'MISS'
+        return response
+
+    return envoltura
+
+
+# Clave de caché con la versión actual del árbol de navegación
+CLAVE_VERSION_NAVEGACION = 'catalogo:navegacion:version'
+
+
+class NavegacionCategorias:
+    """
+    Copia en memoria del árbol de categorías del menú de navegación.
+
+    La copia vive en el proceso y se reutiliza entre peticiones mientras la
+    versión guardada en la caché de Django no cambie. Así cada worker consulta
+    la base de datos solo después de que se guarda o elimina una categoría.
+    
+    La versión se comprueba como mucho cada CACHE_NAVEGACION_SEGUNDOS: con
+    una caché en base de datos, leerla en cada petición sería otra consulta.
+    Los demás procesos ven un cambio con ese retraso; el que lo hizo, enseguida.
+
+    Atributos:
+        aciertos (int): Peticiones servidas con la copia en memoria.
+        fallos (int): Veces que hubo que (re)cargar el árbol.
+    """
+
+    def __init__(self):
+        """Inicializa la copia vacía y los contadores."""
+        self._version = None
+        self._categorias = None
+        self._comprobada = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, cargar):
+        """
+        Retorna las categorías de navegación, recargándolas si cambió la versión.
+
+        Args:
+            cargar: Función sin argumentos que consulta y retorna las categorías.
+
+        Returns:
+            list: Categorías principales con sus subcategorías activas.
+        """
+        copia = self._categorias
+        ahora = time.monotonic()
+        if copia is not None and ahora - self._comprobada < settings.CACHE_NAVEGACION_SEGUNDOS:
+            self.aciertos += 1
+            return copia
+
+        version = _obtener_version(CLAVE_VERSION_NAVEGACION)
+        self._comprobada = ahora
+        if copia is not None and self._version == version:
+            self.aciertos += 1
+            return copia
+
+        self.fallos += 1
+        copia = cargar()
+        self._categorias, self._version = copia, version
+        return copia
+
+    def invalidar(self):
+        """Marca el árbol como obsoleto en todos los procesos."""
+        _cambiar_version(CLAVE_VERSION_NAVEGACION)
+        # Este proceso no espera a la próxima comprobación
+        self._descartar()
+        transaction.on_commit(self._descartar)
+
+    def _descartar(self):
+        """Descarta la copia en memoria de este proceso."""
+        self._categorias = None
+
+    def estadisticas(self):
+        """
+        Retorna los contadores de uso de la copia en memoria.
+
+        Returns:
+            dict: Aciertos, fallos y versión cargada actualmente.
+        """
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'version': self._version,
+        }
+
+
+# Instancia única por proceso
+navegacion_categorias = NavegacionCategorias()
@@ -3,9 +3,33 @@ Context processors para el catálogo.
 
 Hace disponibles las categorías en todas las plantillas.
 """
+from django.db.models import Prefetch
+
+from .cache import navegacion_categorias
 from .models import Categoria
 
 
+def _cargar_navegacion():
+    """
+    Consulta las categorías principales activas con sus subcategorías activas.
+    
+    Retorna:
+        list: Categorías principales ordenadas, con las subcategorías precargadas.
+    """
+    return list(
+        Categoria.objects.filter(
+            activo=True,
+            categoria_padre__isnull=True
+        ).prefetch_related(
+            Prefetch(
+                'subcategorias',
+                queryset=Categoria.objects.filter(activo=True).order_by('orden', 'nombre'),
+                to_attr='_subcategorias_activas'
+            )
+        ).order_by('orden', 'nombre')
+    )
+
+
 def categorias(request):
     """
     Añade las categorías activas al contexto de todas las plantillas.
@@ -14,15 +38,13 @@ def categorias(request):
     sin importar desde qué vista se cargue la página.
     
     Solo devuelve categorías principales (sin padre) con sus subcategorías
-    accesibles mediante la relación 'subcategorias' y el método
-    'obtener_subcategorias_activas'.
+    accesibles mediante el método 'obtener_subcategorias_activas'. El árbol
+    se guarda en memoria por proceso y solo se vuelve a consultar cuando se
+    guarda o elimina una categoría (ver NavegacionCategorias).
     
     Retorna:
         dict: Diccionario con las categorías disponibles como 'categorias'.
     """
     return {
-        'categorias': Categoria.objects.filter(
-            activo=True,
-            categoria_padre__isnull=True
-        ).prefetch_related('subcategorias').order_by('orden', 'nombre')
+        'categorias': navegacion_categorias.obtener(_cargar_navegacion)
     }
@@ -0,0 +1,259 @@
+"""
+Filtros por facetas del listado de productos.
+
+El listado se puede filtrar por marca (varias a la vez), por categoría
+(con todo su subárbol), por rango de precio y por los productos en oferta
+o con stock. Cada opción del panel lateral muestra cuántos productos
+quedarían al elegirla, por ejemplo "Seachem (14)".
+
+Los filtros usan el resumen desnormalizado de Producto (marca_id,
+categoria_id, precio_min, en_oferta y con_stock; ver
+Producto.actualizar_resumen), así que no necesitan recorrer las
+presentaciones. El precio de un producto es precio_min: el menor
+precio_actual de sus presentaciones activas.
+
+Los conteos de todas las facetas salen de una sola consulta agrupada por
+(marca, categoría, en_oferta, con_stock), más la de las categorías
+inactivas, que no se listan. Cada faceta se cuenta aplicando
+todos los filtros elegidos menos el suyo, así las marcas muestran cuántos
+productos se añadirían al marcar otra marca. Los filtros de marca,
+categoría, oferta y stock son columnas del agrupamiento y se aplican en
+Python sobre las filas; el de precio va dentro del COUNT como filtro
+condicional.
+
+Uso:
+    >>> filtros = Filtros(request.GET)
+    >>> conteos = contar(queryset, filtros, categoria)
+    >>> productos = filtros.filtrar(queryset.filter(categoria_id__in=...))
+"""
+
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Max, Min, Q
+
+from .models import Categoria
+
+
+class Filtros:
+    """
+    Filtros de facetas elegidos en el listado, leídos de los parámetros GET.
+    
+    Atributos:
+        marcas (list): Slugs de las marcas (?marca=seachem&marca=tropica).
+        precio_desde (Decimal | None): Precio mínimo (?precio_desde=10).
+        precio_hasta (Decimal | None): Precio máximo (?precio_hasta=50).
+        oferta (bool): Solo productos en oferta (?oferta=1).
+        stock (bool): Solo productos con stock (?stock=1).
+    
+    Los valores no válidos se ignoran.
+    """
+    
+    def __init__(self, datos):
+        """
+        Args:
+            datos: QueryDict con los parámetros (request.GET).
+        """
+        self.marcas = sorted({slug for slug in datos.getlist('marca') if slug})
+        self.precio_desde = _precio(datos.get('precio_desde'))
+        self.precio_hasta = _precio(datos.get('precio_hasta'))
+        self.oferta = datos.get('oferta') == '1'
+        self.stock = datos.get('stock') == '1'
+    
+    @property
+    def hay_precio(self):
+        """Indica si hay un filtro de rango de precio."""
+        return self.precio_desde is not None or self.precio_hasta is not None
+    
+    def q_precio(self):
+        """
+        Condición del rango de precio.
+        
+        Returns:
+            Q | None: Condición sobre precio_min, o None si no hay rango.
+        """
+        if not self.hay_precio:
+            return None
+        condicion = Q()
+        if self.precio_desde is not None:
+            condicion &= Q(precio_min__gte=self.precio_desde)
+        if self.precio_hasta is not None:
+            condicion &= Q(precio_min__lte=self.precio_hasta)
+        return condicion
+    
+    def filtrar(self, queryset):
+        """
+        Aplica los filtros de facetas a un queryset de productos.
+        
+        El filtro de categoría no se aplica aquí: la categoría viene en la
+        URL y la vista filtra por su subárbol.
+        
+        Args:
+            queryset: QuerySet de Producto.
+        
+        Returns:
+            QuerySet: Productos que cumplen todos los filtros.
+        """
+        if self.marcas:
+            queryset = queryset.filter(marca__slug__in=self.marcas)
+        if self.hay_precio:
+            queryset = queryset.filter(self.q_precio())
+        if self.oferta:
+            queryset = queryset.filter(en_oferta=True)
+        if self.stock:
+            queryset = queryset.filter(con_stock=True)
+        return queryset
+    
+    def _cumple(self, fila, categoria, excepto=None):
+        """
+        Indica si una fila del agrupamiento cumple los filtros.
+        
+        Args:
+            fila (dict): Fila de la consulta agrupada de contar().
+            categoria: Categoria del listado, o None.
+            excepto (str): Filtro que no se aplica ('marca', 'categoria',
+                'oferta' o 'stock').
+        """
+        if excepto != 'marca' and self.marcas and fila['marca__slug'] not in self.marcas:
+            return False
+        if excepto != 'categoria' and categoria is not None and categoria.pk not in fila['listados']:
+            return False
+        if excepto != 'oferta' and self.oferta and not fila['en_oferta']:
+            return False
+        if excepto != 'stock' and self.stock and not fila['con_stock']:
+            return False
+        return True
+
+
+def _precio(valor):
+    """Convierte un parámetro en un precio positivo, o None si no es válido."""
+    try:
+        precio = Decimal(valor)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return precio if precio.is_finite() and precio >= 0 else None
+
+
+def _listados(fila, inactivas):
+    """
+    Retorna los IDs de las categorías cuyo listado incluye una fila.
+    
+    Son su categoría y sus ancestros, subiendo hasta la primera categoría
+    inactiva: como en Categoria.obtener_ids_subarbol, el listado de una
+    categoría no incluye sus subcategorías inactivas ni lo que cuelga de
+    ellas.
+    
+    Args:
+        fila (dict): Fila de la consulta agrupada de contar().
+        inactivas (set): IDs de las categorías inactivas.
+    
+    Returns:
+        list: IDs desde la categoría de la fila hacia la raíz.
+    """
+    cadena = [int(pk) for pk in fila['categoria__ruta'].strip('/').split('/') if pk]
+    cadena.append(fila['categoria_id'])
+    listados = []
+    for pk in reversed(cadena):
+        if pk in inactivas:
+            break
+        listados.append(pk)
+    return listados
+
+
+def contar(queryset, filtros, categoria=None):
+    """
+    Cuenta los productos de cada opción de las facetas con una sola consulta.
+    
+    Args:
+        queryset: QuerySet de Producto sin los filtros de facetas ni el de
+            categoría (con la búsqueda, si la hay).
+        filtros (Filtros): Filtros elegidos.
+        categoria: Categoria del listado, o None.
+    
+    Returns:
+        dict: Conteos de cada faceta, sin su propio filtro:
+            'marcas': {slug: productos}
+            'categorias': {id: productos, incluyendo sus subcategorías}
+            'oferta': productos en oferta
+            'stock': productos con stock
+            'precio_desde', 'precio_hasta': rango de precios disponible
+            'total': productos con todos los filtros aplicados
+    """
+    inactivas = set(Categoria.objects.filter(activo=False).values_list('pk', flat=True))
+    filas = list(
+        queryset.order_by()
+        .values('marca__slug', 'categoria_id', 'categoria__ruta', 'en_oferta', 'con_stock')
+        .annotate(
+            total=Count('pk', filter=filtros.q_precio()),
+            precio_desde=Min('precio_min'),
+            precio_hasta=Max('precio_min'),
+        )
+    )
+    
+    conteos = {
+        'marcas': Counter(),
+        'categorias': Counter(),
+        'oferta': 0,
+        'stock': 0,
+        'precio_desde': None,
+        'precio_hasta': None,
+        'total': 0,
+    }
+    precios = []
+    for fila in filas:
+        fila['listados'] = _listados(fila, inactivas)
+        
+        if filtros._cumple(fila, categoria, excepto='marca') and fila['marca__slug']:
+            conteos['marcas'][fila['marca__slug']] += fila['total']
+        
+        if filtros._cumple(fila, categoria, excepto='categoria'):
+            # Cada producto cuenta en todas las categorías en que se lista
+            for pk in fila['listados']:
+                conteos['categorias'][pk] += fila['total']
+        
+        if filtros._cumple(fila, categoria, excepto='oferta') and fila['en_oferta']:
+            conteos['oferta'] += fila['total']
+        
+        if filtros._cumple(fila, categoria, excepto='stock') and fila['con_stock']:
+            conteos['stock'] += fila['total']
+        
+        if filtros._cumple(fila, categoria):
+            conteos['total'] += fila['total']
+            # El rango disponible no depende del propio filtro de precio
+            if fila['precio_desde'] is not None:
+                precios.extend([fila['precio_desde'], fila['precio_hasta']])
+    
+    if precios:
+        conteos['precio_desde'], conteos['precio_hasta'] = min(precios), max(precios)
+    
+    # Sin las opciones que el filtro de precio deja vacías
+    conteos['marcas'] = +conteos['marcas']
+    conteos['categorias'] = +conteos['categorias']
+    
+    return conteos
+
+
+def url_alternar_marca(datos, slug):
+    """
+    Retorna la query string que marca o desmarca una marca.
+    
+    Conserva los demás parámetros y vuelve a la primera página (sin número
+    de página ni cursor).
+    
+    Args:
+        datos: QueryDict con los parámetros actuales (request.GET).
+        slug (str): Slug de la marca.
+    
+    Returns:
+        str: Query string con el signo de interrogación inicial.
+    """
+    parametros = datos.copy()
+    parametros.pop('page', None)
+    parametros.pop('cursor', None)
+    marcas = [m for m in parametros.getlist('marca') if m]
+    if slug in marcas:
+        marcas.remove(slug)
+    else:
+        marcas.append(slug)
+    parametros.setlist('marca', marcas)
+    return f'?{parametros.urlencode()}'
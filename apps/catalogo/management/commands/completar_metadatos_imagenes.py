@@ -0,0 +1,139 @@
+"""
+Comando de Django para completar los metadatos de las imágenes existentes.
+
+Guarda el ancho, el alto, el peso en bytes, el hash SHA-256 y la vista
+previa (LQIP) de las imágenes de categorías, marcas y productos que
+todavía no los tienen (las subidas antes de que el procesamiento los
+registrara). Las imágenes
+nuevas los reciben al ser procesadas por 'procesar_imagenes'.
+
+Uso:
+    python manage.py completar_metadatos_imagenes
+    python manage.py completar_metadatos_imagenes --todos  # Recalcula todas
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.catalogo.models import Categoria, Marca, Producto, ImagenProducto
+from apps.catalogo.utils import leer_metadatos
+
+
+class Command(BaseCommand):
+    """Comando para completar los metadatos de las imágenes."""
+    
+    help = 'Guarda dimensiones, peso, hash y vista previa de las imágenes que no los tienen'
+    
+    def add_arguments(self, parser):
+        """Define los argumentos del comando."""
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=200,
+            help='Registros leídos y actualizados por bloque (por defecto 200)',
+        )
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Recalcula también las imágenes que ya tienen metadatos',
+        )
+    
+    def handle(self, *args, **options):
+        """Ejecuta el completado de metadatos."""
+        lote = max(1, options['lote'])
+        total_actualizadas = 0
+        total_errores = 0
+        
+        modelos = [
+            ('\n📁 Procesando imágenes de CATEGORÍAS...', Categoria, 'imagen'),
+            ('\n📁 Procesando logos de MARCAS...', Marca, 'logo'),
+            ('\n📁 Procesando imágenes de PRODUCTOS...', ImagenProducto, 'imagen'),
+        ]
+        
+        for titulo, modelo, campo in modelos:
+            self.stdout.write(titulo)
+            actualizadas, errores = self._procesar_modelo(
+                modelo, campo, lote, options['todos']
+            )
+            total_actualizadas += actualizadas
+            total_errores += errores
+        
+        # Resumen final
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {total_actualizadas} imágenes actualizadas')
+        )
+        if total_errores > 0:
+            self.stdout.write(
+                self.style.ERROR(f'❌ {total_errores} errores encontrados')
+            )
+    
+    def _procesar_modelo(self, modelo, campo, lote, todos):
+        """
+        Completa los metadatos de un campo de imagen de un modelo.
+        
+        Los registros se recorren con iterator() y se guardan por bloques con
+        bulk_update, sin pasar por save() (no cambia ningún archivo). Si el
+        modelo es ImagenProducto, también se actualiza el resumen de los
+        productos afectados.
+        
+        Args:
+            modelo: Clase del modelo de Django.
+            campo (str): Nombre del campo de imagen.
+            lote (int): Registros por bloque.
+            todos (bool): Si es False, solo procesa los registros sin hash o
+                sin vista previa.
+        
+        Returns:
+            tuple: (cantidad_actualizadas, cantidad_errores)
+        """
+        campos = [f'{campo}_ancho', f'{campo}_alto', f'{campo}_peso', f'{campo}_hash', f'{campo}_lqip']
+        objetos = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+        if not todos:
+            objetos = objetos.filter(Q(**{f'{campo}_hash': ''}) | Q(**{f'{campo}_lqip': ''}))
+        objetos = objetos.order_by('pk').only('pk', campo, *campos)
+        
+        actualizadas = 0
+        errores = 0
+        bloque = []
+        productos = set()
+        
+        for obj in objetos.iterator(chunk_size=lote):
+            imagen = getattr(obj, campo)
+            try:
+                metadatos = leer_metadatos(imagen.storage, imagen.name)
+            except Exception as e:
+                errores += 1
+                self.stdout.write(
+                    self.style.ERROR(f'   ❌ Error en {imagen.name}: {e}')
+                )
+                continue
+            
+            for clave, valor in metadatos.items():
+                setattr(obj, f'{campo}_{clave}', valor)
+            bloque.append(obj)
+            
+            if len(bloque) >= lote:
+                actualizadas += self._guardar(modelo, bloque, campos, productos)
+                bloque = []
+        
+        if bloque:
+            actualizadas += self._guardar(modelo, bloque, campos, productos)
+        
+        # La tarjeta de producto copia las dimensiones y la vista previa de
+        # la imagen principal
+        for producto in Producto.objects.filter(pk__in=productos):
+            producto.actualizar_resumen()
+        
+        self.stdout.write(f'   Actualizadas: {actualizadas}')
+        return actualizadas, errores
+    
+    def _guardar(self, modelo, bloque, campos, productos):
+        """Guarda un bloque de registros y anota los productos afectados."""
+        modelo.objects.bulk_update(bloque, campos)
+        if modelo is ImagenProducto:
+            productos.update(
+                ImagenProducto.objects.filter(pk__in=[obj.pk for obj in bloque])
+                .values_list('producto_id', flat=True)
+            )
+        return len(bloque)
@@ -3,18 +3,37 @@ Comando de Django para convertir todas las imágenes existentes a WebP.
 
 Este comando recorre todas las imágenes del catálogo (categorías, marcas
 e imágenes de productos) y las convierte al formato WebP optimizado.
+También genera las variantes de tamaño (IMAGE_SIZES), con sus versiones
+AVIF y JPEG, de las imágenes que todavía no las tienen.
+
+Los registros se leen por bloques de claves primarias. La conversión
+puede repartirse entre varios procesos (--workers) y el avance se guarda
+en un archivo de control después de cada bloque, de modo que si el
+comando se interrumpe, la siguiente ejecución continúa donde quedó. El
+archivo de control también guarda las pk de los registros que fallaron,
+que la siguiente ejecución vuelve a intentar.
 
 Uso:
     python manage.py convertir_imagenes_webp
     python manage.py convertir_imagenes_webp --dry-run  # Solo muestra qué se convertiría
+    python manage.py convertir_imagenes_webp --workers 4 --lote 200
+    python manage.py convertir_imagenes_webp --reiniciar  # Ignora el avance guardado
 """
 
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db.models import Q
 
-from apps.catalogo.models import Categoria, Marca, ImagenProducto
-from apps.catalogo.utils import procesar_imagen, necesita_conversion
+from apps.catalogo.models import Categoria, Marca, ImagenProducto, registrar_conversion
+from apps.catalogo.utils import (
+    convertir_archivo, necesita_conversion, tiene_alternativas, variantes_vigentes
+)
 
 
 class Command(BaseCommand):
@@ -29,42 +48,79 @@ class Command(BaseCommand):
             action='store_true',
             help='Muestra qué imágenes se convertirían sin realizar cambios',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Procesos que convierten imágenes en paralelo (por defecto 1)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=100,
+            help='Registros leídos y confirmados por bloque (por defecto 100)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.MEDIA_ROOT, '.convertir_imagenes_webp.json'),
+            help='Archivo donde se guarda el avance',
+        )
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Ignora el avance guardado y procesa todo desde el principio',
+        )
     
     def handle(self, *args, **options):
         """Ejecuta la conversión de imágenes."""
         dry_run = options['dry_run']
+        self.lote = max(1, options['lote'])
+        self.ruta_checkpoint = options['checkpoint']
         
         if dry_run:
             self.stdout.write(
                 self.style.WARNING('Modo DRY-RUN: No se realizarán cambios\n')
             )
         
+        self.avance = {} if options['reiniciar'] else self._leer_checkpoint()
+        if self.avance:
+            self.stdout.write(f'↩️  Continuando desde el avance guardado: {self.avance}')
+        
+        self.bytes_entrada = 0
+        self.bytes_salida = 0
+        inicio = time.monotonic()
+        
         total_convertidas = 0
         total_errores = 0
         
-        # Procesar imágenes de categorías
-        self.stdout.write('\n📁 Procesando imágenes de CATEGORÍAS...')
-        convertidas, errores = self._procesar_modelo(
-            Categoria, 'imagen', dry_run
-        )
-        total_convertidas += convertidas
-        total_errores += errores
+        modelos = [
+            ('\n📁 Procesando imágenes de CATEGORÍAS...', Categoria, 'imagen', 'imagen_variantes'),
+            ('\n📁 Procesando logos de MARCAS...', Marca, 'logo', 'logo_variantes'),
+            ('\n📁 Procesando imágenes de PRODUCTOS...', ImagenProducto, 'imagen', 'variantes'),
+        ]
         
-        # Procesar logos de marcas
-        self.stdout.write('\n📁 Procesando logos de MARCAS...')
-        convertidas, errores = self._procesar_modelo(
-            Marca, 'logo', dry_run
-        )
-        total_convertidas += convertidas
-        total_errores += errores
+        workers = max(1, options['workers'])
+        executor = None
+        if workers > 1 and not dry_run:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
         
-        # Procesar imágenes de productos
-        self.stdout.write('\n📁 Procesando imágenes de PRODUCTOS...')
-        convertidas, errores = self._procesar_modelo(
-            ImagenProducto, 'imagen', dry_run
-        )
-        total_convertidas += convertidas
-        total_errores += errores
+        try:
+            for titulo, modelo, campo_imagen, campo_variantes in modelos:
+                self.stdout.write(titulo)
+                convertidas, errores = self._procesar_modelo(
+                    modelo, campo_imagen, campo_variantes, dry_run, executor
+                )
+                total_convertidas += convertidas
+                total_errores += errores
+        finally:
+            if executor:
+                executor.shutdown()
+        
+        # Terminado sin interrupciones: el avance ya no hace falta
+        if not dry_run and os.path.exists(self.ruta_checkpoint):
+            os.remove(self.ruta_checkpoint)
+        
+        duracion = time.monotonic() - inicio
         
         # Resumen final
         self.stdout.write('\n' + '=' * 50)
@@ -76,94 +132,177 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.SUCCESS(f'✅ {total_convertidas} imágenes convertidas exitosamente')
             )
+            self.stdout.write(
+                f'⏱️  {duracion:.1f} s con {workers} proceso(s): '
+                f'{total_convertidas / duracion if duracion else 0:.1f} imágenes/s, '
+                f'{self.bytes_entrada / 1_000_000:.1f} MB leídos → '
+                f'{self.bytes_salida / 1_000_000:.1f} MB escritos'
+            )
         
         if total_errores > 0:
             self.stdout.write(
                 self.style.ERROR(f'❌ {total_errores} errores encontrados')
             )
     
-    def _procesar_modelo(self, modelo, campo_imagen, dry_run):
+    def _leer_checkpoint(self):
+        """
+        Retorna el avance guardado.
+        
+        Returns:
+            dict: Etiqueta del modelo -> {'ultima_pk': última pk procesada,
+            'fallidos': pk de los registros que fallaron}.
+        """
+        try:
+            with open(self.ruta_checkpoint, encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return {}
+    
+    def _guardar_checkpoint(self):
+        """Guarda el avance de forma atómica (escribe y renombra)."""
+        temporal = f'{self.ruta_checkpoint}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(self.avance, archivo)
+        os.replace(temporal, self.ruta_checkpoint)
+    
+    def _avance_de(self, modelo):
+        """
+        Retorna el avance guardado de un modelo.
+        
+        Returns:
+            tuple: (última pk procesada, set de pk que fallaron)
+        """
+        avance = self.avance.get(modelo._meta.label) or {}
+        # Archivos de control anteriores: solo la última pk
+        if isinstance(avance, int):
+            return avance, set()
+        return avance.get('ultima_pk', 0), set(avance.get('fallidos', []))
+    
+    def _pendientes(self, modelo):
+        """
+        Retorna los registros del modelo que faltan por procesar: los
+        posteriores a la última pk guardada y los que fallaron.
+        """
+        ultima_pk, fallidos = self._avance_de(modelo)
+        return modelo.objects.filter(Q(pk__gt=ultima_pk) | Q(pk__in=fallidos))
+    
+    def _bloques(self, modelo):
+        """
+        Recorre los registros pendientes del modelo por bloques de claves
+        primarias.
+        
+        Usa iterator() para no cargar la tabla entera en memoria. Los
+        registros que fallaron en una ejecución anterior van en los primeros
+        bloques, porque sus pk son menores que la última guardada.
+        
+        Yields:
+            list: Registros de un bloque, ordenados por pk.
+        """
+        objetos = self._pendientes(modelo).order_by('pk')
+        
+        bloque = []
+        for obj in objetos.iterator(chunk_size=self.lote):
+            bloque.append(obj)
+            if len(bloque) >= self.lote:
+                yield bloque
+                bloque = []
+        if bloque:
+            yield bloque
+    
+    def _procesar_modelo(self, modelo, campo_imagen, campo_variantes, dry_run, executor=None):
         """
         Procesa las imágenes de un modelo específico.
         
+        Los archivos se convierten con convertir_archivo (en los procesos del
+        executor, si lo hay) y este proceso registra los resultados en la base
+        de datos y guarda el avance del bloque. Los archivos antiguos los
+        elimina después el comando recolectar_archivos.
+        
         Args:
             modelo: Clase del modelo de Django.
             campo_imagen: Nombre del campo de imagen.
+            campo_variantes: Nombre del campo con las variantes de tamaño.
             dry_run: Si es True, solo muestra información sin modificar.
+            executor: ProcessPoolExecutor para convertir en paralelo (opcional).
         
         Returns:
             tuple: (cantidad_convertidas, cantidad_errores)
         """
         convertidas = 0
         errores = 0
-        archivos_a_eliminar = []  # Lista de archivos antiguos para eliminar al final
         
-        objetos = modelo.objects.all()
-        total = objetos.count()
+        ultima_pk, fallidos = self._avance_de(modelo)
+        total = self._pendientes(modelo).count()
         
         self.stdout.write(f'   Encontrados: {total} registros')
         
-        for obj in objetos:
-            imagen = getattr(obj, campo_imagen)
-            
-            if not imagen:
-                continue
-            
-            if not necesita_conversion(imagen):
-                self.stdout.write(
-                    f'   ⏭️  {imagen.name} - Ya es WebP'
-                )
-                continue
+        for bloque in self._bloques(modelo):
+            pendientes = []
             
-            try:
-                # Guardar ruta del archivo antiguo para eliminarlo después
-                ruta_antigua = imagen.path if imagen else None
-                nombre_antiguo = os.path.basename(imagen.name) if imagen else None
+            for obj in bloque:
+                # Si vuelve a fallar se añade de nuevo más abajo
+                fallidos.discard(obj.pk)
+                imagen = getattr(obj, campo_imagen)
+                
+                if not imagen:
+                    continue
+                
+                convertir = necesita_conversion(imagen)
+                if (
+                    not convertir
+                    and variantes_vigentes(imagen, getattr(obj, campo_variantes))
+                    and tiene_alternativas(imagen.storage, imagen.name)
+                ):
+                    self.stdout.write(
+                        f'   ⏭️  {imagen.name} - Ya es WebP'
+                    )
+                    continue
                 
                 if dry_run:
+                    destino = '.webp' if convertir else 'variantes'
                     self.stdout.write(
-                        f'   🔄 {imagen.name} → .webp (dry-run)'
+                        f'   🔄 {imagen.name} → {destino} (dry-run)'
                     )
                     convertidas += 1
-                else:
-                    # Convertir la imagen
-                    nuevo_contenido, nuevo_nombre = procesar_imagen(imagen)
-                    
-                    # Cerrar el archivo de imagen para liberar el bloqueo
-                    imagen.close()
-                    
-                    # Guardar nueva imagen
-                    getattr(obj, campo_imagen).save(
-                        nuevo_nombre, 
-                        nuevo_contenido, 
-                        save=False
-                    )
-                    obj.save()
-                    
-                    # Agregar archivo antiguo a la lista para eliminar después
-                    if ruta_antigua:
-                        nueva_ruta = getattr(obj, campo_imagen).path
-                        if ruta_antigua != nueva_ruta and os.path.exists(ruta_antigua):
-                            archivos_a_eliminar.append(ruta_antigua)
-                    
+                    continue
+                
+                pendientes.append((obj, imagen.name, convertir))
+            
+            if dry_run:
+                continue
+            
+            # Convertir los archivos (en paralelo si hay executor)
+            nombres = [nombre for _, nombre, _ in pendientes]
+            banderas = [convertir for _, _, convertir in pendientes]
+            mapear = executor.map if executor else map
+            resultados = mapear(convertir_archivo, nombres, banderas)
+            
+            for (obj, nombre_antiguo, convertir), resultado in zip(pendientes, resultados):
+                if 'error' in resultado:
+                    errores += 1
+                    fallidos.add(obj.pk)
                     self.stdout.write(
-                        f'   ✅ {nombre_antiguo} → {nuevo_nombre}'
+                        self.style.ERROR(f'   ❌ Error en {nombre_antiguo}: {resultado["error"]}')
                     )
-                    convertidas += 1
-                    
-            except Exception as e:
-                errores += 1
-                self.stdout.write(
-                    self.style.ERROR(f'   ❌ Error en {imagen.name}: {str(e)}')
-                )
-        
-        # Eliminar archivos antiguos al final
-        for ruta in archivos_a_eliminar:
-            try:
-                os.remove(ruta)
-            except Exception as e:
+                    continue
+                
+                if not registrar_conversion(obj, campo_imagen, campo_variantes, resultado):
+                    self.stdout.write(f'   ⏭️  {nombre_antiguo} - Cambió durante la conversión')
+                    continue
+                
+                self.bytes_entrada += resultado['bytes_entrada']
+                self.bytes_salida += resultado['bytes_salida']
                 self.stdout.write(
-                    self.style.WARNING(f'   ⚠️  No se pudo eliminar {ruta}: {str(e)}')
+                    f'   ✅ {os.path.basename(nombre_antiguo)} → {os.path.basename(resultado["nombre"])}'
                 )
+                convertidas += 1
+            
+            # Guardar el avance del bloque y los registros que fallaron
+            ultima_pk = max(ultima_pk, bloque[-1].pk)
+            self.avance[modelo._meta.label] = {
+                'ultima_pk': ultima_pk,
+                'fallidos': sorted(fallidos),
+            }
+            self._guardar_checkpoint()
         
         return convertidas, errores
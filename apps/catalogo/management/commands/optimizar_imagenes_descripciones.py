@@ -0,0 +1,154 @@
+"""
+Comando de Django para optimizar las imágenes de las descripciones.
+
+Las imágenes que se subieron desde el editor (CKEditor 5) antes de usar
+AlmacenamientoCKEditor se guardaron tal cual, a veces como PNG de varios
+megabytes. Este comando recorre el HTML de Producto.descripcion, guarda
+cada imagen de MEDIA_ROOT que todavía no está optimizada con
+AlmacenamientoCKEditor (WebP, tamaño máximo y versiones AVIF/JPEG) y
+reescribe el atributo src para que apunte al archivo optimizado.
+
+Los archivos originales no se eliminan: pueden estar enlazados desde
+otros sitios.
+
+La descripción se guarda con un UPDATE directo, sin pasar por
+Producto.save(): cambiar el src de una imagen no cambia el texto de
+búsqueda (que no incluye el HTML) ni la tarjeta del producto. Las páginas
+en caché se invalidan una sola vez al terminar.
+
+Uso:
+    python manage.py optimizar_imagenes_descripciones
+    python manage.py optimizar_imagenes_descripciones --dry-run  # Solo muestra qué se cambiaría
+"""
+
+import posixpath
+import re
+from urllib.parse import unquote
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from apps.catalogo.cache import invalidar_paginas
+from apps.catalogo.models import Producto
+from apps.catalogo.storage import AlmacenamientoCKEditor, es_nombre_por_contenido
+
+
+# Atributo src de una etiqueta <img>: (inicio, comillas, URL)
+PATRON_SRC = re.compile(r'(<img\b[^>]*?\bsrc=)(["\'])(.*?)\2', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    """Comando para optimizar las imágenes incrustadas en las descripciones."""
+    
+    help = 'Convierte a WebP las imágenes de las descripciones y actualiza su HTML'
+    
+    def add_arguments(self, parser):
+        """Define los argumentos del comando."""
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra qué imágenes se optimizarían sin realizar cambios',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=100,
+            help='Productos leídos por bloque (por defecto 100)',
+        )
+    
+    def handle(self, *args, **options):
+        """Ejecuta la optimización de las descripciones."""
+        self.dry_run = options['dry_run']
+        self.storage = AlmacenamientoCKEditor()
+        self.prefijo = default_storage.url('')
+        # URL original -> URL optimizada, para no convertir dos veces la misma imagen
+        self.optimizadas = {}
+        self.errores = 0
+        
+        if self.dry_run:
+            self.stdout.write(
+                self.style.WARNING('Modo DRY-RUN: No se realizarán cambios\n')
+            )
+        
+        productos = (
+            Producto.objects.filter(descripcion__icontains='<img')
+            .order_by('pk')
+            .only('pk', 'nombre', 'descripcion')
+        )
+        
+        actualizados = 0
+        for producto in productos.iterator(chunk_size=max(1, options['lote'])):
+            self.reemplazos = 0
+            descripcion = PATRON_SRC.sub(self._reemplazar, producto.descripcion)
+            if not self.reemplazos:
+                continue
+            
+            actualizados += 1
+            self.stdout.write(f'   ✅ {producto.nombre}')
+            if not self.dry_run:
+                Producto.objects.filter(pk=producto.pk).update(descripcion=descripcion)
+        
+        if actualizados and not self.dry_run:
+            invalidar_paginas()
+        
+        # Resumen final
+        self.stdout.write('\n' + '=' * 50)
+        verbo = 'Se actualizarían' if self.dry_run else 'Actualizadas'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ {verbo} {actualizados} descripciones '
+                f'({len(self.optimizadas)} imágenes optimizadas)'
+            )
+        )
+        if self.errores > 0:
+            self.stdout.write(
+                self.style.ERROR(f'❌ {self.errores} errores encontrados')
+            )
+    
+    def _reemplazar(self, coincidencia):
+        """Reemplaza la URL de una etiqueta <img> por la de su versión optimizada."""
+        inicio, comillas, url = coincidencia.groups()
+        nueva = self._optimizar(url)
+        if nueva is None:
+            return coincidencia.group(0)
+        self.reemplazos += 1
+        return f'{inicio}{comillas}{nueva}{comillas}'
+    
+    def _optimizar(self, url):
+        """
+        Guarda la imagen de una URL con AlmacenamientoCKEditor.
+        
+        Args:
+            url (str): Valor del atributo src.
+        
+        Returns:
+            str | None: URL del archivo optimizado (la misma URL en modo
+            dry-run), o None si la imagen no es de MEDIA_ROOT, ya está
+            optimizada o no se pudo convertir.
+        """
+        if url in self.optimizadas:
+            return self.optimizadas[url]
+        if not url.startswith(self.prefijo):
+            return None
+        
+        nombre = unquote(url[len(self.prefijo):])
+        if nombre.endswith('.webp') and es_nombre_por_contenido(nombre):
+            return None
+        
+        if self.dry_run:
+            self.stdout.write(f'   🔄 {nombre} → .webp (dry-run)')
+            self.optimizadas[url] = url
+            return url
+        
+        try:
+            with default_storage.open(nombre, 'rb') as archivo:
+                ruta = self.storage.save(posixpath.basename(nombre), archivo)
+        except Exception as e:
+            self.errores += 1
+            self.stdout.write(
+                self.style.ERROR(f'   ❌ Error en {nombre}: {e}')
+            )
+            return None
+        
+        self.optimizadas[url] = self.storage.url(ruta)
+        return self.optimizadas[url]
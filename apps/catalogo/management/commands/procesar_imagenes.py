@@ -0,0 +1,203 @@
+"""
+Comando de Django que procesa la cola de optimización de imágenes.
+
+Se ejecuta como un proceso aparte de Gunicorn. Toma los trabajos
+pendientes (TrabajoImagen), convierte cada archivo a WebP, genera sus
+variantes de tamaño y las registra en el modelo correspondiente.
+
+Los originales convertidos o reemplazados no se eliminan aquí: puede
+compartirlos otro registro (ver storage.py) y los que quedan sin usar los
+elimina el comando recolectar_archivos.
+
+Uso:
+    python manage.py procesar_imagenes              # Proceso continuo
+    python manage.py procesar_imagenes --una-vez    # Vacía la cola y termina
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.catalogo.models import TrabajoImagen, registrar_conversion
+from apps.catalogo.utils import convertir_archivo, necesita_conversion, variantes_vigentes
+
+
+# Tiempo que un trabajo queda reservado para el proceso que lo tomó
+RESERVA = timedelta(minutes=10)
+
+# Espera antes del primer reintento; se duplica en cada intento
+ESPERA_BASE = timedelta(seconds=30)
+
+
+class Command(BaseCommand):
+    """Comando para procesar los trabajos de optimización de imágenes."""
+    
+    help = 'Convierte a WebP y genera las variantes de las imágenes encoladas'
+    
+    def add_arguments(self, parser):
+        """Define los argumentos del comando."""
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=10,
+            help='Trabajos reservados en cada consulta',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2,
+            help='Segundos de espera cuando no hay trabajos pendientes',
+        )
+        parser.add_argument(
+            '--max-intentos',
+            type=int,
+            default=3,
+            help='Intentos antes de marcar un trabajo como fallido',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los trabajos disponibles y termina',
+        )
+    
+    def handle(self, *args, **options):
+        """Ejecuta el procesamiento de la cola."""
+        try:
+            while True:
+                trabajos = self._reservar(max(1, options['lote']))
+                for trabajo in trabajos:
+                    self._procesar(trabajo, options['max_intentos'])
+                if trabajos:
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('\n⏹️  Procesamiento de imágenes detenido')
+    
+    def _reservar(self, lote):
+        """
+        Toma un lote de trabajos pendientes y los marca como 'procesando'.
+        
+        Los trabajos 'procesando' cuya reserva venció (proceso interrumpido)
+        vuelven a tomarse.
+        
+        Args:
+            lote (int): Cantidad máxima de trabajos.
+        
+        Returns:
+            list: Instancias de TrabajoImagen reservadas.
+        """
+        ahora = timezone.now()
+        with transaction.atomic():
+            trabajos = list(
+                TrabajoImagen.objects.select_for_update(skip_locked=True)
+                .filter(
+                    estado__in=['pendiente', 'procesando'],
+                    proximo_intento__lte=ahora,
+                )
+                .order_by('proximo_intento', 'pk')[:lote]
+            )
+            if trabajos:
+                TrabajoImagen.objects.filter(
+                    pk__in=[trabajo.pk for trabajo in trabajos]
+                ).update(estado='procesando', proximo_intento=ahora + RESERVA)
+        return trabajos
+    
+    def _procesar(self, trabajo, max_intentos):
+        """
+        Optimiza la imagen de un trabajo y registra el resultado.
+        
+        Args:
+            trabajo: TrabajoImagen reservado.
+            max_intentos (int): Intentos antes de marcar como fallido.
+        """
+        objeto = trabajo.obtener_objeto()
+        imagen = getattr(objeto, trabajo.campo, None) if objeto else None
+        
+        # El registro se eliminó o su imagen cambió después de encolar
+        if not imagen or imagen.name != trabajo.nombre_original:
+            self._terminar(trabajo, 'reemplazado')
+            return
+        
+        resultado = self._conversion_previa(trabajo) or convertir_archivo(
+            imagen.name, necesita_conversion(imagen)
+        )
+        
+        if 'error' in resultado:
+            trabajo.intentos += 1
+            trabajo.ultimo_error = resultado['error']
+            if trabajo.intentos >= max_intentos:
+                trabajo.estado = 'fallido'
+                trabajo.terminado = timezone.now()
+            else:
+                trabajo.estado = 'pendiente'
+                trabajo.proximo_intento = timezone.now() + ESPERA_BASE * 2 ** (trabajo.intentos - 1)
+            try:
+                with transaction.atomic():
+                    trabajo.save()
+            except IntegrityError:
+                # Mientras tanto se encoló otro trabajo para la misma imagen
+                trabajo.estado = 'reemplazado'
+                trabajo.terminado = timezone.now()
+                trabajo.save()
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error en {trabajo.nombre_original}: {resultado["error"]}')
+            )
+            return
+        
+        # No se registra si el archivo cambió durante la conversión
+        if not registrar_conversion(objeto, trabajo.campo, trabajo.campo_variantes, resultado):
+            self._terminar(trabajo, 'reemplazado')
+            return
+        self._terminar(trabajo, 'completado')
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {trabajo.nombre_original} → {resultado["nombre"]}')
+        )
+    
+    def _conversion_previa(self, trabajo):
+        """
+        Busca una conversión ya hecha del mismo archivo original.
+        
+        Los archivos se nombran por su contenido, así que dos trabajos con el
+        mismo nombre_original corresponden a la misma imagen (por ejemplo, la
+        misma foto subida para varios productos). Si otro registro ya tiene
+        esa imagen optimizada, se reutiliza su resultado sin convertir.
+        
+        Returns:
+            dict | None: Resultado con 'nombre', 'variantes' y 'metadatos', o
+            None si hay que convertir el archivo.
+        """
+        anteriores = TrabajoImagen.objects.filter(
+            modelo=trabajo.modelo,
+            campo=trabajo.campo,
+            nombre_original=trabajo.nombre_original,
+            estado='completado',
+        ).order_by('-terminado')
+        
+        for anterior in anteriores[:5]:
+            objeto = anterior.obtener_objeto()
+            # Solo sirve si ese registro no cambió de imagen después
+            if objeto is None or TrabajoImagen.ultimo_de(objeto, anterior.campo) != anterior:
+                continue
+            
+            imagen = getattr(objeto, anterior.campo)
+            variantes = getattr(objeto, anterior.campo_variantes)
+            metadatos = {
+                clave: getattr(objeto, f'{anterior.campo}_{clave}')
+                for clave in ('ancho', 'alto', 'peso', 'hash', 'lqip')
+            }
+            if variantes and variantes_vigentes(imagen, variantes) and metadatos['hash']:
+                return {'nombre': imagen.name, 'variantes': variantes, 'metadatos': metadatos}
+        return None
+    
+    def _terminar(self, trabajo, estado):
+        """Marca un trabajo como terminado con el estado indicado."""
+        trabajo.estado = estado
+        trabajo.intentos += 1
+        trabajo.ultimo_error = ''
+        trabajo.terminado = timezone.now()
+        trabajo.save()
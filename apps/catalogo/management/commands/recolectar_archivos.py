@@ -0,0 +1,147 @@
+"""
+Comando de Django para eliminar los archivos multimedia que nadie usa.
+
+Varios registros pueden compartir un mismo archivo guardado por contenido
+(ver storage.py), así que ni los modelos ni la cola de imágenes eliminan
+los archivos que dejan de usar: ni el original que reemplaza una
+conversión, ni las variantes anteriores, ni los de un registro eliminado.
+Este comando recorre las carpetas de imágenes del catálogo y elimina los
+que ya no referencia ningún registro.
+También elimina las miniaturas bajo demanda (ver utils.generar_miniatura)
+cuyo archivo original ya no existe o cuyo tamaño ya no está en
+IMAGE_SIZES.
+
+Solo se consideran los archivos con más antigüedad que --gracia, para no
+borrar uno recién subido, o recién reutilizado por otra subida del mismo
+contenido, cuyo registro todavía no se ha guardado.
+
+Uso:
+    python manage.py recolectar_archivos
+    python manage.py recolectar_archivos --dry-run  # Solo muestra qué se eliminaría
+"""
+
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.catalogo.models import TrabajoImagen
+from apps.catalogo.storage import es_nombre_por_contenido, origen_alternativa
+from apps.catalogo.utils import CARPETA_MINIATURAS, IMAGE_SIZES
+
+
+class Command(BaseCommand):
+    """Comando para eliminar archivos sin referencias."""
+    
+    help = 'Elimina los archivos de imágenes del catálogo que ningún registro usa'
+    
+    def add_arguments(self, parser):
+        """Define los argumentos del comando."""
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra qué archivos se eliminarían sin eliminarlos',
+        )
+        parser.add_argument(
+            '--gracia',
+            type=int,
+            default=60,
+            help='Minutos de antigüedad mínima de un archivo para eliminarlo',
+        )
+    
+    def handle(self, *args, **options):
+        """Ejecuta la recolección de archivos."""
+        referenciados, carpetas = self._referencias()
+        self.limite = timezone.now() - timedelta(minutes=options['gracia'])
+        self.dry_run = options['dry_run']
+        self.eliminados = 0
+        self.liberados = 0
+        
+        for carpeta in sorted(carpetas):
+            if not default_storage.exists(carpeta):
+                continue
+            _, archivos = default_storage.listdir(carpeta)
+            
+            for archivo in archivos:
+                ruta = f'{carpeta}/{archivo}'
+                # Las versiones AVIF/JPEG siguen al WebP del que derivan
+                origen = origen_alternativa(ruta) or ruta
+                if es_nombre_por_contenido(origen) and origen not in referenciados:
+                    self._eliminar(ruta)
+        
+        # Miniaturas: img/<tamaño>/<ruta del original>
+        for ruta in self._recorrer(CARPETA_MINIATURAS):
+            partes = ruta.split('/', 2)
+            if (
+                len(partes) < 3
+                or partes[1] not in IMAGE_SIZES
+                or not default_storage.exists(partes[2])
+            ):
+                self._eliminar(ruta)
+        
+        verbo = 'Se eliminarían' if self.dry_run else 'Eliminados'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ {verbo} {self.eliminados} archivos ({self.liberados / 1_000_000:.1f} MB)'
+            )
+        )
+    
+    def _eliminar(self, ruta):
+        """Elimina un archivo si es más antiguo que el período de gracia."""
+        # Eliminar un WebP elimina también sus versiones alternativas
+        if not default_storage.exists(ruta):
+            return
+        if default_storage.get_modified_time(ruta) > self.limite:
+            return
+        
+        self.liberados += default_storage.size(ruta)
+        self.eliminados += 1
+        if self.dry_run:
+            self.stdout.write(f'   🗑️  {ruta} (dry-run)')
+        else:
+            default_storage.delete(ruta)
+    
+    def _recorrer(self, carpeta):
+        """
+        Recorre una carpeta del almacenamiento y sus subcarpetas.
+        
+        Yields:
+            str: Ruta de cada archivo.
+        """
+        if not default_storage.exists(carpeta):
+            return
+        subcarpetas, archivos = default_storage.listdir(carpeta)
+        for archivo in archivos:
+            yield f'{carpeta}/{archivo}'
+        for subcarpeta in subcarpetas:
+            yield from self._recorrer(f'{carpeta}/{subcarpeta}')
+    
+    def _referencias(self):
+        """
+        Reúne las rutas que usan los registros y las carpetas a recorrer.
+        
+        Returns:
+            tuple: (rutas referenciadas, carpetas de upload_to)
+        """
+        referenciados = set()
+        carpetas = set()
+        
+        for etiqueta, campos in TrabajoImagen.CAMPOS_VARIANTES.items():
+            modelo = apps.get_model(etiqueta)
+            for campo_imagen, campo_variantes in campos.items():
+                carpetas.add(modelo._meta.get_field(campo_imagen).upload_to.rstrip('/'))
+                
+                filas = modelo.objects.values_list(campo_imagen, campo_variantes)
+                for nombre, variantes in filas.iterator(chunk_size=1000):
+                    if nombre:
+                        referenciados.add(nombre)
+                    referenciados.update(datos['ruta'] for datos in variantes.values())
+        
+        # Un trabajo pendiente todavía va a leer su archivo original
+        referenciados.update(
+            TrabajoImagen.objects.filter(estado__in=['pendiente', 'procesando'])
+            .values_list('nombre_original', flat=True)
+        )
+        return referenciados, carpetas
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_resumenes(apps, schema_editor):
+    """Rellena el resumen desnormalizado de los productos existentes."""
+    Producto = apps.get_model('catalogo', 'Producto')
+    
+    for producto in Producto.objects.all():
+        presentaciones = list(
+            producto.presentaciones.filter(activo=True).order_by('precio')
+        )
+        con_stock = [p for p in presentaciones if p.stock > 0]
+        destacada = (con_stock or presentaciones or [None])[0]
+        imagen = producto.imagenes.order_by('-es_principal', 'orden').first()
+        
+        producto.precio_min = min(
+            (p.precio_oferta or p.precio for p in presentaciones), default=None
+        )
+        producto.en_oferta = any(p.precio_oferta is not None for p in presentaciones)
+        producto.con_stock = bool(con_stock)
+        producto.imagen_principal_ruta = imagen.imagen.name if imagen else ''
+        producto.cantidad_presentaciones = len(presentaciones)
+        producto.presentacion_destacada = destacada
+        producto.save(update_fields=[
+            'precio_min', 'en_oferta', 'con_stock', 'imagen_principal_ruta',
+            'cantidad_presentaciones', 'presentacion_destacada',
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0006_agregar_subcategorias'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='presentacion',
+            options={'ordering': ['precio'], 'verbose_name': 'Presentación', 'verbose_name_plural': 'Presentaciones'},
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='cantidad_presentaciones',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Presentaciones activas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='con_stock',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Con stock'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='en_oferta',
+            field=models.BooleanField(default=False, editable=False, verbose_name='En oferta'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_principal_ruta',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Ruta de la imagen principal'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_min',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Precio desde'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='presentacion_destacada',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalogo.presentacion', verbose_name='Presentación principal'),
+        ),
+        migrations.RunPython(calcular_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:40
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0007_resumen_producto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='version_tarjeta',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Cambia con cada modificación para invalidar la tarjeta en caché', verbose_name='Versión de la tarjeta'),
+        ),
+    ]
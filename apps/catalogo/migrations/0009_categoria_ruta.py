@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:43
+
+from django.db import migrations, models
+
+
+def calcular_rutas(apps, schema_editor):
+    """Calcula la ruta de ancestros de las categorías existentes."""
+    Categoria = apps.get_model('catalogo', 'Categoria')
+    
+    pendientes = list(Categoria.objects.filter(categoria_padre__isnull=True))
+    rutas = {c.pk: '/' for c in pendientes}
+    while pendientes:
+        padre = pendientes.pop()
+        for hija in Categoria.objects.filter(categoria_padre=padre):
+            rutas[hija.pk] = f"{rutas[padre.pk]}{padre.pk}/"
+            pendientes.append(hija)
+    
+    for pk, ruta in rutas.items():
+        Categoria.objects.filter(pk=pk).update(ruta=ruta)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0008_producto_version_tarjeta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='ruta',
+            field=models.CharField(db_index=True, default='/', editable=False, help_text='IDs de los ancestros separados por "/" (se calcula automáticamente)', max_length=255, verbose_name='Ruta'),
+        ),
+        migrations.RunPython(calcular_rutas, migrations.RunPython.noop),
+    ]
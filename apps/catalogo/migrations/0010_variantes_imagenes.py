@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_categoria_ruta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versiones reducidas de la imagen por tamaño', verbose_name='Variantes de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versiones reducidas de la imagen por tamaño', verbose_name='Variantes'),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='logo_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versiones reducidas del logo por tamaño', verbose_name='Variantes del logo'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_principal_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes de la imagen principal'),
+        ),
+    ]
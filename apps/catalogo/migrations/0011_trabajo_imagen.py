@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0010_variantes_imagenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoImagen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID del registro')),
+                ('campo', models.CharField(max_length=50, verbose_name='Campo')),
+                ('nombre_original', models.CharField(max_length=255, verbose_name='Archivo original')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('fallido', 'Fallido'), ('reemplazado', 'Reemplazado')], default='pendiente', max_length=12, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('terminado', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de término')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de imagen',
+                'verbose_name_plural': 'Trabajos de imágenes',
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='catalogo_tr_estado_f51919_idx'), models.Index(fields=['modelo', 'objeto_id'], name='catalogo_tr_modelo_b2bdba_idx')],
+            },
+        ),
+    ]
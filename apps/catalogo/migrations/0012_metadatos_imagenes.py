@@ -0,0 +1,83 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0011_trabajo_imagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_alto',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Alto en píxeles del archivo optimizado', null=True, verbose_name='Alto de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_ancho',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Ancho en píxeles del archivo optimizado', null=True, verbose_name='Ancho de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 del contenido del archivo', max_length=64, verbose_name='Hash de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_peso',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Tamaño del archivo en bytes', null=True, verbose_name='Peso de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='imagen_alto',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Alto en píxeles del archivo optimizado', null=True, verbose_name='Alto de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='imagen_ancho',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Ancho en píxeles del archivo optimizado', null=True, verbose_name='Ancho de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='imagen_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 del contenido del archivo', max_length=64, verbose_name='Hash de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='imagen_peso',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Tamaño del archivo en bytes', null=True, verbose_name='Peso de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='logo_alto',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Alto en píxeles del archivo optimizado', null=True, verbose_name='Alto del logo'),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='logo_ancho',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Ancho en píxeles del archivo optimizado', null=True, verbose_name='Ancho del logo'),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='logo_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 del contenido del archivo', max_length=64, verbose_name='Hash del logo'),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='logo_peso',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Tamaño del archivo en bytes', null=True, verbose_name='Peso del logo'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_principal_alto',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Alto de la imagen principal'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_principal_ancho',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ancho de la imagen principal'),
+        ),
+    ]
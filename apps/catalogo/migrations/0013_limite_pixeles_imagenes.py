@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:05
+
+import apps.catalogo.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0012_metadatos_imagenes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='categoria',
+            name='imagen',
+            field=models.ImageField(blank=True, help_text='Imagen representativa de la categoría', null=True, upload_to='categorias/', validators=[apps.catalogo.utils.validar_pixeles], verbose_name='Imagen'),
+        ),
+        migrations.AlterField(
+            model_name='imagenproducto',
+            name='imagen',
+            field=models.ImageField(upload_to='productos/galeria/', validators=[apps.catalogo.utils.validar_pixeles], verbose_name='Imagen'),
+        ),
+        migrations.AlterField(
+            model_name='marca',
+            name='logo',
+            field=models.ImageField(blank=True, help_text='Logo de la marca', null=True, upload_to='marcas/', validators=[apps.catalogo.utils.validar_pixeles], verbose_name='Logo'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0013_limite_pixeles_imagenes'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_lqip',
+            field=models.TextField(blank=True, editable=False, help_text='WebP diminuto (data URI) que se muestra mientras carga la imagen', verbose_name='Vista previa de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='imagen_lqip',
+            field=models.TextField(blank=True, editable=False, help_text='WebP diminuto (data URI) que se muestra mientras carga la imagen', verbose_name='Vista previa de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='logo_lqip',
+            field=models.TextField(blank=True, editable=False, help_text='WebP diminuto (data URI) que se muestra mientras carga la imagen', verbose_name='Vista previa del logo'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_principal_lqip',
+            field=models.TextField(blank=True, editable=False, verbose_name='Vista previa de la imagen principal'),
+        ),
+    ]
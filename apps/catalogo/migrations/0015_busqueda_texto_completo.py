@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+from apps.catalogo.busqueda import INDICE_GIN, TABLA_FTS, textos_busqueda, vector_busqueda
+
+
+def calcular_textos(apps, schema_editor):
+    """Rellena el texto de búsqueda de los productos existentes."""
+    Producto = apps.get_model('catalogo', 'Producto')
+    
+    for producto in Producto.objects.select_related('marca', 'categoria'):
+        for campo, valor in textos_busqueda(producto).items():
+            setattr(producto, campo, valor)
+        producto.save(update_fields=['busqueda_nombre', 'busqueda_descripcion'])
+
+
+def crear_indice(apps, schema_editor):
+    """
+    Crea el índice de texto completo: GIN en PostgreSQL, FTS5 en SQLite.
+    
+    El índice GIN usa la misma expresión que busqueda.buscar() para que
+    PostgreSQL lo aproveche al filtrar.
+    """
+    Producto = apps.get_model('catalogo', 'Producto')
+    vendor = schema_editor.connection.vendor
+    
+    if vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        
+        schema_editor.add_index(Producto, GinIndex(vector_busqueda(), name=INDICE_GIN))
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5('
+            'busqueda_nombre, busqueda_descripcion, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {TABLA_FTS} (rowid, busqueda_nombre, busqueda_descripcion) '
+            f'SELECT id, busqueda_nombre, busqueda_descripcion FROM {Producto._meta.db_table}'
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    """Elimina el índice de texto completo."""
+    vendor = schema_editor.connection.vendor
+    
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_GIN}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0014_vista_previa_imagenes'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda_descripcion',
+            field=models.TextField(blank=True, editable=False, help_text='Descripción corta y detallada normalizadas, sin HTML', verbose_name='Texto de búsqueda (descripción)'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda_nombre',
+            field=models.TextField(blank=True, editable=False, help_text='Nombre, modelo, marca y categoría normalizados', verbose_name='Texto de búsqueda (nombre)'),
+        ),
+        migrations.RunPython(calcular_textos, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
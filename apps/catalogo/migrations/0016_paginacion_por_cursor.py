@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0015_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', '-fecha_creacion', '-id'], name='catalogo_producto_recientes'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+
+def calcular_descuentos(apps, schema_editor):
+    """Rellena el descuento máximo de los productos existentes."""
+    Producto = apps.get_model('catalogo', 'Producto')
+    Presentacion = apps.get_model('catalogo', 'Presentacion')
+    
+    descuentos = {}
+    ofertas = Presentacion.objects.filter(
+        activo=True, precio_oferta__isnull=False, precio__gt=0
+    ).values_list('producto_id', 'precio', 'precio_oferta')
+    for producto_id, precio, precio_oferta in ofertas.iterator():
+        descuento = round((precio - precio_oferta) / precio * 100)
+        descuentos[producto_id] = max(descuento, descuentos.get(producto_id, 0))
+    
+    for producto_id, descuento in descuentos.items():
+        Producto.objects.filter(pk=producto_id).update(descuento_max=descuento)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0016_paginacion_por_cursor'),
+    ]
+    
+    operations = [
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='catalogo_producto_recientes',
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='descuento_max',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Mayor porcentaje de descuento entre las presentaciones activas', verbose_name='Descuento máximo'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['-fecha_creacion', '-id'], name='catalogo_producto_recientes'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['precio_min', 'id'], name='catalogo_producto_precio'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['-descuento_max', '-id'], name='catalogo_producto_descuento'),
+        ),
+        migrations.RunPython(calcular_descuentos, migrations.RunPython.noop),
+    ]
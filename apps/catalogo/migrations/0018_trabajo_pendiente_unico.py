@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+def reemplazar_pendientes_repetidos(apps, schema_editor):
+    """Deja un solo trabajo pendiente por imagen: el más reciente."""
+    TrabajoImagen = apps.get_model('catalogo', 'TrabajoImagen')
+    
+    vistos = set()
+    for trabajo in TrabajoImagen.objects.filter(estado='pendiente').order_by('-creado', '-pk'):
+        clave = (trabajo.modelo, trabajo.objeto_id, trabajo.campo)
+        if clave in vistos:
+            trabajo.estado = 'reemplazado'
+            trabajo.save(update_fields=['estado'])
+        vistos.add(clave)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0017_orden_por_precio_y_descuento'),
+    ]
+    
+    operations = [
+        migrations.RunPython(reemplazar_pendientes_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trabajoimagen',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('modelo', 'objeto_id', 'campo'), name='catalogo_trabajo_pendiente_unico'),
+        ),
+    ]
@@ -5,13 +5,108 @@ Este módulo contiene los modelos principales para gestionar el catálogo
 de productos de la tienda, incluyendo categorías y productos.
 """
 
-from django.db import models
+import uuid
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
+from django.utils import timezone
 from django.core.validators import URLValidator, MinValueValidator, MaxValueValidator
 from slugify import slugify
 from django_ckeditor_5.fields import CKEditor5Field
 
-from .utils import procesar_imagen, necesita_conversion
+from .busqueda import desindexar, indexar, textos_busqueda
+from .cache import invalidar_paginas, navegacion_categorias
+from .utils import necesita_conversion, validar_pixeles, variantes_vigentes, url_variante
+
+
+def _metadatos_vacios(campo_imagen):
+    """
+    Retorna los valores vacíos de los metadatos de un campo de imagen.
+    
+    Cada campo de imagen tiene sus metadatos en '<campo>_ancho',
+    '<campo>_alto', '<campo>_peso', '<campo>_hash' y '<campo>_lqip'.
+    """
+    return {
+        f'{campo_imagen}_ancho': None,
+        f'{campo_imagen}_alto': None,
+        f'{campo_imagen}_peso': None,
+        f'{campo_imagen}_hash': '',
+        f'{campo_imagen}_lqip': '',
+    }
+
+
+def _encolar_optimizacion(instancia, campo_imagen, campo_variantes):
+    """
+    Encola la optimización de la imagen si el archivo cambió.
+    
+    Se llama después de super().save(). No procesa la imagen: mientras el
+    trabajo está pendiente se descartan las variantes y los metadatos del
+    archivo anterior y las plantillas muestran el original subido.
+    
+    Args:
+        instancia: Registro del modelo ya guardado.
+        campo_imagen (str): Nombre del campo ImageField.
+        campo_variantes (str): Nombre del JSONField con las variantes.
+    """
+    imagen = getattr(instancia, campo_imagen)
+    variantes = getattr(instancia, campo_variantes)
+    if variantes_vigentes(imagen, variantes) and not necesita_conversion(imagen):
+        return
+    
+    obsoletos = {campo_variantes: {}, **_metadatos_vacios(campo_imagen)}
+    if any(getattr(instancia, campo) for campo in obsoletos):
+        for campo, valor in obsoletos.items():
+            setattr(instancia, campo, valor)
+        type(instancia).objects.filter(pk=instancia.pk).update(**obsoletos)
+    
+    if imagen:
+        TrabajoImagen.encolar(instancia, campo_imagen)
+
+
+def registrar_conversion(instancia, campo_imagen, campo_variantes, resultado):
+    """
+    Guarda en el registro el archivo optimizado, sus variantes y metadatos.
+    
+    El original y las variantes anteriores no se eliminan aquí: otros
+    registros pueden compartirlos (ver storage.py) y los que quedan sin
+    usar los elimina el comando recolectar_archivos.
+    
+    La conversión puede tardar varios segundos y mientras tanto el registro
+    pudo editarse en el admin, así que se vuelve a leer bloqueado y solo se
+    escriben las columnas de la imagen. Si la imagen ya no es la que se
+    convirtió, no se registra nada.
+    
+    Args:
+        instancia: Registro del modelo, con la imagen que se convirtió.
+        campo_imagen (str): Nombre del campo ImageField.
+        campo_variantes (str): Nombre del JSONField con las variantes.
+        resultado (dict): Resultado de utils.convertir_archivo.
+    
+    Returns:
+        bool: True si se registró la conversión.
+    """
+    convertida = getattr(instancia, campo_imagen).name
+    with transaction.atomic():
+        instancia = type(instancia).objects.select_for_update().filter(pk=instancia.pk).first()
+        imagen = getattr(instancia, campo_imagen, None) if instancia else None
+        if not imagen or imagen.name != convertida:
+            return False
+        
+        # save() ya no encuentra nada que optimizar
+        imagen.name = resultado['nombre']
+        setattr(instancia, campo_variantes, resultado['variantes'])
+        campos = [campo_imagen, campo_variantes]
+        for clave, valor in resultado['metadatos'].items():
+            setattr(instancia, f'{campo_imagen}_{clave}', valor)
+            campos.append(f'{campo_imagen}_{clave}')
+        instancia.save(update_fields=campos)
+    return True
 
 
 class Categoria(models.Model):
@@ -26,7 +121,15 @@ class Categoria(models.Model):
         slug (str): Identificador único para URL amigable.
         descripcion (str): Descripción detallada de la categoría.
         imagen (ImageField): Imagen representativa de la categoría.
+        imagen_variantes (dict): Versiones reducidas de la imagen por tamaño.
+        imagen_ancho (int): Ancho en píxeles de la imagen.
+        imagen_alto (int): Alto en píxeles de la imagen.
+        imagen_peso (int): Tamaño del archivo en bytes.
+        imagen_hash (str): SHA-256 del contenido del archivo.
+        imagen_lqip (str): Vista previa diminuta de la imagen (data URI).
         activo (bool): Indica si la categoría está activa en la tienda.
+        categoria_padre (ForeignKey): Categoría padre (None si es principal).
+        ruta (str): IDs de los ancestros, de la raíz al padre (ej: "/1/5/").
         orden (int): Orden de visualización de la categoría.
         fecha_creacion (datetime): Fecha de creación del registro.
         fecha_actualizacion (datetime): Fecha de última actualización.
@@ -52,11 +155,53 @@ class Categoria(models.Model):
     )
     imagen = models.ImageField(
         upload_to='categorias/',
+        validators=[validar_pixeles],
         blank=True,
         null=True,
         verbose_name='Imagen',
         help_text='Imagen representativa de la categoría'
     )
+    imagen_variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Variantes de la imagen',
+        help_text='Versiones reducidas de la imagen por tamaño'
+    )
+    imagen_ancho = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ancho de la imagen',
+        help_text='Ancho en píxeles del archivo optimizado'
+    )
+    imagen_alto = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Alto de la imagen',
+        help_text='Alto en píxeles del archivo optimizado'
+    )
+    imagen_peso = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Peso de la imagen',
+        help_text='Tamaño del archivo en bytes'
+    )
+    imagen_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name='Hash de la imagen',
+        help_text='SHA-256 del contenido del archivo'
+    )
+    imagen_lqip = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Vista previa de la imagen',
+        help_text='WebP diminuto (data URI) que se muestra mientras carga la imagen'
+    )
     activo = models.BooleanField(
         default=True,
         verbose_name='Activo',
@@ -71,6 +216,14 @@ class Categoria(models.Model):
         verbose_name='Categoría padre',
         help_text='Categoría padre para crear subcategorías (dejar vacío si es categoría principal)'
     )
+    ruta = models.CharField(
+        max_length=255,
+        default='/',
+        editable=False,
+        db_index=True,
+        verbose_name='Ruta',
+        help_text='IDs de los ancestros separados por "/" (se calcula automáticamente)'
+    )
     orden = models.PositiveIntegerField(
         default=0,
         verbose_name='Orden',
@@ -102,7 +255,7 @@ class Categoria(models.Model):
     def save(self, *args, **kwargs):
         """
         Sobrescribe el método save para generar el slug automáticamente
-        y convertir la imagen a WebP.
+        y encolar la conversión de la imagen a WebP (ver TrabajoImagen).
         
         El slug se genera o actualiza cuando:
         - No existe slug (nuevo registro)
@@ -112,19 +265,84 @@ class Categoria(models.Model):
         if not self.slug or self.nombre != self._nombre_original:
             self.slug = slugify(self.nombre)
         
-        # Convertir imagen a WebP si es necesario
-        if self.imagen and necesita_conversion(self.imagen):
-            nuevo_contenido, nuevo_nombre = procesar_imagen(self.imagen)
-            self.imagen.save(nuevo_nombre, nuevo_contenido, save=False)
+        # Recalcular la ruta de ancestros a partir del padre
+        ruta_anterior = self.ruta
+        self.ruta = self._calcular_ruta()
         
+        nombre_cambiado = self.pk and self.nombre != self._nombre_original
         super().save(*args, **kwargs)
+        _encolar_optimizacion(self, 'imagen', 'imagen_variantes')
+        
+        # Si la categoría se movió, mover también todo su subárbol
+        if ruta_anterior != self.ruta:
+            prefijo_anterior = f"{ruta_anterior}{self.pk}/"
+            Categoria.objects.filter(ruta__startswith=prefijo_anterior).update(
+                ruta=Concat(
+                    models.Value(self.prefijo_descendientes),
+                    Substr('ruta', len(prefijo_anterior) + 1),
+                    output_field=models.CharField()
+                )
+            )
+        
+        # Las tarjetas muestran el nombre de la categoría: invalidarlas
+        # y actualizar el texto de búsqueda de sus productos
+        if nombre_cambiado:
+            Producto.objects.filter(categoria=self).update(
+                version_tarjeta=uuid.uuid4()
+            )
+            for producto in Producto.objects.filter(categoria=self).select_related('marca', 'categoria'):
+                producto.actualizar_busqueda()
+        invalidar_paginas()
+        navegacion_categorias.invalidar()
+        
         # Actualizar nombre original después de guardar
         self._nombre_original = self.nombre
     
+    def clean(self):
+        """Evita que una categoría quede dentro de su propio subárbol."""
+        if self.pk and self.categoria_padre_id:
+            if self.categoria_padre_id == self.pk or (
+                f"/{self.pk}/" in self.categoria_padre.ruta
+            ):
+                raise ValidationError({
+                    'categoria_padre': 'Una categoría no puede ser subcategoría de sí misma.'
+                })
+    
+    def _calcular_ruta(self):
+        """Calcula la ruta de ancestros a partir de la categoría padre."""
+        if self.categoria_padre_id is None:
+            return '/'
+        return self.categoria_padre.prefijo_descendientes
+    
     def get_absolute_url(self):
         """Retorna la URL absoluta de la categoría."""
         return reverse('catalogo:categoria_detalle', kwargs={'slug': self.slug})
     
+    @property
+    def prefijo_descendientes(self):
+        """
+        Prefijo de ruta que comparten todas las subcategorías (a cualquier nivel).
+        
+        Returns:
+            str: Ruta de la categoría seguida de su propio ID (ej: "/1/5/").
+        """
+        return f"{self.ruta}{self.pk}/"
+    
+    @property
+    def ancestros_ids(self):
+        """
+        IDs de los ancestros, desde la categoría principal hasta el padre.
+        
+        Returns:
+            list: Lista de IDs (vacía si es categoría principal).
+        """
+        return [int(parte) for parte in self.ruta.strip('/').split('/') if parte]
+    
+    @property
+    def nivel(self):
+        """Profundidad de la categoría (0 para categorías principales)."""
+        return len(self.ancestros_ids)
+    
     @property
     def es_categoria_principal(self):
         """
@@ -143,17 +361,39 @@ class Categoria(models.Model):
         Returns:
             bool: True si tiene subcategorías activas.
         """
+        if hasattr(self, '_subcategorias_activas'):
+            return bool(self._subcategorias_activas)
         return self.subcategorias.filter(activo=True).exists()
     
     def obtener_subcategorias_activas(self):
         """
         Obtiene todas las subcategorías activas de esta categoría.
         
+        Si fueron precargadas en '_subcategorias_activas' (como hace el
+        context processor de navegación), no ejecuta consultas.
+        
         Returns:
-            QuerySet: Subcategorías activas ordenadas.
+            QuerySet | list: Subcategorías activas ordenadas.
         """
+        if hasattr(self, '_subcategorias_activas'):
+            return self._subcategorias_activas
         return self.subcategorias.filter(activo=True).order_by('orden', 'nombre')
     
+    def obtener_ancestros(self):
+        """
+        Obtiene los ancestros de la categoría con una sola consulta.
+        
+        Útil para construir breadcrumbs a cualquier profundidad.
+        
+        Returns:
+            list: Categorías desde la principal hasta el padre.
+        """
+        ids = self.ancestros_ids
+        if not ids:
+            return []
+        por_id = Categoria.objects.in_bulk(ids)
+        return [por_id[pk] for pk in ids if pk in por_id]
+    
     def obtener_ruta_completa(self):
         """
         Obtiene la ruta completa de la categoría (ej: "Plantas > Plantas de Fondo").
@@ -161,22 +401,37 @@ class Categoria(models.Model):
         Returns:
             str: Ruta completa de la categoría.
         """
-        if self.categoria_padre:
-            return f"{self.categoria_padre.obtener_ruta_completa()} > {self.nombre}"
-        return self.nombre
+        nombres = [c.nombre for c in self.obtener_ancestros()]
+        nombres.append(self.nombre)
+        return ' > '.join(nombres)
     
     def obtener_todas_subcategorias(self):
         """
-        Obtiene recursivamente todas las subcategorías (hijas, nietas, etc.).
+        Obtiene todas las subcategorías activas (hijas, nietas, etc.).
+        
+        Usa una sola consulta sobre la ruta indexada. Se excluyen las
+        subcategorías inactivas y todo lo que cuelga de ellas.
         
         Returns:
             list: Lista de todas las subcategorías.
         """
-        resultado = []
-        for subcategoria in self.subcategorias.filter(activo=True):
-            resultado.append(subcategoria)
-            resultado.extend(subcategoria.obtener_todas_subcategorias())
-        return resultado
+        descendientes = list(
+            Categoria.objects.filter(ruta__startswith=self.prefijo_descendientes)
+        )
+        inactivas = {c.pk for c in descendientes if not c.activo}
+        return [
+            c for c in descendientes
+            if c.activo and not inactivas.intersection(c.ancestros_ids)
+        ]
+    
+    def obtener_ids_subarbol(self):
+        """
+        Obtiene los IDs de esta categoría y de todas sus subcategorías activas.
+        
+        Returns:
+            list: IDs de la categoría y su subárbol.
+        """
+        return [self.id] + [sub.id for sub in self.obtener_todas_subcategorias()]
     
     def obtener_todos_productos(self):
         """
@@ -185,17 +440,51 @@ class Categoria(models.Model):
         Returns:
             QuerySet: Productos de esta categoría y subcategorías.
         """
-        from django.db.models import Q
-        
-        # Incluir esta categoría y todas sus subcategorías
-        categorias_ids = [self.id]
-        for sub in self.obtener_todas_subcategorias():
-            categorias_ids.append(sub.id)
-        
         return Producto.objects.filter(
-            categoria_id__in=categorias_ids,
+            categoria_id__in=self.obtener_ids_subarbol(),
             activo=True
         )
+    
+    def contar_productos(self):
+        """
+        Cuenta los productos activos de la categoría y todo su subárbol.
+        
+        Returns:
+            int: Cantidad de productos.
+        """
+        return self.obtener_todos_productos().count()
+
+
+class MarcaQuerySet(models.QuerySet):
+    """QuerySet personalizado para el modelo Marca."""
+    
+    def con_productos(self):
+        """
+        Filtra las marcas que tienen al menos un producto disponible.
+        
+        Usa una subconsulta EXISTS (ver ProductoQuerySet.disponibles), así
+        que no repite filas ni necesita distinct().
+        
+        Returns:
+            QuerySet: Marcas con productos disponibles.
+        """
+        return self.filter(
+            Exists(Producto.objects.disponibles().filter(marca=OuterRef('pk')))
+        )
+
+
+
+@receiver(post_delete, sender=Categoria)
+def categoria_eliminada(sender, instance, **kwargs):
+    """
+    Invalida las páginas y la navegación en caché al eliminar una categoría.
+    
+    Es una señal y no Categoria.delete() porque la acción "Eliminar
+    seleccionados" del admin (QuerySet.delete()) y las subcategorías que se
+    eliminan en cascada no pasan por delete().
+    """
+    invalidar_paginas()
+    navegacion_categorias.invalidar()
 
 
 class Marca(models.Model):
@@ -208,6 +497,12 @@ class Marca(models.Model):
         nombre (str): Nombre de la marca.
         slug (str): Identificador único para URL amigable.
         logo (ImageField): Logo de la marca.
+        logo_variantes (dict): Versiones reducidas del logo por tamaño.
+        logo_ancho (int): Ancho en píxeles del logo.
+        logo_alto (int): Alto en píxeles del logo.
+        logo_peso (int): Tamaño del archivo en bytes.
+        logo_hash (str): SHA-256 del contenido del archivo.
+        logo_lqip (str): Vista previa diminuta del logo (data URI).
         descripcion (str): Descripción de la marca.
         activo (bool): Indica si la marca está activa.
     """
@@ -227,11 +522,53 @@ class Marca(models.Model):
     )
     logo = models.ImageField(
         upload_to='marcas/',
+        validators=[validar_pixeles],
         blank=True,
         null=True,
         verbose_name='Logo',
         help_text='Logo de la marca'
     )
+    logo_variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Variantes del logo',
+        help_text='Versiones reducidas del logo por tamaño'
+    )
+    logo_ancho = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ancho del logo',
+        help_text='Ancho en píxeles del archivo optimizado'
+    )
+    logo_alto = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Alto del logo',
+        help_text='Alto en píxeles del archivo optimizado'
+    )
+    logo_peso = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Peso del logo',
+        help_text='Tamaño del archivo en bytes'
+    )
+    logo_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name='Hash del logo',
+        help_text='SHA-256 del contenido del archivo'
+    )
+    logo_lqip = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Vista previa del logo',
+        help_text='WebP diminuto (data URI) que se muestra mientras carga la imagen'
+    )
     descripcion = models.TextField(
         blank=True,
         verbose_name='Descripción',
@@ -243,6 +580,8 @@ class Marca(models.Model):
         help_text='Indica si la marca está visible en la tienda'
     )
     
+    objects = MarcaQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Marca'
         verbose_name_plural = 'Marcas'
@@ -259,22 +598,77 @@ class Marca(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Genera el slug automáticamente y convierte el logo a WebP.
+        Genera el slug automáticamente y encola la conversión del logo a WebP.
         
-        El slug se regenera si el nombre ha cambiado.
+        Si el nombre ha cambiado, se regenera el slug y el texto de búsqueda
+        de los productos de la marca.
         """
         # Regenerar slug si es nuevo o si cambió el nombre
         if not self.slug or self.nombre != self._nombre_original:
             self.slug = slugify(self.nombre)
         
-        # Convertir logo a WebP si es necesario
-        if self.logo and necesita_conversion(self.logo):
-            nuevo_contenido, nuevo_nombre = procesar_imagen(self.logo)
-            self.logo.save(nuevo_nombre, nuevo_contenido, save=False)
-        
+        nombre_cambiado = self.pk and self.nombre != self._nombre_original
         super().save(*args, **kwargs)
+        _encolar_optimizacion(self, 'logo', 'logo_variantes')
+        
+        # El nombre de la marca forma parte del texto de búsqueda
+        if nombre_cambiado:
+            for producto in self.productos.select_related('marca', 'categoria'):
+                producto.actualizar_busqueda()
+        invalidar_paginas()
         # Actualizar nombre original después de guardar
         self._nombre_original = self.nombre
+    
+    def delete(self, *args, **kwargs):
+        """Elimina la marca e invalida las páginas del catálogo en caché."""
+        resultado = super().delete(*args, **kwargs)
+        invalidar_paginas()
+        return resultado
+
+
+class ProductoQuerySet(models.QuerySet):
+    """QuerySet personalizado para el modelo Producto."""
+    
+    def disponibles(self):
+        """
+        Filtra los productos activos con al menos una presentación activa.
+        
+        La presentación se comprueba con una subconsulta EXISTS en lugar de
+        un JOIN, así cada producto aparece una sola vez sin distinct() y la
+        base de datos no tiene que ordenar o agrupar el resultado para
+        quitar duplicados.
+        
+        Returns:
+            QuerySet: Productos que se pueden mostrar en la tienda.
+        """
+        return self.filter(
+            Exists(Presentacion.objects.filter(producto=OuterRef('pk'), activo=True)),
+            activo=True,
+        )
+    
+    def con_datos_tarjeta(self):
+        """
+        Carga de una vez las relaciones que usan las propiedades calculadas.
+        
+        Precarga las presentaciones e imágenes de cada producto para que
+        precio_desde, tiene_oferta, tiene_stock, presentacion_principal,
+        imagenes_galeria, etc. se calculen en memoria sin nuevas consultas.
+        
+        Returns:
+            QuerySet: Productos con categoría, marca y relaciones precargadas.
+        """
+        return self.select_related(
+            'categoria', 'marca', 'presentacion_destacada'
+        ).prefetch_related(
+            models.Prefetch(
+                'presentaciones',
+                queryset=Presentacion.objects.order_by('precio', 'orden')
+            ),
+            models.Prefetch(
+                'imagenes',
+                queryset=ImagenProducto.objects.order_by('-es_principal', 'orden')
+            ),
+        )
 
 
 class Producto(models.Model):
@@ -297,6 +691,9 @@ class Producto(models.Model):
         destacado (bool): Indica si el producto está destacado.
         fecha_creacion (datetime): Fecha de creación del registro.
         fecha_actualizacion (datetime): Fecha de última actualización.
+        busqueda_nombre (str): Nombre, modelo, marca y categoría normalizados
+            para la búsqueda de texto completo.
+        busqueda_descripcion (str): Descripciones normalizadas, sin HTML.
     
     Nota:
         Las imágenes del producto se gestionan a través del modelo ImagenProducto.
@@ -368,6 +765,100 @@ class Producto(models.Model):
         verbose_name='Fecha de actualización'
     )
     
+    # Texto normalizado para la búsqueda de texto completo (ver busqueda.py).
+    # Se recalcula en save() y al renombrar la marca o la categoría.
+    busqueda_nombre = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Texto de búsqueda (nombre)',
+        help_text='Nombre, modelo, marca y categoría normalizados'
+    )
+    busqueda_descripcion = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Texto de búsqueda (descripción)',
+        help_text='Descripción corta y detallada normalizadas, sin HTML'
+    )
+    
+    # Resumen desnormalizado para las tarjetas de listado.
+    # Se recalcula con actualizar_resumen() al guardar o eliminar
+    # presentaciones e imágenes del producto.
+    precio_min = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Precio desde'
+    )
+    en_oferta = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='En oferta'
+    )
+    descuento_max = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Descuento máximo',
+        help_text='Mayor porcentaje de descuento entre las presentaciones activas'
+    )
+    con_stock = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Con stock'
+    )
+    imagen_principal_ruta = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name='Ruta de la imagen principal'
+    )
+    imagen_principal_variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Variantes de la imagen principal'
+    )
+    imagen_principal_ancho = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ancho de la imagen principal'
+    )
+    imagen_principal_alto = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Alto de la imagen principal'
+    )
+    imagen_principal_lqip = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Vista previa de la imagen principal'
+    )
+    cantidad_presentaciones = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Presentaciones activas'
+    )
+    presentacion_destacada = models.ForeignKey(
+        'Presentacion',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name='+',
+        verbose_name='Presentación principal'
+    )
+    version_tarjeta = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        verbose_name='Versión de la tarjeta',
+        help_text='Cambia con cada modificación para invalidar la tarjeta en caché'
+    )
+    
+    objects = ProductoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
@@ -376,6 +867,24 @@ class Producto(models.Model):
             models.Index(fields=['slug']),
             models.Index(fields=['categoria']),
             models.Index(fields=['activo', 'destacado']),
+            # Paginación por cursor de cada orden del listado (ver paginacion.py).
+            # Parciales: el filtro activo=True se escribe WHERE "activo", que
+            # SQLite no usa como prefijo de un índice normal.
+            models.Index(
+                fields=['-fecha_creacion', '-id'],
+                condition=Q(activo=True),
+                name='catalogo_producto_recientes'
+            ),
+            models.Index(
+                fields=['precio_min', 'id'],
+                condition=Q(activo=True),
+                name='catalogo_producto_precio'
+            ),
+            models.Index(
+                fields=['-descuento_max', '-id'],
+                condition=Q(activo=True),
+                name='catalogo_producto_descuento'
+            ),
         ]
     
     def __str__(self):
@@ -401,14 +910,121 @@ class Producto(models.Model):
         if not self.slug or self.nombre != self._nombre_original:
             self.slug = slugify(self.nombre)
         
+        # Invalidar la tarjeta en caché
+        self.version_tarjeta = uuid.uuid4()
+        
+        # Texto de la búsqueda de texto completo
+        for campo, valor in textos_busqueda(self).items():
+            setattr(self, campo, valor)
+        
         super().save(*args, **kwargs)
+        indexar(self, self._state.db)
+        invalidar_paginas()
         # Actualizar nombre original después de guardar
         self._nombre_original = self.nombre
     
+    def delete(self, *args, **kwargs):
+        """
+        Elimina el producto, lo quita del índice de búsqueda e invalida las
+        páginas del catálogo en caché.
+        """
+        pk, db = self.pk, self._state.db
+        resultado = super().delete(*args, **kwargs)
+        desindexar(pk, db)
+        invalidar_paginas()
+        return resultado
+    
+    def actualizar_busqueda(self):
+        """
+        Recalcula el texto de búsqueda con un UPDATE directo, sin pasar por
+        save(). Se usa cuando cambia el nombre de la marca o la categoría.
+        """
+        valores = textos_busqueda(self)
+        Producto.objects.filter(pk=self.pk).update(**valores)
+        for campo, valor in valores.items():
+            setattr(self, campo, valor)
+        indexar(self, self._state.db)
+    
     def get_absolute_url(self):
         """Retorna la URL absoluta del producto."""
         return reverse('catalogo:producto_detalle', kwargs={'slug': self.slug})
     
+    def actualizar_resumen(self):
+        """
+        Recalcula el resumen desnormalizado que usan las tarjetas de producto.
+        
+        Lee las presentaciones activas y las imágenes una sola vez y guarda
+        el resultado con un UPDATE directo, sin pasar por save() ni modificar
+        fecha_actualizacion. También renueva version_tarjeta e invalida las
+        páginas del catálogo en caché.
+        """
+        presentaciones = list(
+            self.presentaciones.filter(activo=True).order_by('precio')
+        )
+        con_stock = [p for p in presentaciones if p.stock > 0]
+        destacada = (con_stock or presentaciones or [None])[0]
+        imagen = self.imagenes.first()
+        
+        valores = {
+            'precio_min': min(
+                (p.precio_actual for p in presentaciones), default=None
+            ),
+            'en_oferta': any(p.tiene_oferta for p in presentaciones),
+            'descuento_max': max(
+                [0] + [p.porcentaje_descuento for p in presentaciones]
+            ),
+            'con_stock': bool(con_stock),
+            'imagen_principal_ruta': imagen.imagen.name if imagen else '',
+            'imagen_principal_variantes': imagen.variantes if imagen else {},
+            'imagen_principal_ancho': imagen.imagen_ancho if imagen else None,
+            'imagen_principal_alto': imagen.imagen_alto if imagen else None,
+            'imagen_principal_lqip': imagen.imagen_lqip if imagen else '',
+            'cantidad_presentaciones': len(presentaciones),
+            'presentacion_destacada': destacada,
+            'version_tarjeta': uuid.uuid4(),
+        }
+        Producto.objects.filter(pk=self.pk).update(**valores)
+        for campo, valor in valores.items():
+            setattr(self, campo, valor)
+        invalidar_paginas()
+    
+    @property
+    def imagen_tarjeta_url(self):
+        """
+        Retorna la URL de la imagen principal usando el resumen desnormalizado.
+        
+        A diferencia de imagen_principal_url, no ejecuta consultas. Si la
+        imagen tiene variantes, retorna la de tamaño 'card'.
+        """
+        if self.imagen_principal_variantes:
+            return url_variante(self.imagen_principal_variantes, 'card')
+        if self.imagen_principal_ruta:
+            storage = ImagenProducto._meta.get_field('imagen').storage
+            return storage.url(self.imagen_principal_ruta)
+        return None
+    
+    def _esta_precargado(self, relacion):
+        """Indica si la relación ya fue cargada con prefetch_related."""
+        return relacion in getattr(self, '_prefetched_objects_cache', {})
+    
+    @property
+    def presentaciones_activas(self):
+        """
+        Retorna las presentaciones activas ordenadas por precio.
+        
+        Usa la caché de prefetch_related si existe; en caso contrario
+        ejecuta una sola consulta.
+        
+        Returns:
+            list: Presentaciones activas del producto.
+        """
+        if self._esta_precargado('presentaciones'):
+            return sorted(
+                (p for p in self.presentaciones.all() if p.activo),
+                key=lambda p: p.precio
+            )
+        return list(self.presentaciones.filter(activo=True).order_by('precio'))
+    
     @property
     def precio_desde(self):
         """
@@ -416,19 +1032,18 @@ class Producto(models.Model):
         
         Útil para mostrar "Desde $X" en listados de productos.
         """
-        presentaciones = self.presentaciones.filter(activo=True)
-        if presentaciones.exists():
-            precios = []
-            for p in presentaciones:
-                precios.append(p.precio_actual)
-            return min(precios)
-        return None
+        return min(
+            (p.precio_actual for p in self.presentaciones_activas),
+            default=None
+        )
     
     @property
     def tiene_oferta(self):
         """
         Indica si al menos una presentación tiene precio de oferta.
         """
+        if self._esta_precargado('presentaciones'):
+            return any(p.tiene_oferta for p in self.presentaciones_activas)
         return self.presentaciones.filter(
             activo=True, 
             precio_oferta__isnull=False
@@ -437,6 +1052,8 @@ class Producto(models.Model):
     @property
     def tiene_stock(self):
         """Indica si al menos una presentación tiene stock disponible."""
+        if self._esta_precargado('presentaciones'):
+            return any(p.stock > 0 for p in self.presentaciones_activas)
         return self.presentaciones.filter(activo=True, stock__gt=0).exists()
     
     @property
@@ -450,17 +1067,15 @@ class Producto(models.Model):
         Returns:
             Presentacion: Primera presentación activa con stock o None.
         """
-        # Buscar presentación activa con stock, ordenada por precio
-        presentacion = self.presentaciones.filter(
-            activo=True, 
-            stock__gt=0
-        ).order_by('precio').first()
+        presentaciones = self.presentaciones_activas
         
-        if presentacion:
-            return presentacion
+        # Buscar presentación activa con stock, ordenada por precio
+        for presentacion in presentaciones:
+            if presentacion.stock > 0:
+                return presentacion
         
         # Si no hay con stock, retornar cualquier presentación activa
-        return self.presentaciones.filter(activo=True).order_by('precio').first()
+        return presentaciones[0] if presentaciones else None
     
     @property
     def disponible(self):
@@ -478,16 +1093,9 @@ class Producto(models.Model):
         Returns:
             str: URL de la imagen o None si no hay imágenes.
         """
-        # Buscar imagen marcada como principal
-        imagen_principal = self.imagenes.filter(es_principal=True).first()
-        if imagen_principal:
-            return imagen_principal.imagen.url
-        
-        # Usar primera imagen de la galería (ordenada por orden)
-        primera_imagen = self.imagenes.first()
-        if primera_imagen:
-            return primera_imagen.imagen.url
-        
+        imagen = self.imagen_principal_obj
+        if imagen:
+            return imagen.imagen.url
         return None
     
     @property
@@ -495,12 +1103,15 @@ class Producto(models.Model):
         """
         Retorna el objeto ImagenProducto marcado como principal.
         
+        Las imágenes se ordenan con la principal primero, por lo que
+        basta con tomar la primera.
+        
         Returns:
             ImagenProducto: Imagen principal o primera imagen disponible.
         """
-        imagen = self.imagenes.filter(es_principal=True).first()
-        if imagen:
-            return imagen
+        if self._esta_precargado('imagenes'):
+            imagenes = self.imagenes.all()
+            return imagenes[0] if imagenes else None
         return self.imagenes.first()
     
     @property
@@ -518,6 +1129,8 @@ class Producto(models.Model):
         """
         Retorna las imágenes que deben mostrarse en la galería principal.
         """
+        if self._esta_precargado('imagenes'):
+            return [i for i in self.imagenes.all() if i.mostrar_en_galeria]
         return self.imagenes.filter(mostrar_en_galeria=True)
     
     @property
@@ -525,16 +1138,22 @@ class Producto(models.Model):
         """
         Retorna las imágenes que deben mostrarse en la descripción larga.
         """
+        if self._esta_precargado('imagenes'):
+            return [i for i in self.imagenes.all() if i.mostrar_en_descripcion]
         return self.imagenes.filter(mostrar_en_descripcion=True)
     
     @property
     def tiene_videos(self):
         """Indica si el producto tiene videos asociados."""
+        if self._esta_precargado('videos'):
+            return bool(self.videos.all())
         return self.videos.exists()
     
     @property
     def tiene_especificaciones(self):
         """Indica si el producto tiene especificaciones técnicas."""
+        if self._esta_precargado('especificaciones'):
+            return bool(self.especificaciones.all())
         return self.especificaciones.exists()
 
 
@@ -627,6 +1246,17 @@ class Presentacion(models.Model):
         """Retorna una descripción de la presentación."""
         return f"{self.producto.nombre} - {self.nombre}"
     
+    def save(self, *args, **kwargs):
+        """Guarda la presentación y actualiza el resumen del producto."""
+        super().save(*args, **kwargs)
+        self.producto.actualizar_resumen()
+    
+    def delete(self, *args, **kwargs):
+        """Elimina la presentación y actualiza el resumen del producto."""
+        resultado = super().delete(*args, **kwargs)
+        self.producto.actualizar_resumen()
+        return resultado
+    
     @property
     def precio_actual(self):
         """
@@ -673,6 +1303,12 @@ class ImagenProducto(models.Model):
     Atributos:
         producto (ForeignKey): Producto al que pertenece la imagen.
         imagen (ImageField): Archivo de imagen.
+        variantes (dict): Versiones reducidas de la imagen por tamaño.
+        imagen_ancho (int): Ancho en píxeles de la imagen.
+        imagen_alto (int): Alto en píxeles de la imagen.
+        imagen_peso (int): Tamaño del archivo en bytes.
+        imagen_hash (str): SHA-256 del contenido del archivo.
+        imagen_lqip (str): Vista previa diminuta de la imagen (data URI).
         titulo (str): Título descriptivo de la imagen.
         es_principal (bool): Indica si es la imagen principal del producto.
         mostrar_en_galeria (bool): Si aparece en la galería superior.
@@ -688,8 +1324,50 @@ class ImagenProducto(models.Model):
     )
     imagen = models.ImageField(
         upload_to='productos/galeria/',
+        validators=[validar_pixeles],
         verbose_name='Imagen'
     )
+    variantes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Variantes',
+        help_text='Versiones reducidas de la imagen por tamaño'
+    )
+    imagen_ancho = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ancho de la imagen',
+        help_text='Ancho en píxeles del archivo optimizado'
+    )
+    imagen_alto = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Alto de la imagen',
+        help_text='Alto en píxeles del archivo optimizado'
+    )
+    imagen_peso = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Peso de la imagen',
+        help_text='Tamaño del archivo en bytes'
+    )
+    imagen_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name='Hash de la imagen',
+        help_text='SHA-256 del contenido del archivo'
+    )
+    imagen_lqip = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Vista previa de la imagen',
+        help_text='WebP diminuto (data URI) que se muestra mientras carga la imagen'
+    )
     titulo = models.CharField(
         max_length=200,
         blank=True,
@@ -736,15 +1414,10 @@ class ImagenProducto(models.Model):
     def save(self, *args, **kwargs):
         """
         Sobrescribe save para asegurar que solo haya una imagen principal
-        y convertir la imagen a WebP.
+        y encolar la conversión de la imagen a WebP.
         
         Si esta imagen se marca como principal, desmarca las demás.
         """
-        # Convertir imagen a WebP si es necesario
-        if self.imagen and necesita_conversion(self.imagen):
-            nuevo_contenido, nuevo_nombre = procesar_imagen(self.imagen)
-            self.imagen.save(nuevo_nombre, nuevo_contenido, save=False)
-        
         if self.es_principal:
             # Desmarcar otras imágenes principales del mismo producto
             ImagenProducto.objects.filter(
@@ -752,6 +1425,14 @@ class ImagenProducto(models.Model):
                 es_principal=True
             ).exclude(pk=self.pk).update(es_principal=False)
         super().save(*args, **kwargs)
+        _encolar_optimizacion(self, 'imagen', 'variantes')
+        self.producto.actualizar_resumen()
+    
+    def delete(self, *args, **kwargs):
+        """Elimina la imagen y actualiza el resumen del producto."""
+        resultado = super().delete(*args, **kwargs)
+        self.producto.actualizar_resumen()
+        return resultado
 
 
 class VideoProducto(models.Model):
@@ -799,6 +1480,11 @@ class VideoProducto(models.Model):
         """Retorna el título del video."""
         return f"{self.producto.nombre} - {self.titulo}"
     
+    def save(self, *args, **kwargs):
+        """Guarda el video e invalida las páginas del catálogo en caché."""
+        super().save(*args, **kwargs)
+        invalidar_paginas()
+    
     @property
     def youtube_id(self):
         """
@@ -877,4 +1563,185 @@ class EspecificacionProducto(models.Model):
     
     def __str__(self):
         """Retorna nombre: valor."""
-        return f"{self.nombre}: {self.valor}"
\ No newline at end of file
+        return f"{self.nombre}: {self.valor}"
+    
+    def save(self, *args, **kwargs):
+        """Guarda la especificación e invalida las páginas del catálogo en caché."""
+        super().save(*args, **kwargs)
+        invalidar_paginas()
+
+
+class TrabajoImagen(models.Model):
+    """
+    Cola de trabajos de optimización de imágenes.
+    
+    Al guardar una categoría, marca o imagen de producto con un archivo
+    nuevo se encola un trabajo; el comando 'procesar_imagenes' lo convierte
+    a WebP y genera sus variantes fuera de la petición. Hasta entonces se
+    muestra el archivo original.
+    
+    Atributos:
+        modelo (str): Etiqueta del modelo (ej: 'catalogo.ImagenProducto').
+        objeto_id (int): Clave primaria del registro.
+        campo (str): Nombre del campo de imagen.
+        nombre_original (str): Archivo que había al encolar el trabajo.
+        estado (str): pendiente, procesando, completado, fallido o reemplazado.
+        intentos (int): Intentos realizados.
+        proximo_intento (datetime): Momento a partir del cual puede procesarse.
+        ultimo_error (str): Mensaje del último error.
+        creado (datetime): Fecha de creación.
+        terminado (datetime): Fecha en que terminó el procesamiento.
+    """
+    
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+        ('reemplazado', 'Reemplazado'),
+    ]
+    
+    # Campo de variantes que corresponde a cada campo de imagen
+    CAMPOS_VARIANTES = {
+        'catalogo.Categoria': {'imagen': 'imagen_variantes'},
+        'catalogo.Marca': {'logo': 'logo_variantes'},
+        'catalogo.ImagenProducto': {'imagen': 'variantes'},
+    }
+    
+    modelo = models.CharField(
+        max_length=100,
+        verbose_name='Modelo'
+    )
+    objeto_id = models.PositiveBigIntegerField(
+        verbose_name='ID del registro'
+    )
+    campo = models.CharField(
+        max_length=50,
+        verbose_name='Campo'
+    )
+    nombre_original = models.CharField(
+        max_length=255,
+        verbose_name='Archivo original'
+    )
+    estado = models.CharField(
+        max_length=12,
+        choices=ESTADO_CHOICES,
+        default='pendiente',
+        verbose_name='Estado'
+    )
+    intentos = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Intentos'
+    )
+    proximo_intento = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Próximo intento'
+    )
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name='Último error'
+    )
+    creado = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+    terminado = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de término'
+    )
+    
+    class Meta:
+        verbose_name = 'Trabajo de imagen'
+        verbose_name_plural = 'Trabajos de imágenes'
+        ordering = ['-creado']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento']),
+            models.Index(fields=['modelo', 'objeto_id']),
+        ]
+        constraints = [
+            # Un solo trabajo pendiente por imagen (ver encolar)
+            models.UniqueConstraint(
+                fields=['modelo', 'objeto_id', 'campo'],
+                condition=Q(estado='pendiente'),
+                name='catalogo_trabajo_pendiente_unico',
+            ),
+        ]
+    
+    def __str__(self):
+        """Retorna el archivo y el estado del trabajo."""
+        return f"{self.nombre_original} ({self.get_estado_display()})"
+    
+    @classmethod
+    def encolar(cls, instancia, campo):
+        """
+        Encola la optimización de un campo de imagen.
+        
+        Si ya hay un trabajo pendiente para el mismo registro y campo, se
+        reutiliza con el archivo nuevo. La restricción
+        'catalogo_trabajo_pendiente_unico' impide que dos guardados
+        simultáneos creen dos pendientes: el que llega segundo actualiza el
+        del primero.
+        
+        Args:
+            instancia: Registro del modelo ya guardado.
+            campo (str): Nombre del campo de imagen.
+        
+        Returns:
+            TrabajoImagen: El trabajo pendiente.
+        """
+        pendiente = cls.objects.filter(
+            modelo=instancia._meta.label,
+            objeto_id=instancia.pk,
+            campo=campo,
+            estado='pendiente',
+        )
+        datos = {
+            'nombre_original': getattr(instancia, campo).name,
+            'intentos': 0,
+            'proximo_intento': timezone.now(),
+            'ultimo_error': '',
+        }
+        if not pendiente.update(**datos):
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(
+                        modelo=instancia._meta.label,
+                        objeto_id=instancia.pk,
+                        campo=campo,
+                        **datos
+                    )
+            except IntegrityError:
+                # Otro proceso lo creó entretanto
+                pendiente.update(**datos)
+        return pendiente.get()
+    
+    @classmethod
+    def ultimo_de(cls, instancia, campo):
+        """
+        Retorna el trabajo más reciente de un registro, o None.
+        
+        Args:
+            instancia: Registro del modelo.
+            campo (str): Nombre del campo de imagen.
+        """
+        return cls.objects.filter(
+            modelo=instancia._meta.label,
+            objeto_id=instancia.pk,
+            campo=campo,
+        ).order_by('-creado', '-pk').first()
+    
+    @property
+    def campo_variantes(self):
+        """Nombre del campo de variantes del registro."""
+        return self.CAMPOS_VARIANTES[self.modelo][self.campo]
+    
+    def obtener_objeto(self):
+        """
+        Retorna el registro al que pertenece el trabajo.
+        
+        Returns:
+            Model | None: El registro, o None si fue eliminado.
+        """
+        modelo = apps.get_model(self.modelo)
+        return modelo.objects.filter(pk=self.objeto_id).first()
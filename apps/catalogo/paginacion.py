@@ -0,0 +1,233 @@
+"""
+Paginación por cursor (keyset) de los listados del catálogo.
+
+La paginación por número de página (OFFSET) obliga a la base de datos a
+leer y descartar todas las filas anteriores, así que cada página es más
+lenta que la anterior, y además necesita un COUNT del total. Un rastreador
+que recorre todas las páginas de un listado grande la satura.
+
+Con un cursor, cada página continúa después de la última fila de la
+anterior: se filtra por los valores de las columnas de ordenamiento
+(por ejemplo, fecha_creacion < X o fecha_creacion = X e id < Y) y se
+leen solo las filas de la página, usando el índice de esas columnas.
+Cuesta lo mismo la primera página que la número mil.
+
+El cursor viaja en el parámetro ?cursor= de los enlaces Anterior y
+Siguiente. El total de productos no se calcula aquí: la vista lo toma de
+los conteos de facetas, que se guardan en caché.
+
+Uso:
+    >>> paginador = PaginadorCursor(queryset, 12, ('-fecha_creacion', '-id'))
+    >>> pagina = paginador.pagina(request.GET.get('cursor'))
+"""
+
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.http import Http404
+
+
+# Prefijos del cursor: páginas siguientes o anteriores a la fila guardada
+HACIA_ADELANTE = 'n'
+HACIA_ATRAS = 'p'
+
+
+def _serializar(valor):
+    """
+    Convierte un valor de ordenamiento en un valor JSON sin perder precisión.
+    
+    DjangoJSONEncoder recorta las fechas a milisegundos, y el cursor necesita
+    el valor exacto para compararlo con la columna.
+    """
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+class PaginaCursor:
+    """
+    Página de un listado paginado por cursor.
+    
+    Imita la interfaz de django.core.paginator.Page que usan las
+    plantillas, sin números de página.
+    
+    Atributos:
+        object_list (list): Registros de la página.
+        paginator (PaginadorCursor): Paginador de la página.
+        cursor_siguiente (str | None): Cursor de la página siguiente.
+        cursor_anterior (str | None): Cursor de la página anterior.
+    """
+    
+    def __init__(self, object_list, paginator, cursor_siguiente, cursor_anterior):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        """Indica si hay una página siguiente."""
+        return self.cursor_siguiente is not None
+    
+    def has_previous(self):
+        """Indica si hay una página anterior."""
+        return self.cursor_anterior is not None
+    
+    def has_other_pages(self):
+        """Indica si el listado tiene más de una página."""
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorCursor:
+    """
+    Pagina un queryset por los valores de sus columnas de ordenamiento.
+    
+    Las columnas deben identificar cada fila de forma única (terminar en la
+    clave primaria). En las que admiten nulos, NULL se ordena como mayor
+    que cualquier valor (al final en orden ascendente y al principio en
+    descendente), como hace PostgreSQL por defecto, así que los índices de
+    esas columnas se siguen usando.
+    
+    Atributos:
+        count (int | None): Total de registros, si se conoce.
+    """
+    
+    def __init__(self, queryset, por_pagina, orden, count=None):
+        """
+        Args:
+            queryset: QuerySet a paginar.
+            por_pagina (int): Registros por página.
+            orden (tuple): Columnas de ordenamiento, con '-' si son
+                descendentes (ej: ('-fecha_creacion', '-id')).
+            count (int): Total de registros (opcional, solo informativo).
+        """
+        self.queryset = queryset
+        self.por_pagina = por_pagina
+        self.orden = [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+        self.count = count
+    
+    def pagina(self, cursor=None):
+        """
+        Retorna la página que indica un cursor (la primera si no hay cursor).
+        
+        Raises:
+            Http404: Si el cursor no es válido.
+        """
+        if cursor:
+            direccion, valores = self._decodificar(cursor)
+        else:
+            direccion, valores = HACIA_ADELANTE, None
+        hacia_atras = direccion == HACIA_ATRAS
+        
+        queryset = self.ordenado(hacia_atras)
+        if valores is not None:
+            queryset = queryset.filter(self._despues_de(valores, hacia_atras))
+        
+        # Una fila de más indica si hay otra página en esta dirección
+        filas = list(queryset[:self.por_pagina + 1])
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina]
+        if hacia_atras:
+            filas.reverse()
+        
+        siguiente = anterior = None
+        if filas:
+            if hay_mas or hacia_atras:
+                siguiente = self._codificar(HACIA_ADELANTE, filas[-1])
+            if (hay_mas and hacia_atras) or (valores is not None and not hacia_atras):
+                anterior = self._codificar(HACIA_ATRAS, filas[0])
+        return PaginaCursor(filas, self, siguiente, anterior)
+    
+    def ordenado(self, hacia_atras=False):
+        """
+        Retorna el queryset ordenado por las columnas, en el sentido dado.
+        
+        Args:
+            hacia_atras (bool): Invierte el orden (páginas anteriores).
+        """
+        columnas = []
+        for campo, descendente in self.orden:
+            descendente = descendente != hacia_atras
+            if not self._admite_nulos(campo):
+                columnas.append(f'-{campo}' if descendente else campo)
+            elif descendente:
+                columnas.append(F(campo).desc(nulls_first=True))
+            else:
+                columnas.append(F(campo).asc(nulls_last=True))
+        return self.queryset.order_by(*columnas)
+    
+    def _admite_nulos(self, campo):
+        """Indica si una columna de ordenamiento admite valores nulos."""
+        return self.queryset.model._meta.get_field(campo).null
+    
+    def _despues_de(self, valores, hacia_atras):
+        """
+        Condición de las filas posteriores a los valores, en el sentido dado.
+        
+        Para ('-fecha_creacion', '-id') hacia adelante:
+        fecha_creacion < X OR (fecha_creacion = X AND id < Y)
+        
+        NULL es mayor que cualquier valor: después de X hacia los mayores
+        también van los NULL, y después de NULL hacia los menores van todos
+        los valores.
+        """
+        condicion = Q()
+        iguales = Q()
+        for (campo, descendente), valor in zip(self.orden, valores):
+            hacia_mayores = descendente == hacia_atras
+            if valor is None:
+                posteriores = None if hacia_mayores else Q(**{f'{campo}__isnull': False})
+                igual = Q(**{f'{campo}__isnull': True})
+            else:
+                operador = 'gt' if hacia_mayores else 'lt'
+                posteriores = Q(**{f'{campo}__{operador}': valor})
+                if hacia_mayores and self._admite_nulos(campo):
+                    posteriores |= Q(**{f'{campo}__isnull': True})
+                igual = Q(**{campo: valor})
+            if posteriores is not None:
+                condicion |= iguales & posteriores
+            iguales &= igual
+        return condicion
+    
+    def _codificar(self, direccion, fila):
+        """Genera el cursor con los valores de ordenamiento de una fila."""
+        valores = [_serializar(getattr(fila, campo)) for campo, _ in self.orden]
+        datos = json.dumps([direccion, *valores])
+        return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    def _decodificar(self, cursor):
+        """
+        Lee la dirección y los valores de un cursor.
+        
+        Raises:
+            Http404: Si el cursor no es válido.
+        """
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            direccion, *valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if direccion not in (HACIA_ADELANTE, HACIA_ATRAS) or len(valores) != len(self.orden):
+                raise ValueError(cursor)
+            modelo = self.queryset.model
+            valores = [
+                modelo._meta.get_field(campo).to_python(valor)
+                for (campo, _), valor in zip(self.orden, valores)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise Http404('Cursor de página no válido')
+        if any(
+            valor is None and not self._admite_nulos(campo)
+            for (campo, _), valor in zip(self.orden, valores)
+        ):
+            raise Http404('Cursor de página no válido')
+        return direccion, valores
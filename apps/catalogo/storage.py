@@ -0,0 +1,194 @@
+"""
+Almacenamiento de archivos multimedia direccionado por contenido.
+
+Cada archivo se guarda con el hash SHA-256 de su contenido como nombre,
+dentro de la carpeta que indica el campo (upload_to). Subir dos veces la
+misma foto o el mismo logo, o generar dos veces la misma variante,
+reutiliza el archivo que ya existe en lugar de crear una copia.
+
+Como el contenido de una URL no cambia nunca, Nginx puede servir estos
+archivos con caché permanente (Cache-Control: immutable).
+
+Junto a cada WebP se guardan sus versiones alternativas en AVIF y JPEG
+('<hash>.webp.avif', '<hash>.webp.jpg'), que Nginx entrega según la
+cabecera Accept del navegador sin cambiar la URL (ver
+utils.guardar_alternativas).
+
+Un mismo archivo puede estar referenciado por varios registros, así que no
+se elimina al dejar de usarlo: el comando recolectar_archivos elimina los
+que ningún registro referencia y que no se han escrito ni reutilizado
+durante el período de gracia.
+
+Las imágenes que se suben desde el editor de descripciones (CKEditor 5)
+usan AlmacenamientoCKEditor, que además las optimiza como las del catálogo.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+
+
+# Nombre de un archivo guardado por contenido: hash SHA-256 y extensión
+PATRON_NOMBRE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+# Sufijos de las versiones alternativas de un WebP, en orden de preferencia
+SUFIJOS_ALTERNATIVAS = ('.avif', '.jpg')
+
+# Nombre de una versión alternativa: el del WebP más el sufijo del formato
+PATRON_ALTERNATIVA = re.compile(r'^[0-9a-f]{64}\.webp\.(avif|jpg)$')
+
+
+def hash_contenido(content):
+    """
+    Calcula el hash SHA-256 de un archivo de Django leyéndolo por bloques.
+    
+    Args:
+        content: File, ContentFile o UploadedFile.
+    
+    Returns:
+        str: Hash en hexadecimal.
+    """
+    sha = hashlib.sha256()
+    for bloque in content.chunks():
+        sha.update(bloque)
+    return sha.hexdigest()
+
+
+def es_nombre_por_contenido(nombre):
+    """Indica si un nombre de archivo es el de un archivo guardado por contenido."""
+    return bool(PATRON_NOMBRE.match(posixpath.basename(nombre)))
+
+
+def origen_alternativa(nombre):
+    """
+    Retorna la ruta del WebP del que deriva una versión alternativa.
+    
+    Args:
+        nombre (str): Ruta de un archivo.
+    
+    Returns:
+        str | None: Ruta del WebP, o None si no es una versión alternativa.
+    """
+    if PATRON_ALTERNATIVA.match(posixpath.basename(nombre)):
+        return nombre.rsplit('.', 1)[0]
+    return None
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """
+    FileSystemStorage que nombra los archivos por el hash de su contenido.
+    
+    Ejemplo:
+        >>> default_storage.save('productos/galeria/foto.png', contenido)
+        'productos/galeria/3a7bd3e2360a3d29eea436fcfb7e44c735d117c4...png'
+    """
+    
+    def _save(self, name, content):
+        """
+        Guarda el archivo con su hash como nombre, salvo que ya exista.
+        
+        El archivo se escribe con un nombre temporal y se renombra al
+        terminar, así que nunca se sirve a medio escribir aunque dos
+        procesos guarden el mismo contenido a la vez.
+        
+        Las versiones alternativas conservan su nombre: su contenido depende
+        solo del WebP del que derivan.
+        """
+        if origen_alternativa(name):
+            ruta = name
+        else:
+            extension = os.path.splitext(name)[1].lower()
+            ruta = posixpath.join(
+                posixpath.dirname(name), f'{hash_contenido(content)}{extension}'
+            )
+        if self.exists(ruta):
+            # Reutilizarlo cuenta como escribirlo: recolectar_archivos no lo
+            # elimina antes de que se guarde el registro que ahora lo usa
+            self._renovar(ruta)
+            return ruta
+        
+        temporal = super()._save(f'{ruta}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporal), self.path(ruta))
+        return ruta
+    
+    def _renovar(self, ruta):
+        """Actualiza la fecha de modificación del archivo y de sus alternativas."""
+        for nombre in (ruta, *(f'{ruta}{sufijo}' for sufijo in SUFIJOS_ALTERNATIVAS)):
+            try:
+                os.utime(self.path(nombre))
+            except FileNotFoundError:
+                pass
+    
+    def get_available_name(self, name, max_length=None):
+        """Las versiones alternativas no se renombran aunque ya existan."""
+        if origen_alternativa(name):
+            return name
+        return super().get_available_name(name, max_length)
+    
+    def delete(self, name):
+        """Elimina el archivo junto con sus versiones alternativas."""
+        super().delete(name)
+        if name and name.endswith('.webp'):
+            for sufijo in SUFIJOS_ALTERNATIVAS:
+                super().delete(f'{name}{sufijo}')
+
+
+class AlmacenamientoCKEditor(AlmacenamientoPorContenido):
+    """
+    Almacenamiento de las imágenes subidas desde CKEditor 5.
+    
+    django-ckeditor-5 guarda cada subida con storage().save(nombre, archivo)
+    y usa la URL resultante en el HTML de la descripción. Este
+    almacenamiento la guarda en CKEDITOR_5_UPLOAD_PATH convertida a WebP
+    y limitada a IMAGE_SIZES['full'] (utils.procesar_imagen), con sus
+    versiones AVIF y JPEG, como las imágenes de productos. Al nombrarse por
+    contenido, pegar la misma imagen en varias descripciones reutiliza el
+    mismo archivo.
+    
+    La conversión se hace durante la subida, no en la cola de imágenes,
+    porque el editor necesita la URL definitiva para insertarla en el HTML.
+    Las imágenes animadas se guardan sin convertir para no perder la
+    animación.
+    
+    Ejemplo:
+        >>> AlmacenamientoCKEditor().save('captura.png', contenido)
+        'ckeditor/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.webp'
+    """
+    
+    def _save(self, name, content):
+        """
+        Convierte la imagen a WebP y la guarda en la carpeta del editor.
+        
+        Raises:
+            ImagenDemasiadoGrande: Si supera IMAGEN_PIXELES_MAXIMOS (la vista
+                views.subir_imagen_editor la responde como error de subida).
+        """
+        # Importación local: utils importa este módulo
+        from .utils import guardar_alternativas, procesar_imagen, tiene_alternativas
+        
+        if origen_alternativa(name):
+            return super()._save(name, content)
+        
+        carpeta = settings.CKEDITOR_5_UPLOAD_PATH.strip('/')
+        content.seek(0)
+        with Image.open(content) as img:
+            animada = getattr(img, 'is_animated', False)
+        content.seek(0)
+        if animada:
+            return super()._save(posixpath.join(carpeta, posixpath.basename(name)), content)
+        
+        contenido, nombre = procesar_imagen(content)
+        ruta = super()._save(posixpath.join(carpeta, nombre), contenido)
+        
+        # Si la imagen ya existía, sus versiones alternativas también
+        if not tiene_alternativas(self, ruta):
+            contenido.seek(0)
+            with Image.open(contenido) as img:
+                guardar_alternativas(self, ruta, img.convert('RGB'))
+        return ruta
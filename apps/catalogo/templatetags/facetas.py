@@ -0,0 +1,26 @@
+"""
+Filtros de plantilla para el panel de facetas del listado.
+
+Uso:
+    {% load facetas %}
+    {{ categoria.nombre }} ({{ facetas.categorias|conteo:categoria.pk }})
+"""
+
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def conteo(conteos, clave):
+    """
+    Retorna el conteo de una opción de faceta (ver facetas.contar).
+    
+    Args:
+        conteos (dict): Conteos de una faceta, por ejemplo facetas.categorias.
+        clave: ID o slug de la opción.
+    
+    Returns:
+        int: Productos de la opción (0 si no tiene).
+    """
+    return (conteos or {}).get(clave, 0)
@@ -0,0 +1,122 @@
+"""
+Etiquetas de plantilla para imágenes responsivas.
+
+Usan las variantes de tamaño que generan los modelos del catálogo
+(ver utils.generar_variantes) para que el navegador descargue solo
+la resolución que necesita.
+
+Uso:
+    {% load imagenes %}
+    <img src="{{ producto.imagen_tarjeta_url }}"
+         {% atributos_srcset producto.imagen_principal_variantes "25vw" %}>
+"""
+
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from apps.catalogo.utils import url_miniatura, url_variante
+
+
+register = template.Library()
+
+
+@register.filter
+def srcset(variantes):
+    """
+    Retorna el valor del atributo srcset para las variantes de una imagen.
+    
+    Args:
+        variantes (dict): Variantes registradas en el modelo.
+    
+    Returns:
+        str: Candidatos 'url ancho' ordenados de menor a mayor ancho.
+    """
+    if not variantes:
+        return ''
+    candidatos = sorted(variantes.values(), key=lambda datos: datos['ancho'])
+    return ', '.join(
+        f"{default_storage.url(datos['ruta'])} {datos['ancho']}w"
+        for datos in candidatos
+    )
+
+
+@register.filter
+def variante(variantes, nombre):
+    """
+    Retorna la URL de una variante concreta, o la del original si no existe.
+    
+    Ejemplo:
+        {{ imagen.variantes|variante:"thumbnail" }}
+    """
+    return url_variante(variantes, nombre) or ''
+
+
+@register.filter
+def miniatura(ruta, tamaño):
+    """
+    Retorna la URL firmada de una miniatura generada bajo demanda.
+    
+    Sirve para tamaños que no tienen variante guardada; la miniatura se
+    genera la primera vez que se pide (ver views.miniatura).
+    
+    Ejemplo:
+        {{ imagen.imagen.name|miniatura:"thumbnail" }}
+    """
+    if not ruta:
+        return ''
+    return url_miniatura(ruta, tamaño)
+
+
+@register.simple_tag
+def atributos_srcset(variantes, sizes='100vw'):
+    """
+    Genera los atributos srcset y sizes de una etiqueta <img>.
+    
+    Si la imagen no tiene variantes no genera nada y el navegador usa src.
+    
+    Args:
+        variantes (dict): Variantes registradas en el modelo.
+        sizes (str): Ancho con el que se muestra la imagen en la página.
+    
+    Returns:
+        str: Atributos HTML escapados.
+    """
+    valor = srcset(variantes)
+    if not valor:
+        return ''
+    return format_html('srcset="{}" sizes="{}"', valor, sizes)
+
+
+@register.simple_tag
+def atributos_dimensiones(ancho, alto):
+    """
+    Genera los atributos width y height de una etiqueta <img>.
+    
+    Con ellos el navegador reserva el espacio de la imagen antes de
+    descargarla y la página no se desplaza al cargar. Si las dimensiones
+    todavía no se conocen (imagen sin procesar) no genera nada.
+    
+    Ejemplo:
+        <img src="..." {% atributos_dimensiones imagen.imagen_ancho imagen.imagen_alto %}>
+    """
+    if not ancho or not alto:
+        return ''
+    return format_html('width="{}" height="{}"', ancho, alto)
+
+
+@register.simple_tag
+def atributos_lqip(lqip):
+    """
+    Genera el atributo style que muestra la vista previa de una imagen.
+    
+    La vista previa (ver utils.generar_lqip) va incrustada como fondo de la
+    etiqueta <img>: se pinta con el HTML y la imagen real la cubre al
+    cargar. Si la imagen todavía no tiene vista previa no genera nada.
+    
+    Ejemplo:
+        <img src="..." {% atributos_lqip producto.imagen_principal_lqip %}>
+    """
+    if not lqip:
+        return ''
+    return format_html('style="background-image: url({})"', lqip)
@@ -0,0 +1,34 @@
+"""
+Etiquetas de plantilla para las páginas que se guardan en la caché compartida.
+
+Una página en caché se sirve igual a todos los visitantes anónimos, así que
+no puede llevar el token CSRF de quien la renderizó primero. Los formularios
+de esas páginas usan csrf_pagina en lugar de {% csrf_token %}: el campo sale
+vacío y el navegador lo completa con el token del visitante consultando
+'carrito:resumen' (ver base.html).
+
+Uso:
+    {% load pagina_cache %}
+    <form method="post">{% csrf_pagina %}...</form>
+"""
+
+from django import template
+from django.template.defaulttags import CsrfTokenNode
+from django.utils.html import format_html
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def csrf_pagina(context):
+    """
+    Retorna el campo oculto del token CSRF.
+    
+    Si la página se está renderizando para la caché (request.pagina_en_cache)
+    el campo va vacío y no se genera ningún token, así la respuesta tampoco
+    envía la cookie CSRF. En otro caso equivale a {% csrf_token %}.
+    """
+    if getattr(context.get('request'), 'pagina_en_cache', False):
+        return format_html('<input type="hidden" name="csrfmiddlewaretoken" value="">')
+    return CsrfTokenNode().render(context)
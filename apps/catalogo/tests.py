@@ -9,6 +9,7 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from decimal import Decimal
 
+from .cache import invalidar_paginas
 from .models import (
     Categoria,
     Marca,
@@ -16,7 +17,8 @@ from .models import (
     Presentacion,
     ImagenProducto,
     VideoProducto,
-    EspecificacionProducto
+    EspecificacionProducto,
+    TrabajoImagen
 )
 
 
@@ -464,7 +466,7 @@ class ProductoDetalleViewTest(TestCase):
             precio=Decimal('100.00'),
             stock=5
         )
-        
+    
     def test_vista_detalle_producto(self):
         """Verifica que la vista de detalle funciona correctamente."""
         url = reverse('catalogo:producto_detalle', kwargs={'slug': self.producto.slug})
@@ -509,3 +511,2083 @@ class ProductoDetalleViewTest(TestCase):
         
         self.assertIn('imagenes_galeria', response.context)
         self.assertIn('imagenes_descripcion', response.context)
+
+
+class ResumenProductoTest(TestCase):
+    """Pruebas para el resumen desnormalizado de las tarjetas de producto."""
+    
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.categoria = Categoria.objects.create(nombre='Alimentos')
+        self.producto = Producto.objects.create(
+            nombre='Alimento Test',
+            categoria=self.categoria
+        )
+    
+    def test_resumen_vacio_sin_presentaciones(self):
+        """Verifica los valores del resumen de un producto sin presentaciones."""
+        self.assertIsNone(self.producto.precio_min)
+        self.assertFalse(self.producto.con_stock)
+        self.assertEqual(self.producto.cantidad_presentaciones, 0)
+        self.assertIsNone(self.producto.imagen_tarjeta_url)
+    
+    def test_resumen_se_actualiza_con_presentaciones(self):
+        """Verifica que guardar presentaciones recalcula el resumen."""
+        Presentacion.objects.create(
+            producto=self.producto, nombre='100ml', precio=Decimal('30.00'), stock=0
+        )
+        barata = Presentacion.objects.create(
+            producto=self.producto, nombre='250ml', precio=Decimal('50.00'),
+            precio_oferta=Decimal('20.00'), stock=3
+        )
+        
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.assertEqual(producto.precio_min, Decimal('20.00'))
+        self.assertTrue(producto.en_oferta)
+        self.assertTrue(producto.con_stock)
+        self.assertEqual(producto.cantidad_presentaciones, 2)
+        self.assertEqual(producto.presentacion_destacada, barata)
+        
+        barata.delete()
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.assertEqual(producto.precio_min, Decimal('30.00'))
+        self.assertFalse(producto.en_oferta)
+        self.assertFalse(producto.con_stock)
+        self.assertEqual(producto.cantidad_presentaciones, 1)
+    
+    def _crear_productos(self, cantidad, inicio=0):
+        """Crea productos activos con una presentación cada uno."""
+        for i in range(inicio, inicio + cantidad):
+            producto = Producto.objects.create(
+                nombre=f'Producto {i}',
+                categoria=self.categoria
+            )
+            Presentacion.objects.create(
+                producto=producto, nombre='Única', precio=Decimal('10.00'), stock=1
+            )
+    
+    def _contar_consultas(self, url):
+        """Retorna cuántas consultas ejecuta una petición GET a la URL."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        # Medir el renderizado completo, no la página guardada en caché
+        invalidar_paginas()
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.get(url)
+        return len(contexto.captured_queries)
+    
+    def test_listado_con_consultas_constantes(self):
+        """Verifica que el listado no ejecuta consultas por cada tarjeta."""
+        url = reverse('catalogo:producto_lista')
+        self._crear_productos(2)
+        self.client.get(url)
+        consultas_pocas = self._contar_consultas(url)
+        
+        self._crear_productos(10, inicio=2)
+        self.assertEqual(self._contar_consultas(url), consultas_pocas)
+
+
+class ProductoPrecargaTest(TestCase):
+    """Pruebas para las propiedades calculadas con relaciones precargadas."""
+    
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.categoria = Categoria.objects.create(nombre='Filtros')
+        self.producto = Producto.objects.create(
+            nombre='Filtro Precarga',
+            categoria=self.categoria
+        )
+        Presentacion.objects.create(
+            producto=self.producto, nombre='Grande', precio=Decimal('90.00'), stock=2
+        )
+        self.agotada = Presentacion.objects.create(
+            producto=self.producto, nombre='Chica', precio=Decimal('40.00'),
+            precio_oferta=Decimal('35.00'), stock=0
+        )
+        Presentacion.objects.create(
+            producto=self.producto, nombre='Inactiva', precio=Decimal('10.00'),
+            stock=5, activo=False
+        )
+    
+    def test_propiedades_sin_consultas_adicionales(self):
+        """Verifica que las propiedades usan la caché de con_datos_tarjeta()."""
+        producto = Producto.objects.con_datos_tarjeta().get(pk=self.producto.pk)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(producto.precio_desde, Decimal('35.00'))
+            self.assertTrue(producto.tiene_oferta)
+            self.assertTrue(producto.tiene_stock)
+            self.assertEqual(producto.presentacion_principal.nombre, 'Grande')
+            self.assertEqual(len(producto.presentaciones_activas), 2)
+            self.assertEqual(list(producto.imagenes_galeria), [])
+            self.assertIsNone(producto.imagen_principal_url)
+    
+    def test_propiedades_sin_precarga_coinciden(self):
+        """Verifica que sin precarga las propiedades dan el mismo resultado."""
+        producto = Producto.objects.get(pk=self.producto.pk)
+        
+        self.assertEqual(producto.precio_desde, Decimal('35.00'))
+        self.assertTrue(producto.tiene_oferta)
+        self.assertTrue(producto.tiene_stock)
+        self.assertEqual(producto.presentacion_principal.nombre, 'Grande')
+        
+        self.agotada.stock = 3
+        self.agotada.save()
+        self.assertEqual(producto.presentacion_principal, self.agotada)
+
+
+class TarjetaCacheTest(TestCase):
+    """Pruebas para la caché de fragmentos de las tarjetas de producto."""
+    
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        from django.core.cache import cache
+        cache.clear()
+        
+        self.categoria = Categoria.objects.create(nombre='Lámparas')
+        self.producto = Producto.objects.create(
+            nombre='Lámpara Cache',
+            categoria=self.categoria
+        )
+        self.presentacion = Presentacion.objects.create(
+            producto=self.producto, nombre='30cm', precio=Decimal('100.00'), stock=4
+        )
+        self.url = reverse('catalogo:producto_lista')
+    
+    def test_tarjeta_se_sirve_desde_cache(self):
+        """Verifica que un cambio sin nueva versión no re-renderiza la tarjeta."""
+        self.assertNotContains(self.client.get(self.url), 'badge-nuevo">Destacado')
+        
+        # update() no pasa por save(), así que la versión no cambia
+        Producto.objects.filter(pk=self.producto.pk).update(destacado=True)
+        invalidar_paginas()
+        self.assertNotContains(self.client.get(self.url), 'badge-nuevo">Destacado')
+        
+        self.producto.destacado = True
+        self.producto.save()
+        self.assertContains(self.client.get(self.url), 'badge-nuevo">Destacado')
+    
+    def test_guardar_presentacion_invalida_tarjeta(self):
+        """Verifica que guardar una presentación invalida la tarjeta."""
+        self.assertContains(self.client.get(self.url), 'S/ 100.00')
+        
+        self.presentacion.precio = Decimal('80.00')
+        self.presentacion.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'S/ 80.00')
+        self.assertNotContains(response, 'S/ 100.00')
+    
+    def test_renombrar_categoria_invalida_tarjeta(self):
+        """Verifica que renombrar la categoría invalida sus tarjetas."""
+        self.client.get(self.url)
+        
+        self.categoria.nombre = 'Iluminación'
+        self.categoria.save()
+        self.assertContains(self.client.get(self.url), 'Iluminación')
+    
+    def test_formulario_fuera_de_cache(self):
+        """Verifica que el botón de agregar refleja el stock actual."""
+        self.assertContains(self.client.get(self.url), 'btn-add-cart')
+        
+        Presentacion.objects.filter(pk=self.presentacion.pk).update(stock=0)
+        invalidar_paginas()
+        self.assertContains(self.client.get(self.url), 'Agotado')
+
+
+class PaginaCacheTest(TestCase):
+    """Pruebas para la caché de páginas completas del catálogo."""
+    
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.categoria = Categoria.objects.create(nombre='Acuarios')
+        self.producto = Producto.objects.create(
+            nombre='Acuario Cache',
+            categoria=self.categoria
+        )
+        self.presentacion = Presentacion.objects.create(
+            producto=self.producto, nombre='60L', precio=Decimal('300.00'), stock=2
+        )
+        self.url = reverse('catalogo:producto_detalle', kwargs={'slug': self.producto.slug})
+    
+    def test_segunda_visita_desde_cache(self):
+        """Verifica que la segunda visita anónima se sirve desde caché."""
+        primera = self.client.get(self.url)
+        self.assertEqual(primera['X-Cache-Pagina'], 'MISS')
+        
+        with self.assertNumQueries(0):
+            segunda = Client().get(self.url)
+        self.assertEqual(segunda['X-Cache-Pagina'], 'HIT')
+        self.assertEqual(segunda.content, primera.content)
+    
+    def test_pagina_no_incluye_carrito_del_visitante(self):
+        """Verifica que la página en caché no muestra el carrito de la sesión."""
+        self.client.post(
+            reverse('carrito:agregar', args=[self.presentacion.id]),
+            {'cantidad': 1}
+        )
+        # La primera visita muestra el mensaje de "agregado" y no se cachea
+        self.assertContains(self.client.get(self.url), '<span class="cart-badge"')
+        response = self.client.get(self.url)
+        
+        self.assertNotContains(response, '<span class="cart-badge"')
+        self.assertContains(response, reverse('carrito:resumen'))
+    
+    def test_save_invalida_pagina(self):
+        """Verifica que guardar el producto invalida la página en caché."""
+        self.client.get(self.url)
+        
+        self.producto.descripcion_corta = 'Texto actualizado'
+        self.producto.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache-Pagina'], 'MISS')
+        self.assertContains(response, 'Texto actualizado')
+    
+    def test_invalida_al_confirmar(self):
+        """Verifica que la versión de las páginas vuelve a cambiar con el commit."""
+        from .cache import version_paginas
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.producto.save()
+            # Lo que se cachee antes del commit queda con esta versión
+            version = version_paginas()
+        
+        self.assertTrue(callbacks)
+        self.assertNotEqual(version_paginas(), version)
+    
+    def test_token_csrf_no_se_comparte(self):
+        """Verifica que la página en caché no lleva el token CSRF de ningún visitante."""
+        import re
+        from django.conf import settings
+        
+        urls = [self.url, reverse('catalogo:producto_lista'), reverse('catalogo:inicio')]
+        for url in urls:
+            respuestas = [Client().get(url), Client().get(url)]
+            self.assertEqual(
+                [r['X-Cache-Pagina'] for r in respuestas], ['MISS', 'HIT']
+            )
+            for response in respuestas:
+                html = response.content.decode()
+                self.assertFalse(re.findall(r'name="csrfmiddlewaretoken" value="[^"]+"', html))
+                self.assertNotIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.assertContains(respuestas[1], 'name="csrfmiddlewaretoken" value=""')
+    
+    def test_parametros_desconocidos_no_se_cachean(self):
+        """Verifica que solo se cachean los parámetros que usa la vista, en cualquier orden."""
+        from django.core.cache import cache
+        
+        listado = reverse('catalogo:producto_lista')
+        cache.clear()
+        
+        self.assertNotIn('X-Cache-Pagina', self.client.get(self.url, {'x': '1'}))
+        self.assertNotIn('X-Cache-Pagina', self.client.get(listado, {'utm': 'a'}))
+        self.assertEqual(self.client.get(listado + '?stock=1&oferta=1')['X-Cache-Pagina'], 'MISS')
+        self.assertEqual(self.client.get(listado + '?oferta=1&stock=1')['X-Cache-Pagina'], 'HIT')
+    
+    def test_acierto_conserva_cabeceras(self):
+        """Verifica que la página servida desde caché conserva sus cabeceras."""
+        primera = self.client.get(self.url)
+        segunda = Client().get(self.url)
+        
+        self.assertEqual(segunda['X-Cache-Pagina'], 'HIT')
+        self.assertEqual(segunda['Content-Type'], primera['Content-Type'])
+        self.assertEqual(segunda.get('Content-Language'), primera.get('Content-Language'))
+    
+    def test_resumen_carrito(self):
+        """Verifica que el resumen JSON entrega la cantidad y el token CSRF."""
+        self.client.post(
+            reverse('carrito:agregar', args=[self.presentacion.id]),
+            {'cantidad': 2}
+        )
+        datos = self.client.get(reverse('carrito:resumen')).json()
+        
+        self.assertEqual(datos['cantidad_carrito'], 2)
+        self.assertTrue(datos['csrf_token'])
+
+
+class CategoriaRutaTest(TestCase):
+    """Pruebas para la ruta materializada del árbol de categorías."""
+    
+    def setUp(self):
+        """Configuración inicial: Plantas > Fondo > Vallisnerias > Gigantes."""
+        self.raiz = Categoria.objects.create(nombre='Plantas')
+        self.hija = Categoria.objects.create(nombre='Fondo', categoria_padre=self.raiz)
+        self.nieta = Categoria.objects.create(nombre='Vallisnerias', categoria_padre=self.hija)
+        self.bisnieta = Categoria.objects.create(nombre='Gigantes', categoria_padre=self.nieta)
+        self.otra = Categoria.objects.create(nombre='Peces')
+    
+    def test_ruta_calculada(self):
+        """Verifica que la ruta contiene los IDs de los ancestros."""
+        self.assertEqual(self.raiz.ruta, '/')
+        self.assertEqual(self.nieta.ruta, f'/{self.raiz.pk}/{self.hija.pk}/')
+        self.assertEqual(self.bisnieta.nivel, 3)
+    
+    def test_subcategorias_con_una_consulta(self):
+        """Verifica que las subcategorías se obtienen con una sola consulta."""
+        with self.assertNumQueries(1):
+            todas = self.raiz.obtener_todas_subcategorias()
+        self.assertEqual(
+            {c.pk for c in todas},
+            {self.hija.pk, self.nieta.pk, self.bisnieta.pk}
+        )
+    
+    def test_subarbol_inactivo_se_excluye(self):
+        """Verifica que una subcategoría inactiva oculta a sus descendientes."""
+        self.nieta.activo = False
+        self.nieta.save()
+        
+        self.assertEqual(self.raiz.obtener_ids_subarbol(), [self.raiz.pk, self.hija.pk])
+    
+    def test_ruta_completa_con_una_consulta(self):
+        """Verifica que la ruta completa se arma con una sola consulta."""
+        with self.assertNumQueries(1):
+            ruta = self.bisnieta.obtener_ruta_completa()
+        self.assertEqual(ruta, 'Plantas > Fondo > Vallisnerias > Gigantes')
+    
+    def test_mover_categoria_actualiza_subarbol(self):
+        """Verifica que mover una categoría actualiza la ruta de sus descendientes."""
+        self.hija.categoria_padre = self.otra
+        self.hija.save()
+        
+        self.bisnieta.refresh_from_db()
+        self.assertEqual(
+            self.bisnieta.ruta,
+            f'/{self.otra.pk}/{self.hija.pk}/{self.nieta.pk}/'
+        )
+        self.assertEqual(self.raiz.obtener_todas_subcategorias(), [])
+    
+    def test_listado_incluye_productos_de_cualquier_nivel(self):
+        """Verifica que el listado de una categoría incluye todo su subárbol."""
+        producto = Producto.objects.create(nombre='Vallisneria Gigante', categoria=self.bisnieta)
+        Presentacion.objects.create(
+            producto=producto, nombre='Maceta', precio=Decimal('15.00'), stock=3
+        )
+        
+        self.assertEqual(self.raiz.contar_productos(), 1)
+        url = reverse('catalogo:categoria_detalle', kwargs={'categoria_slug': self.raiz.slug})
+        self.assertContains(self.client.get(url), 'Vallisneria Gigante')
+
+
+class NavegacionCategoriasTest(TestCase):
+    """Pruebas para la copia en memoria del árbol de navegación."""
+    
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        from .cache import navegacion_categorias
+        
+        self.navegacion = navegacion_categorias
+        self.raiz = Categoria.objects.create(nombre='Equipos')
+        Categoria.objects.create(nombre='Filtros Externos', categoria_padre=self.raiz)
+        self.url = reverse('carrito:detalle')
+    
+    def test_segunda_peticion_usa_copia_en_memoria(self):
+        """Verifica que el menú no consulta categorías si no cambió la versión."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.assertContains(self.client.get(self.url), 'Filtros Externos')
+        aciertos = self.navegacion.aciertos
+        
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Filtros Externos')
+        self.assertEqual(self.navegacion.aciertos, aciertos + 1)
+        self.assertFalse(
+            [q for q in contexto.captured_queries if 'catalogo_categoria' in q['sql']]
+        )
+    
+    def test_guardar_categoria_recarga_arbol(self):
+        """Verifica que guardar una categoría obliga a recargar el árbol."""
+        self.client.get(self.url)
+        fallos = self.navegacion.fallos
+        
+        Categoria.objects.create(nombre='Calentadores', categoria_padre=self.raiz)
+        self.assertContains(self.client.get(self.url), 'Calentadores')
+        self.assertEqual(self.navegacion.fallos, fallos + 1)
+        self.assertEqual(self.navegacion.estadisticas()['fallos'], fallos + 1)
+    
+    def test_version_se_comprueba_cada_cierto_tiempo(self):
+        """Verifica que la versión no se lee de la caché en cada petición."""
+        from unittest import mock
+        from django.core.cache import cache
+        from django.test import override_settings
+        from . import cache as modulo_cache
+        
+        self.client.get(self.url)
+        with mock.patch.object(
+            modulo_cache, '_obtener_version', wraps=modulo_cache._obtener_version
+        ) as obtener:
+            self.client.get(self.url)
+            self.assertFalse(obtener.called)
+        
+        # Otro proceso cambió el árbol: se nota en la siguiente comprobación
+        Categoria.objects.filter(pk=self.raiz.pk).update(nombre='Equipos Pro')
+        cache.set(modulo_cache.CLAVE_VERSION_NAVEGACION, 'otro-proceso', None)
+        self.assertNotContains(self.client.get(self.url), 'Equipos Pro')
+        with override_settings(CACHE_NAVEGACION_SEGUNDOS=0):
+            self.assertContains(self.client.get(self.url), 'Equipos Pro')
+    
+    def test_eliminar_seleccionados_recarga_arbol(self):
+        """Verifica que eliminar categorías con QuerySet.delete() recarga el árbol."""
+        self.assertContains(self.client.get(self.url), 'Filtros Externos')
+        
+        Categoria.objects.filter(nombre='Filtros Externos').delete()
+        
+        self.assertNotContains(self.client.get(self.url), 'Filtros Externos')
+
+
+def crear_imagen_subida(nombre='foto.png', tamaño=(1600, 1000), modo='RGB'):
+    """Crea un archivo de imagen en memoria para subirlo en las pruebas."""
+    from io import BytesIO
+    from PIL import Image
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    
+    buffer = BytesIO()
+    Image.new(modo, tamaño, (20, 120, 90, 255)[:len(modo)]).save(buffer, format='PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+def procesar_cola():
+    """Ejecuta el worker de imágenes hasta vaciar la cola."""
+    from io import StringIO
+    from django.core.management import call_command
+    
+    salida = StringIO()
+    call_command('procesar_imagenes', '--una-vez', stdout=salida)
+    return salida.getvalue()
+
+
+class VariantesImagenTest(TestCase):
+    """Pruebas para las variantes de tamaño de las imágenes."""
+    
+    def setUp(self):
+        """Usa un directorio temporal como MEDIA_ROOT."""
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        self.categoria = Categoria.objects.create(nombre='Fondos')
+        self.producto = Producto.objects.create(nombre='Fondo 3D', categoria=self.categoria)
+    
+    def test_imagen_producto_genera_variantes(self):
+        """Verifica que subir una imagen genera todas las variantes de tamaño."""
+        import os
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida(),
+            es_principal=True
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        
+        anchos = {nombre: datos['ancho'] for nombre, datos in imagen.variantes.items()}
+        self.assertEqual(anchos, {'thumbnail': 150, 'card': 400, 'detail': 800, 'full': 1200})
+        self.assertEqual(imagen.variantes['full']['ruta'], imagen.imagen.name)
+        for datos in imagen.variantes.values():
+            self.assertTrue(os.path.exists(os.path.join(self.media, datos['ruta'])))
+        
+        imagen.refresh_from_db()
+        self.assertEqual(imagen.variantes['card']['ancho'], 400)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagen_principal_variantes, imagen.variantes)
+        self.assertEqual(
+            self.producto.imagen_tarjeta_url,
+            imagen.imagen.storage.url(imagen.variantes['card']['ruta'])
+        )
+    
+    def test_no_genera_variantes_mas_grandes_que_el_original(self):
+        """Verifica que solo se generan variantes más pequeñas que el original."""
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida(tamaño=(300, 300), modo='RGBA')
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        
+        self.assertEqual(set(imagen.variantes), {'thumbnail', 'full'})
+    
+    def test_guardar_sin_cambiar_imagen_no_regenera(self):
+        """Verifica que las variantes solo se regeneran si cambia la imagen."""
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida()
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        variantes = imagen.variantes
+        
+        imagen.titulo = 'Vista frontal'
+        imagen.save()
+        
+        self.assertEqual(imagen.variantes, variantes)
+        self.assertFalse(TrabajoImagen.objects.filter(estado='pendiente').exists())
+    
+    def test_categoria_y_marca(self):
+        """Verifica que la imagen de categoría y el logo de marca tienen variantes."""
+        self.categoria.imagen = crear_imagen_subida('categoria.jpg')
+        self.categoria.save()
+        marca = Marca.objects.create(nombre='Backflow', logo=crear_imagen_subida('logo.png', (500, 200)))
+        procesar_cola()
+        self.categoria.refresh_from_db()
+        marca.refresh_from_db()
+        
+        self.assertIn('card', self.categoria.imagen_variantes)
+        self.assertEqual(marca.logo_variantes['thumbnail']['ancho'], 150)
+    
+    def test_archivo_inexistente(self):
+        """Verifica que una imagen sin archivo deja el error en su trabajo."""
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen='productos/galeria/no-existe.webp'
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        
+        self.assertEqual(imagen.variantes, {})
+        trabajo = TrabajoImagen.ultimo_de(imagen, 'imagen')
+        self.assertEqual(trabajo.estado, 'pendiente')
+        self.assertEqual(trabajo.intentos, 1)
+        self.assertTrue(trabajo.ultimo_error)
+    
+    def test_guardar_no_convierte(self):
+        """Verifica que save() guarda el original y deja un trabajo pendiente."""
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida('acuario.png')
+        )
+        
+        self.assertTrue(imagen.imagen.name.endswith('.png'))
+        self.assertEqual(imagen.variantes, {})
+        trabajo = TrabajoImagen.ultimo_de(imagen, 'imagen')
+        self.assertEqual(trabajo.estado, 'pendiente')
+        self.assertEqual(trabajo.nombre_original, imagen.imagen.name)
+        
+        self.producto.refresh_from_db()
+        self.assertTrue(self.producto.imagen_tarjeta_url.endswith('.png'))
+    
+    def test_worker_completa_trabajo(self):
+        """Verifica que el worker convierte la imagen y cierra el trabajo."""
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida('acuario.png'),
+            es_principal=True
+        )
+        original = imagen.imagen.path
+        
+        salida = procesar_cola()
+        
+        imagen.refresh_from_db()
+        self.assertTrue(imagen.imagen.name.endswith('.webp'))
+        self.assertEqual(TrabajoImagen.ultimo_de(imagen, 'imagen').estado, 'completado')
+        # El original lo elimina recolectar_archivos
+        self.assertTrue(os.path.exists(original))
+        call_command('recolectar_archivos', '--gracia', '0', stdout=StringIO())
+        self.assertFalse(os.path.exists(original))
+        self.assertFalse(TrabajoImagen.objects.filter(estado='pendiente').exists())
+        self.assertIn('✅', salida)
+        self.producto.refresh_from_db()
+        self.assertEqual(
+            self.producto.imagen_tarjeta_url,
+            imagen.imagen.storage.url(imagen.variantes['card']['ruta'])
+        )
+    
+    def test_imagen_reemplazada_antes_de_procesar(self):
+        """Verifica que un trabajo de una imagen ya reemplazada no se aplica."""
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida('primera.png')
+        )
+        trabajo = TrabajoImagen.ultimo_de(imagen, 'imagen')
+        ImagenProducto.objects.filter(pk=imagen.pk).update(imagen='productos/galeria/otra.webp')
+        
+        procesar_cola()
+        
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'reemplazado')
+    
+    def test_etiqueta_srcset(self):
+        """Verifica que la etiqueta genera srcset ordenado y sizes."""
+        from django.template import Context, Template
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida()
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        html = Template(
+            '{% load imagenes %}<img {% atributos_srcset variantes "50vw" %}>'
+        ).render(Context({'variantes': imagen.variantes}))
+        
+        self.assertIn('sizes="50vw"', html)
+        self.assertLess(html.index(' 150w'), html.index(' 400w'))
+        self.assertLess(html.index(' 800w'), html.index(' 1200w'))
+        self.assertEqual(
+            Template('{% load imagenes %}{% atributos_srcset variantes %}').render(Context({'variantes': {}})),
+            ''
+        )
+    
+    def test_tarjeta_usa_srcset(self):
+        """Verifica que la tarjeta de producto incluye las variantes."""
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida()
+        )
+        Presentacion.objects.create(
+            producto=self.producto, nombre='Grande', precio=Decimal('90.00'), stock=2
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        invalidar_paginas()
+        
+        response = self.client.get(reverse('catalogo:producto_lista'))
+        
+        self.assertContains(response, f"{imagen.variantes['card']['ruta']} 400w")
+    
+    
+    def test_worker_invalida_paginas(self):
+        """Verifica que el worker invalida las páginas en caché al optimizar."""
+        from .cache import version_paginas
+        
+        ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida(),
+            es_principal=True
+        )
+        version = version_paginas()
+        
+        procesar_cola()
+        
+        self.assertNotEqual(version_paginas(), version)
+    
+    def test_worker_conserva_cambios_durante_la_conversion(self):
+        """Verifica que el worker no pisa los campos editados mientras convierte."""
+        from unittest import mock
+        from apps.catalogo.management.commands import procesar_imagenes
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida('acuario.png')
+        )
+        
+        convertir = procesar_imagenes.convertir_archivo
+        
+        def convertir_y_editar(*args):
+            # Edición en el admin mientras el worker convierte
+            ImagenProducto.objects.filter(pk=imagen.pk).update(
+                titulo='Vista lateral', mostrar_en_galeria=False
+            )
+            return convertir(*args)
+        
+        with mock.patch.object(procesar_imagenes, 'convertir_archivo', side_effect=convertir_y_editar):
+            procesar_cola()
+        
+        imagen.refresh_from_db()
+        self.assertTrue(imagen.imagen.name.endswith('.webp'))
+        self.assertEqual(imagen.titulo, 'Vista lateral')
+        self.assertFalse(imagen.mostrar_en_galeria)
+    
+    def test_un_solo_trabajo_pendiente(self):
+        """Verifica que reintentar un fallido con otro pendiente no duplica el pendiente."""
+        from django.contrib.auth.models import User
+        from django.db import IntegrityError, transaction
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida('acuario.png')
+        )
+        pendiente = TrabajoImagen.ultimo_de(imagen, 'imagen')
+        fallido = TrabajoImagen.objects.create(
+            modelo=pendiente.modelo, objeto_id=pendiente.objeto_id, campo='imagen',
+            nombre_original='productos/galeria/anterior.png', estado='fallido'
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TrabajoImagen.objects.create(
+                modelo=pendiente.modelo, objeto_id=pendiente.objeto_id, campo='imagen',
+                nombre_original=pendiente.nombre_original
+            )
+        
+        self.client.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        )
+        self.client.post(reverse('admin:catalogo_trabajoimagen_changelist'), {
+            'action': 'reintentar', '_selected_action': [fallido.pk],
+        })
+        
+        fallido.refresh_from_db()
+        self.assertEqual(fallido.estado, 'reemplazado')
+        # Guardar de nuevo reutiliza el único pendiente
+        imagen.imagen = crear_imagen_subida('otra.png')
+        imagen.save()
+        self.assertEqual(
+            TrabajoImagen.objects.filter(estado='pendiente').get().nombre_original,
+            imagen.imagen.name
+        )
+    
+    def test_admin_estado_sin_consulta_por_fila(self):
+        """Verifica que el listado del admin no consulta la cola por cada imagen."""
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        )
+        url = reverse('admin:catalogo_imagenproducto_changelist')
+        ImagenProducto.objects.create(producto=self.producto, imagen=crear_imagen_subida('a.png'))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as una_imagen:
+            self.client.get(url)
+        
+        for nombre in ('b.png', 'c.png', 'd.png'):
+            ImagenProducto.objects.create(producto=self.producto, imagen=crear_imagen_subida(nombre))
+        with CaptureQueriesContext(connection) as cuatro_imagenes:
+            response = self.client.get(url)
+        
+        self.assertEqual(len(cuatro_imagenes), len(una_imagen))
+        self.assertContains(response, 'Pendiente', count=4)
+
+
+class ConvertirImagenesComandoTest(TestCase):
+    """Pruebas para el comando convertir_imagenes_webp."""
+    
+    def setUp(self):
+        """Crea imágenes PNG antiguas, sin convertir, en un MEDIA_ROOT temporal."""
+        import shutil
+        import tempfile
+        from django.core.files.storage import default_storage
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        categoria = Categoria.objects.create(nombre='Decoración')
+        self.producto = Producto.objects.create(nombre='Roca Seiryu', categoria=categoria)
+        
+        # bulk_create evita save(), como las imágenes subidas antes de la conversión
+        nombres = [
+            default_storage.save(f'productos/galeria/roca{i}.png', crear_imagen_subida())
+            for i in range(3)
+        ]
+        ImagenProducto.objects.bulk_create([
+            ImagenProducto(producto=self.producto, imagen=nombre, orden=i)
+            for i, nombre in enumerate(nombres)
+        ])
+        self.checkpoint = f'{self.media}/avance.json'
+    
+    def _ejecutar(self, *args):
+        """Ejecuta el comando y retorna su salida."""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        salida = StringIO()
+        call_command(
+            'convertir_imagenes_webp', '--checkpoint', self.checkpoint, *args,
+            stdout=salida
+        )
+        return salida.getvalue()
+    
+    def test_convierte_en_paralelo(self):
+        """Verifica la conversión con varios procesos y el reporte de rendimiento."""
+        import os
+        
+        salida = self._ejecutar('--workers', '2', '--lote', '2')
+        
+        for imagen in ImagenProducto.objects.all():
+            self.assertTrue(imagen.imagen.name.endswith('.webp'))
+            self.assertEqual(set(imagen.variantes), {'thumbnail', 'card', 'detail', 'full'})
+            self.assertTrue(os.path.exists(imagen.imagen.path))
+        self.assertFalse(os.path.exists(f'{self.media}/productos/galeria/roca0.png'))
+        self.assertIn('3 imágenes convertidas', salida)
+        self.assertIn('imágenes/s', salida)
+        self.assertIn('MB escritos', salida)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        
+        self.producto.refresh_from_db()
+        self.assertTrue(self.producto.imagen_principal_ruta.endswith('.webp'))
+    
+    def test_continua_desde_checkpoint(self):
+        """Verifica que una nueva ejecución retoma desde el avance guardado."""
+        import json
+        
+        primera = ImagenProducto.objects.order_by('pk').first()
+        with open(self.checkpoint, 'w', encoding='utf-8') as archivo:
+            json.dump({'catalogo.ImagenProducto': primera.pk}, archivo)
+        
+        salida = self._ejecutar()
+        
+        primera.refresh_from_db()
+        self.assertTrue(primera.imagen.name.endswith('.png'))
+        self.assertEqual(
+            ImagenProducto.objects.filter(imagen__endswith='.webp').count(), 2
+        )
+        self.assertIn('Continuando desde el avance guardado', salida)
+    
+    def test_reintenta_fallidos_al_continuar(self):
+        """Verifica que el avance guardado no salta los registros que fallaron."""
+        import json
+        from unittest import mock
+        from apps.catalogo.management.commands import convertir_imagenes_webp
+        
+        primera, segunda, _ = ImagenProducto.objects.order_by('pk')
+        convertir = convertir_imagenes_webp.convertir_archivo
+        llamadas = []
+        
+        # Falla la primera imagen y se interrumpe en la tercera
+        def convertir_e_interrumpir(*args):
+            llamadas.append(args)
+            if len(llamadas) == 1:
+                return {'error': 'archivo dañado'}
+            if len(llamadas) == 3:
+                raise KeyboardInterrupt
+            return convertir(*args)
+        
+        with mock.patch.object(
+            convertir_imagenes_webp, 'convertir_archivo', side_effect=convertir_e_interrumpir
+        ), self.assertRaises(KeyboardInterrupt):
+            self._ejecutar('--lote', '1')
+        
+        with open(self.checkpoint, encoding='utf-8') as archivo:
+            avance = json.load(archivo)['catalogo.ImagenProducto']
+        self.assertEqual(avance, {'ultima_pk': segunda.pk, 'fallidos': [primera.pk]})
+        
+        salida = self._ejecutar('--lote', '1')
+        
+        self.assertEqual(
+            ImagenProducto.objects.filter(imagen__endswith='.webp').count(), 3
+        )
+        self.assertIn('2 imágenes convertidas', salida)
+    
+    def test_dry_run_no_modifica(self):
+        """Verifica que el modo dry-run no convierte ni guarda avance."""
+        import os
+        
+        salida = self._ejecutar('--dry-run')
+        
+        self.assertIn('Se convertirían 3 imágenes', salida)
+        self.assertFalse(ImagenProducto.objects.filter(imagen__endswith='.webp').exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class MetadatosImagenTest(TestCase):
+    """Pruebas para las dimensiones, el peso y el hash guardados de las imágenes."""
+    
+    def setUp(self):
+        """Usa un directorio temporal como MEDIA_ROOT."""
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        self.categoria = Categoria.objects.create(nombre='Sustratos')
+        self.producto = Producto.objects.create(nombre='Aquasoil', categoria=self.categoria)
+    
+    def test_worker_guarda_metadatos(self):
+        """Verifica que al procesar la imagen se guardan sus metadatos."""
+        import hashlib
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida(),
+            es_principal=True
+        )
+        self.assertIsNone(imagen.imagen_ancho)
+        
+        procesar_cola()
+        imagen.refresh_from_db()
+        
+        self.assertEqual((imagen.imagen_ancho, imagen.imagen_alto), (1200, 750))
+        with open(imagen.imagen.path, 'rb') as archivo:
+            contenido = archivo.read()
+        self.assertEqual(imagen.imagen_peso, len(contenido))
+        self.assertEqual(imagen.imagen_hash, hashlib.sha256(contenido).hexdigest())
+        
+        self.producto.refresh_from_db()
+        self.assertEqual(
+            (self.producto.imagen_principal_ancho, self.producto.imagen_principal_alto),
+            (1200, 750)
+        )
+    
+    def test_cambiar_imagen_descarta_metadatos(self):
+        """Verifica que los metadatos del archivo anterior no se conservan."""
+        marca = Marca.objects.create(nombre='ADA', logo=crear_imagen_subida('ada.png', (500, 200)))
+        procesar_cola()
+        marca.refresh_from_db()
+        self.assertEqual(marca.logo_ancho, 500)
+        
+        marca.logo = crear_imagen_subida('ada-nuevo.png', (300, 300))
+        marca.save()
+        
+        marca.refresh_from_db()
+        self.assertIsNone(marca.logo_ancho)
+        self.assertEqual(marca.logo_hash, '')
+        
+        procesar_cola()
+        marca.refresh_from_db()
+        self.assertEqual((marca.logo_ancho, marca.logo_alto), (300, 300))
+    
+    def test_obtener_dimensiones_usa_registro(self):
+        """Verifica que obtener_dimensiones no abre el archivo si hay metadatos."""
+        from unittest import mock
+        from .utils import obtener_dimensiones, imagen_excede_tamaño
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida()
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        
+        with mock.patch('apps.catalogo.utils.Image.open') as abrir:
+            self.assertEqual(obtener_dimensiones(imagen.imagen), (1200, 750))
+            self.assertFalse(imagen_excede_tamaño(imagen.imagen))
+        abrir.assert_not_called()
+    
+    def test_tarjeta_con_dimensiones(self):
+        """Verifica que la tarjeta de producto incluye width y height."""
+        ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida()
+        )
+        Presentacion.objects.create(
+            producto=self.producto, nombre='3 L', precio=Decimal('75.00'), stock=4
+        )
+        procesar_cola()
+        invalidar_paginas()
+        
+        response = self.client.get(reverse('catalogo:producto_lista'))
+        
+        self.assertContains(response, 'width="1200" height="750"')
+    
+    def test_worker_genera_vista_previa(self):
+        """Verifica que se guarda una vista previa diminuta y la tarjeta la incrusta."""
+        import base64
+        from io import BytesIO
+        from PIL import Image
+        
+        ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida()
+        )
+        Presentacion.objects.create(
+            producto=self.producto, nombre='3 L', precio=Decimal('75.00'), stock=4
+        )
+        procesar_cola()
+        invalidar_paginas()
+        
+        self.producto.refresh_from_db()
+        lqip = self.producto.imagen_principal_lqip
+        prefijo = 'data:image/webp;base64,'
+        self.assertTrue(lqip.startswith(prefijo))
+        with Image.open(BytesIO(base64.b64decode(lqip[len(prefijo):]))) as img:
+            self.assertEqual(img.size, (16, 10))
+        
+        response = self.client.get(reverse('catalogo:producto_lista'))
+        self.assertContains(response, f'style="background-image: url({lqip})"')
+    
+    def test_comando_completa_vista_previa(self):
+        """Verifica que el comando completa la vista previa aunque ya haya hash."""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto,
+            imagen=crear_imagen_subida(),
+            es_principal=True
+        )
+        procesar_cola()
+        ImagenProducto.objects.filter(pk=imagen.pk).update(imagen_lqip='')
+        
+        call_command('completar_metadatos_imagenes', stdout=StringIO())
+        
+        imagen.refresh_from_db()
+        self.assertTrue(imagen.imagen_lqip.startswith('data:image/webp;base64,'))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagen_principal_lqip, imagen.imagen_lqip)
+    
+    def test_comando_completa_metadatos(self):
+        """Verifica que el comando completa los metadatos de imágenes antiguas."""
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        
+        # bulk_create evita save(), como las imágenes anteriores a los metadatos
+        nombre = default_storage.save('productos/galeria/antigua.png', crear_imagen_subida(tamaño=(640, 480)))
+        ImagenProducto.objects.bulk_create([
+            ImagenProducto(producto=self.producto, imagen=nombre),
+            ImagenProducto(producto=self.producto, imagen='productos/galeria/no-existe.png'),
+        ])
+        
+        salida = StringIO()
+        call_command('completar_metadatos_imagenes', stdout=salida)
+        
+        imagen = ImagenProducto.objects.get(imagen=nombre)
+        self.assertEqual((imagen.imagen_ancho, imagen.imagen_alto), (640, 480))
+        self.assertEqual(len(imagen.imagen_hash), 64)
+        self.assertIn('1 imágenes actualizadas', salida.getvalue())
+        self.assertIn('1 errores', salida.getvalue())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagen_principal_ancho, 640)
+
+
+class AlmacenamientoPorContenidoTest(TestCase):
+    """Pruebas para el almacenamiento por contenido y la recolección de archivos."""
+    
+    def setUp(self):
+        """Usa un directorio temporal como MEDIA_ROOT."""
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        categoria = Categoria.objects.create(nombre='Iluminación')
+        self.productos = [
+            Producto.objects.create(nombre=f'Lámpara LED {i}', categoria=categoria)
+            for i in range(2)
+        ]
+    
+    def _archivos(self, carpeta='productos/galeria'):
+        """Retorna los archivos guardados en una carpeta del MEDIA_ROOT."""
+        import os
+        
+        ruta = os.path.join(self.media, carpeta)
+        return sorted(os.listdir(ruta)) if os.path.isdir(ruta) else []
+    
+    def test_mismo_contenido_mismo_archivo(self):
+        """Verifica que el mismo contenido se guarda una sola vez con su hash."""
+        import hashlib
+        from django.core.files.storage import default_storage
+        
+        subida = crear_imagen_subida('logo.PNG')
+        esperado = hashlib.sha256(subida.read()).hexdigest()
+        
+        primero = default_storage.save('marcas/logo.PNG', subida)
+        segundo = default_storage.save('marcas/otro-nombre.png', crear_imagen_subida())
+        
+        self.assertEqual(primero, f'marcas/{esperado}.png')
+        self.assertEqual(segundo, primero)
+        self.assertEqual(self._archivos('marcas'), [f'{esperado}.png'])
+    
+    def test_archivo_compartido_se_conserva(self):
+        """Verifica que eliminar un registro no borra un archivo que otro usa."""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        imagenes = [
+            ImagenProducto.objects.create(producto=producto, imagen=crear_imagen_subida())
+            for producto in self.productos
+        ]
+        procesar_cola()
+        for imagen in imagenes:
+            imagen.refresh_from_db()
+        self.assertEqual(imagenes[0].imagen.name, imagenes[1].imagen.name)
+        
+        imagenes[0].delete()
+        call_command('recolectar_archivos', '--gracia', '0', stdout=StringIO())
+        webp = [nombre for nombre in self._archivos() if nombre.endswith('.webp')]
+        self.assertEqual(len(webp), 4)
+        
+        # Con el último registro se eliminan también las versiones AVIF/JPEG
+        imagenes[1].delete()
+        call_command('recolectar_archivos', '--gracia', '0', stdout=StringIO())
+        self.assertEqual(self._archivos(), [])
+    
+    def test_reutiliza_conversion_previa(self):
+        """Verifica que la misma foto subida dos veces se convierte una sola vez."""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from apps.catalogo.management.commands import procesar_imagenes
+        
+        imagenes = [
+            ImagenProducto.objects.create(producto=producto, imagen=crear_imagen_subida('foto.png'))
+            for producto in self.productos
+        ]
+        
+        with mock.patch.object(
+            procesar_imagenes, 'convertir_archivo', wraps=procesar_imagenes.convertir_archivo
+        ) as convertir:
+            procesar_cola()
+        
+        self.assertEqual(convertir.call_count, 1)
+        for imagen in imagenes:
+            imagen.refresh_from_db()
+            self.assertTrue(imagen.imagen.name.endswith('.webp'))
+        self.assertEqual(imagenes[0].variantes, imagenes[1].variantes)
+        self.assertEqual(imagenes[0].imagen_hash, imagenes[1].imagen_hash)
+        # El PNG original ya no lo usa nadie
+        call_command('recolectar_archivos', '--gracia', '0', stdout=StringIO())
+        self.assertFalse([nombre for nombre in self._archivos() if nombre.endswith('.png')])
+    
+    def test_recolectar_archivos_huerfanos(self):
+        """Verifica que el comando elimina solo los archivos sin referencias."""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        ImagenProducto.objects.create(producto=self.productos[0], imagen=crear_imagen_subida())
+        ImagenProducto.objects.create(
+            producto=self.productos[1], imagen=crear_imagen_subida(tamaño=(900, 900))
+        )
+        procesar_cola()
+        
+        self.productos[1].delete()
+        webp = [nombre for nombre in self._archivos() if nombre.endswith('.webp')]
+        self.assertEqual(len(webp), 8)
+        
+        salida = StringIO()
+        call_command('recolectar_archivos', '--gracia', '0', stdout=salida)
+        
+        imagen = ImagenProducto.objects.get()
+        vigentes = {datos['ruta'].rsplit('/', 1)[1] for datos in imagen.variantes.values()}
+        # Quedan los WebP del registro restante y sus versiones alternativas
+        self.assertEqual({nombre.split('.webp')[0] + '.webp' for nombre in self._archivos()}, vigentes)
+        self.assertIn('Eliminados', salida.getvalue())
+    
+    def test_reutilizar_archivo_renueva_gracia(self):
+        """Verifica que recolectar_archivos respeta un archivo antiguo que se vuelve a subir."""
+        import os
+        import time
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        
+        ruta = default_storage.save('productos/galeria/foto.png', crear_imagen_subida())
+        hace_dos_horas = time.time() - 7200
+        os.utime(default_storage.path(ruta), (hace_dos_horas, hace_dos_horas))
+        
+        # Otra subida del mismo contenido, cuyo registro aún no se guarda
+        self.assertEqual(default_storage.save('productos/galeria/copia.png', crear_imagen_subida()), ruta)
+        call_command('recolectar_archivos', stdout=StringIO())
+        
+        self.assertTrue(default_storage.exists(ruta))
+
+
+class DecodificacionLimitadaTest(TestCase):
+    """Pruebas para la decodificación reducida y el límite de píxeles."""
+    
+    def _archivo(self, formato, tamaño, modo='RGB', color=(20, 120, 90)):
+        """Crea una imagen en memoria con el formato indicado."""
+        from io import BytesIO
+        from PIL import Image
+        
+        buffer = BytesIO()
+        Image.new(modo, tamaño, color).save(buffer, format=formato)
+        buffer.seek(0)
+        buffer.name = f'prueba.{formato.lower()}'
+        return buffer
+    
+    def test_jpeg_se_decodifica_reducido(self):
+        """Verifica que un JPEG grande se decodifica ya reducido con draft()."""
+        from django.test import override_settings
+        from .utils import abrir_imagen, procesar_imagen
+        
+        # 4000x3000 son 12 MP, pero para 400px basta decodificar 1000x750
+        with override_settings(IMAGEN_PIXELES_MAXIMOS=1_000_000):
+            img = abrir_imagen(self._archivo('JPEG', (4000, 3000)), (400, 400))
+            self.assertEqual(img.size, (400, 300))
+            
+            contenido, nombre = procesar_imagen(
+                self._archivo('JPEG', (4000, 3000)), max_size=(400, 400)
+            )
+        self.assertEqual(nombre, 'prueba.webp')
+        self.assertTrue(contenido.size > 0)
+    
+    def test_supera_limite_de_pixeles(self):
+        """Verifica que una imagen sin reducción al cargar respeta el límite."""
+        from django.test import override_settings
+        from .utils import ImagenDemasiadoGrande, procesar_imagen
+        
+        with override_settings(IMAGEN_PIXELES_MAXIMOS=1_000_000):
+            with self.assertRaises(ImagenDemasiadoGrande):
+                procesar_imagen(self._archivo('PNG', (2000, 1000), 'RGBA', (0, 0, 0, 0)))
+    
+    def test_transparencia_sobre_fondo_blanco(self):
+        """Verifica que la transparencia se compone sobre blanco tras reducir."""
+        from io import BytesIO
+        from PIL import Image
+        from .utils import procesar_imagen
+        
+        contenido, _ = procesar_imagen(
+            self._archivo('PNG', (2400, 1200), 'RGBA', (255, 0, 0, 0))
+        )
+        
+        with Image.open(BytesIO(contenido.read())) as img:
+            self.assertEqual(img.size, (1200, 600))
+            self.assertEqual(img.convert('RGB').getpixel((600, 300)), (255, 255, 255))
+    
+    def test_imagen_de_paleta(self):
+        """Verifica que las imágenes de paleta se reducen y convierten."""
+        from io import BytesIO
+        from PIL import Image
+        from .utils import procesar_imagen
+        
+        contenido, _ = procesar_imagen(self._archivo('GIF', (1600, 800), 'P', 3))
+        
+        with Image.open(BytesIO(contenido.read())) as img:
+            self.assertEqual((img.size, img.mode), ((1200, 600), 'RGB'))
+    
+    def test_validacion_al_subir(self):
+        """Verifica que el modelo rechaza subir una imagen demasiado grande."""
+        from django.core.exceptions import ValidationError
+        from django.test import override_settings
+        
+        categoria = Categoria.objects.create(nombre='Rocas')
+        producto = Producto.objects.create(nombre='Dragon Stone', categoria=categoria)
+        imagen = ImagenProducto(
+            producto=producto,
+            imagen=crear_imagen_subida(tamaño=(1500, 1000))
+        )
+        
+        with override_settings(IMAGEN_PIXELES_MAXIMOS=1_000_000):
+            with self.assertRaises(ValidationError) as error:
+                imagen.full_clean()
+        self.assertIn('imagen', error.exception.message_dict)
+        
+        # Dentro del límite la validación pasa
+        imagen.full_clean()
+
+
+class FormatosAlternativosTest(TestCase):
+    """Pruebas para las versiones AVIF/JPEG y su entrega según Accept."""
+    
+    def setUp(self):
+        """Usa un directorio temporal como MEDIA_ROOT y procesa una imagen."""
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        categoria = Categoria.objects.create(nombre='Plantas')
+        producto = Producto.objects.create(nombre='Monte Carlo', categoria=categoria)
+        self.imagen = ImagenProducto.objects.create(producto=producto, imagen=self._foto())
+        procesar_cola()
+        self.imagen.refresh_from_db()
+    
+    def _foto(self):
+        """Crea una imagen con degradados y ruido, como una fotografía."""
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        tamaño = (800, 600)
+        degradado = Image.linear_gradient('L').resize(tamaño)
+        ruido = Image.effect_noise(tamaño, 20)
+        radial = Image.radial_gradient('L').resize(tamaño)
+        buffer = BytesIO()
+        Image.merge('RGB', (degradado, ruido, radial)).save(buffer, format='PNG')
+        return SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+    
+    def test_genera_jpeg_y_avif_mas_liviano(self):
+        """Verifica que cada variante tiene JPEG y que el AVIF solo se guarda si pesa menos."""
+        from django.core.files.storage import default_storage
+        
+        rutas = [datos['ruta'] for datos in self.imagen.variantes.values()]
+        for ruta in rutas:
+            self.assertTrue(default_storage.exists(f'{ruta}.jpg'))
+            if default_storage.exists(f'{ruta}.avif'):
+                self.assertLess(default_storage.size(f'{ruta}.avif'), default_storage.size(ruta))
+        self.assertTrue(any(default_storage.exists(f'{ruta}.avif') for ruta in rutas))
+    
+    def test_imagen_plana_sin_avif(self):
+        """Verifica que no se guarda el AVIF si no mejora al WebP."""
+        from django.core.files.storage import default_storage
+        
+        imagen = ImagenProducto.objects.create(
+            producto=self.imagen.producto, imagen=crear_imagen_subida()
+        )
+        procesar_cola()
+        imagen.refresh_from_db()
+        
+        ruta = imagen.variantes['card']['ruta']
+        self.assertTrue(default_storage.exists(f'{ruta}.jpg'))
+        self.assertFalse(default_storage.exists(f'{ruta}.avif'))
+    
+    def test_formato_preferido(self):
+        """Verifica la elección del formato según la cabecera Accept."""
+        from .utils import formato_preferido
+        
+        chrome = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+        self.assertEqual(formato_preferido(chrome), '.avif')
+        self.assertEqual(formato_preferido('image/webp,*/*'), '')
+        self.assertEqual(formato_preferido('image/png,image/*;q=0.8,*/*;q=0.5'), '.jpg')
+        self.assertEqual(formato_preferido(''), '.jpg')
+    
+    def test_vista_negocia_formato(self):
+        """Verifica que la misma URL entrega AVIF, WebP o JPEG según el navegador."""
+        from django.test import RequestFactory
+        from .views import media_negociada
+        
+        ruta = self.imagen.imagen.name
+        factory = RequestFactory()
+        
+        for accept, tipo in (
+            ('image/avif,image/webp,*/*', 'image/avif'),
+            ('image/webp,*/*', 'image/webp'),
+            ('*/*', 'image/jpeg'),
+        ):
+            response = media_negociada(factory.get('/', HTTP_ACCEPT=accept), ruta)
+            self.assertEqual(response['Content-Type'], tipo)
+            self.assertEqual(response['Vary'], 'Accept')
+            response.close()
+    
+    def test_vista_otros_archivos(self):
+        """Verifica que los archivos que no son WebP por contenido se sirven tal cual."""
+        from django.core.files.storage import default_storage
+        from django.test import RequestFactory
+        from .views import media_negociada
+        
+        ruta = default_storage.save('marcas/logo.png', crear_imagen_subida())
+        response = media_negociada(RequestFactory().get('/', HTTP_ACCEPT='image/avif'), ruta)
+        
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertFalse(response.has_header('Vary'))
+        response.close()
+
+
+class MiniaturasBajoDemandaTest(TestCase):
+    """Pruebas para las miniaturas generadas bajo demanda."""
+    
+    def setUp(self):
+        """Usa un directorio temporal como MEDIA_ROOT con una imagen guardada."""
+        import shutil
+        import tempfile
+        from django.core.files.storage import default_storage
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        self.ruta = default_storage.save('productos/galeria/foto.png', crear_imagen_subida())
+    
+    def test_genera_y_guarda_miniatura(self):
+        """Verifica que la primera petición genera la miniatura y la guarda en disco."""
+        import os
+        from io import BytesIO
+        from PIL import Image
+        from .utils import url_miniatura
+        
+        url = url_miniatura(self.ruta, 'card')
+        self.assertTrue(url.startswith(f'/img/card/{self.ruta}?firma='))
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        contenido = b''.join(response.streaming_content)
+        with Image.open(BytesIO(contenido)) as img:
+            self.assertEqual(img.size, (400, 250))
+        
+        # La misma ruta que la URL, para que Nginx la sirva en adelante
+        destino = os.path.join(self.media, 'img', 'card', self.ruta)
+        with open(destino, 'rb') as archivo:
+            self.assertEqual(archivo.read(), contenido)
+    
+    def test_no_regenera_miniatura_existente(self):
+        """Verifica que una miniatura ya guardada no se vuelve a convertir."""
+        from unittest import mock
+        from .utils import url_miniatura
+        
+        url = url_miniatura(self.ruta, 'thumbnail')
+        self.client.get(url).close()
+        
+        with mock.patch('apps.catalogo.utils.procesar_imagen') as procesar:
+            response = self.client.get(url)
+            response.close()
+        self.assertEqual(response.status_code, 200)
+        procesar.assert_not_called()
+    
+    def test_rechaza_peticiones_no_validas(self):
+        """Verifica la firma, el tamaño y la existencia del original."""
+        from .utils import firmar_miniatura, url_miniatura
+        
+        self.assertEqual(self.client.get(f'/img/card/{self.ruta}').status_code, 403)
+        self.assertEqual(
+            self.client.get(f'/img/card/{self.ruta}?firma={firmar_miniatura("detail", self.ruta)}').status_code,
+            403
+        )
+        self.assertEqual(
+            self.client.get(f'/img/gigante/{self.ruta}?firma={firmar_miniatura("gigante", self.ruta)}').status_code,
+            404
+        )
+        self.assertEqual(
+            self.client.get(url_miniatura('productos/galeria/no-existe.png', 'card')).status_code,
+            404
+        )
+    
+    def test_filtro_plantilla(self):
+        """Verifica que el filtro miniatura genera la URL firmada."""
+        from django.template import Context, Template
+        from .utils import url_miniatura
+        
+        plantilla = Template('{% load imagenes %}{{ ruta|miniatura:"card" }}')
+        html = plantilla.render(Context({'ruta': self.ruta}))
+        
+        self.assertEqual(html, url_miniatura(self.ruta, 'card').replace('&', '&amp;'))
+    
+    def test_recolectar_elimina_miniaturas_huerfanas(self):
+        """Verifica que se eliminan las miniaturas cuyo original ya no existe."""
+        import os
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from .utils import url_miniatura
+        
+        # La categoría usa el archivo original (update no pasa por save)
+        categoria = Categoria.objects.create(nombre='Fertilizantes')
+        Categoria.objects.filter(pk=categoria.pk).update(imagen=self.ruta)
+        self.client.get(url_miniatura(self.ruta, 'card')).close()
+        destino = os.path.join(self.media, 'img', 'card', self.ruta)
+        
+        call_command('recolectar_archivos', '--gracia', '0', stdout=StringIO())
+        self.assertTrue(os.path.exists(destino))
+        
+        Categoria.objects.filter(pk=categoria.pk).update(imagen='')
+        default_storage.delete(self.ruta)
+        call_command('recolectar_archivos', '--gracia', '0', stdout=StringIO())
+        self.assertFalse(os.path.exists(destino))
+
+
+class ImagenesEditorTest(TestCase):
+    """Pruebas para las imágenes subidas desde CKEditor 5."""
+    
+    def setUp(self):
+        """Usa un directorio temporal como MEDIA_ROOT y un usuario del staff."""
+        import shutil
+        import tempfile
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        
+        self.usuario = User.objects.create_user('editor', password='clave', is_staff=True)
+    
+    def test_subida_optimizada_y_compartida(self):
+        """Verifica que la subida se convierte a WebP y se reutiliza si se repite."""
+        import os
+        from PIL import Image
+        
+        self.client.force_login(self.usuario)
+        urls = [
+            self.client.post(
+                reverse('ck_editor_5_upload_file'),
+                {'upload': crear_imagen_subida(nombre, (2400, 1600))}
+            ).json()['url']
+            for nombre in ('captura.png', 'captura-copia.png')
+        ]
+        
+        self.assertEqual(urls[0], urls[1])
+        self.assertRegex(urls[0], r'^/media/ckeditor/[0-9a-f]{64}\.webp$')
+        ruta = os.path.join(self.media, urls[0].removeprefix('/media/'))
+        with Image.open(ruta) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (1200, 800)))
+        self.assertTrue(os.path.exists(f'{ruta}.jpg'))
+        self.assertEqual(len([n for n in os.listdir(os.path.dirname(ruta)) if n.endswith('.webp')]), 1)
+    
+    def test_subida_demasiado_grande(self):
+        """Verifica que una imagen demasiado grande se rechaza como error de subida."""
+        import os
+        from django.test import override_settings
+        
+        self.client.force_login(self.usuario)
+        with override_settings(IMAGEN_PIXELES_MAXIMOS=1_000_000):
+            response = self.client.post(
+                reverse('ck_editor_5_upload_file'),
+                {'upload': crear_imagen_subida('enorme.png', (2400, 1600))}
+            )
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('máximo permitido', response.json()['error']['message'])
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'ckeditor')))    
+    def test_comando_reescribe_descripciones(self):
+        """Verifica que el comando optimiza las imágenes y actualiza el HTML."""
+        from io import StringIO
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+        from django.core.management import call_command
+        from apps.catalogo.management.commands import optimizar_imagenes_descripciones
+        
+        # Como las subidas anteriores, guardadas tal cual en MEDIA_ROOT
+        nombre = FileSystemStorage().save('Captura 1.png', crear_imagen_subida())
+        categoria = Categoria.objects.create(nombre='CO2')
+        producto = Producto.objects.create(
+            nombre='Difusor',
+            categoria=categoria,
+            descripcion=(
+                '<p>Instalación:</p>'
+                '<figure class="image"><img src="/media/Captura%201.png"></figure>'
+                '<p><img alt="externa" src="https://ejemplo.com/foto.png"></p>'
+            )
+        )
+        Producto.objects.create(
+            nombre='Difusor de cerámica',
+            categoria=categoria,
+            descripcion='<p><img src="/media/Captura%201.png"></p>'
+        )
+        
+        call_command('optimizar_imagenes_descripciones', '--dry-run', stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertIn('/media/Captura%201.png', producto.descripcion)
+        
+        salida = StringIO()
+        with mock.patch.object(optimizar_imagenes_descripciones, 'invalidar_paginas') as invalidar:
+            call_command('optimizar_imagenes_descripciones', stdout=salida)
+        producto.refresh_from_db()
+        
+        # Una sola invalidación para todas las descripciones
+        invalidar.assert_called_once_with()
+        self.assertRegex(producto.descripcion, r'<img src="/media/ckeditor/[0-9a-f]{64}\.webp">')
+        self.assertIn('src="https://ejemplo.com/foto.png"', producto.descripcion)
+        self.assertIn('2 descripciones', salida.getvalue())
+        self.assertTrue(FileSystemStorage().exists(nombre))
+        
+        # Una segunda ejecución no encuentra nada que optimizar
+        salida = StringIO()
+        call_command('optimizar_imagenes_descripciones', stdout=salida)
+        self.assertIn('0 descripciones', salida.getvalue())
+
+
+class BusquedaTextoCompletoTest(TestCase):
+    """Pruebas para la búsqueda de texto completo del catálogo."""
+    
+    def setUp(self):
+        """Crea productos con marca, categoría y descripción."""
+        invalidar_paginas()
+        self.plantas = Categoria.objects.create(nombre='Plantas acuáticas')
+        self.equipos = Categoria.objects.create(nombre='Equipos')
+        self.marca = Marca.objects.create(nombre='Tropica')
+        
+        self.anubias = self._crear(
+            nombre='Anúbias Nana', categoria=self.plantas, marca=self.marca,
+            descripcion='<p>Planta <strong>resistente</strong> de crecimiento lento.</p>'
+        )
+        self.filtro = self._crear(
+            nombre='Filtro Canister 1200', categoria=self.equipos, modelo='CF-1200',
+            descripcion_corta='Ideal para acuarios plantados con anubias.'
+        )
+    
+    def _crear(self, **campos):
+        """Crea un producto activo con una presentación."""
+        producto = Producto.objects.create(**campos)
+        Presentacion.objects.create(
+            producto=producto, nombre='Unidad', precio=Decimal('30.00'), stock=5
+        )
+        return producto
+    
+    def _buscar(self, consulta):
+        """Retorna los productos de la página de resultados de una búsqueda."""
+        response = self.client.get(reverse('catalogo:producto_lista'), {'q': consulta})
+        return list(response.context['productos'])
+    
+    def test_normalizar(self):
+        """Verifica que se quitan HTML, acentos y mayúsculas."""
+        from .busqueda import normalizar
+        
+        self.assertEqual(
+            normalizar('<p>Plantas &amp;  Acuáticas</p>\n<b>ÑANDÚ</b>'),
+            'plantas & acuaticas nandu'
+        )
+    
+    def test_busca_sin_acentos_ni_plurales(self):
+        """Verifica que la búsqueda ignora acentos y terminaciones de plural."""
+        self.assertEqual(self._buscar('anubias'), [self.anubias, self.filtro])
+        self.assertEqual(self._buscar('ANUBIA'), [self.anubias, self.filtro])
+        self.assertEqual(self._buscar('plantas acuaticas'), [self.anubias])
+        self.assertEqual(self._buscar('tropica'), [self.anubias])
+        self.assertEqual(self._buscar('cf 1200'), [self.filtro])
+        self.assertEqual(self._buscar('resistente'), [self.anubias])
+        self.assertEqual(self._buscar('strong'), [])
+        self.assertEqual(self._buscar('???'), [])
+    
+    def test_nombre_pesa_mas_que_descripcion(self):
+        """Verifica que una coincidencia en el nombre aparece primero."""
+        lento = self._crear(
+            nombre='Musgo de Java', categoria=self.plantas,
+            descripcion_corta='Canister de crecimiento lento'
+        )
+        
+        self.assertEqual(self._buscar('canister'), [self.filtro, lento])
+    
+    def test_sigue_cambios(self):
+        """Verifica que el índice sigue a los cambios de producto, marca y categoría."""
+        self.marca.nombre = 'Dennerle'
+        self.marca.save()
+        self.assertEqual(self._buscar('dennerle'), [self.anubias])
+        self.assertEqual(self._buscar('tropica'), [])
+        
+        self.equipos.nombre = 'Filtración'
+        self.equipos.save()
+        self.assertEqual(self._buscar('filtracion'), [self.filtro])
+        
+        self.filtro.nombre = 'Filtro externo'
+        self.filtro.save()
+        self.assertEqual(self._buscar('externo'), [self.filtro])
+        
+        self.filtro.delete()
+        self.assertEqual(self._buscar('externo'), [])
+    
+    def test_pagina_resultados(self):
+        """Verifica el título y que la paginación conserva la búsqueda."""
+        for numero in range(13):
+            self._crear(nombre=f'Helecho {numero}', categoria=self.plantas)
+        
+        response = self.client.get(reverse('catalogo:producto_lista'), {'q': 'helecho'})
+        
+        self.assertContains(response, 'Resultados para “helecho”')
+        self.assertContains(response, 'href="?q=helecho&amp;page=2"')
+    
+    def test_admin_usa_indice(self):
+        """Verifica que la búsqueda del admin usa el índice de texto completo."""
+        from django.contrib.auth.models import User
+        
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(admin)
+        
+        # icontains no encontraría 'Anúbias' (con acento)
+        response = self.client.get(reverse('admin:catalogo_producto_changelist'), {'q': 'anubia'})
+        
+        self.assertCountEqual(response.context['cl'].result_list, [self.filtro, self.anubias])
+
+
+class FacetasTest(TestCase):
+    """Pruebas para los filtros por facetas del listado y sus conteos."""
+    
+    def setUp(self):
+        """Crea productos de dos marcas en una categoría con subcategoría."""
+        invalidar_paginas()
+        self.acuarios = Categoria.objects.create(nombre='Acuarios')
+        self.quimicos = Categoria.objects.create(
+            nombre='Químicos', categoria_padre=self.acuarios
+        )
+        self.plantas = Categoria.objects.create(nombre='Plantas')
+        self.seachem = Marca.objects.create(nombre='Seachem')
+        self.tropica = Marca.objects.create(nombre='Tropica')
+        
+        self.prime = self._crear('Prime', self.quimicos, self.seachem, '20.00', oferta='15.00')
+        self.flourish = self._crear('Flourish', self.quimicos, self.seachem, '35.00', stock=0)
+        self.sustrato = self._crear('Sustrato', self.acuarios, self.tropica, '60.00')
+        self.anubias = self._crear('Anubias', self.plantas, self.tropica, '12.00', oferta='10.00')
+    
+    def _crear(self, nombre, categoria, marca, precio, oferta=None, stock=5):
+        """Crea un producto activo con una presentación."""
+        producto = Producto.objects.create(nombre=nombre, categoria=categoria, marca=marca)
+        Presentacion.objects.create(
+            producto=producto, nombre='Unidad', precio=Decimal(precio),
+            precio_oferta=Decimal(oferta) if oferta else None, stock=stock
+        )
+        return producto
+    
+    def _listar(self, url=None, **parametros):
+        """Retorna la respuesta del listado con los parámetros dados."""
+        return self.client.get(url or reverse('catalogo:producto_lista'), parametros)
+    
+    def test_conteos_sin_filtros(self):
+        """Verifica los conteos de cada faceta sin filtros elegidos."""
+        facetas = self._listar().context['facetas']
+        
+        self.assertEqual(facetas['marcas'], {'seachem': 2, 'tropica': 2})
+        self.assertEqual(facetas['categorias'][self.acuarios.pk], 3)
+        self.assertEqual(facetas['categorias'][self.quimicos.pk], 2)
+        self.assertEqual(facetas['categorias'][self.plantas.pk], 1)
+        self.assertEqual(facetas['oferta'], 2)
+        self.assertEqual(facetas['stock'], 3)
+        self.assertEqual(facetas['precio_desde'], Decimal('10.00'))
+        self.assertEqual(facetas['precio_hasta'], Decimal('60.00'))
+        self.assertEqual(facetas['total'], 4)
+    
+    def test_cada_faceta_ignora_su_propio_filtro(self):
+        """Verifica que las marcas cuentan sin el filtro de marca y el resto con él."""
+        response = self._listar(marca='seachem')
+        facetas = response.context['facetas']
+        
+        self.assertCountEqual(response.context['productos'], [self.prime, self.flourish])
+        self.assertEqual(facetas['marcas'], {'seachem': 2, 'tropica': 2})
+        self.assertEqual(facetas['oferta'], 1)
+        self.assertEqual(facetas['stock'], 1)
+        self.assertEqual(facetas['categorias'][self.plantas.pk], 0)
+        self.assertContains(response, 'Seachem\n')
+        self.assertContains(response, '(2)')
+    
+    def test_varias_marcas_y_disponibilidad(self):
+        """Verifica que se combinan varias marcas con oferta y stock."""
+        response = self._listar(marca=['seachem', 'tropica'], oferta='1', stock='1')
+        
+        self.assertCountEqual(response.context['productos'], [self.prime, self.anubias])
+        self.assertEqual(response.context['facetas']['marcas'], {'seachem': 1, 'tropica': 1})
+        self.assertEqual(response.context['facetas']['total'], 2)
+        # Desmarcar una marca conserva los demás filtros
+        self.assertContains(response, 'href="?marca=tropica&amp;oferta=1&amp;stock=1"')
+    
+    def test_rango_de_precio(self):
+        """Verifica el filtro por precio actual (con oferta) y los valores no válidos."""
+        response = self._listar(precio_desde='14', precio_hasta='40')
+        facetas = response.context['facetas']
+        
+        self.assertCountEqual(response.context['productos'], [self.prime, self.flourish])
+        self.assertEqual(facetas['marcas'], {'seachem': 2})
+        # El rango disponible no se reduce con el propio filtro de precio
+        self.assertEqual(facetas['precio_desde'], Decimal('10.00'))
+        
+        response = self._listar(precio_desde='barato', precio_hasta='-5')
+        self.assertEqual(len(response.context['productos']), 4)
+    
+    def test_categoria_con_subarbol(self):
+        """Verifica que la categoría filtra su subárbol y no cuenta contra sí misma."""
+        url = reverse('catalogo:categoria_detalle', args=[self.acuarios.slug])
+        facetas = self._listar(url).context['facetas']
+        
+        self.assertEqual(facetas['total'], 3)
+        self.assertEqual(facetas['marcas'], {'seachem': 2, 'tropica': 1})
+        self.assertEqual(facetas['categorias'][self.plantas.pk], 1)
+    
+    def test_subcategoria_inactiva(self):
+        """Verifica que los productos de una subcategoría inactiva no se cuentan."""
+        filtros = Categoria.objects.create(
+            nombre='Filtros', categoria_padre=self.acuarios, activo=False
+        )
+        externos = Categoria.objects.create(nombre='Externos', categoria_padre=filtros)
+        self._crear('Canister', filtros, self.seachem, '150.00')
+        self._crear('Eheim', externos, self.tropica, '200.00')
+        url = reverse('catalogo:categoria_detalle', args=[self.acuarios.slug])
+        
+        response = self._listar(url)
+        facetas = response.context['facetas']
+        
+        self.assertEqual(len(response.context['productos']), 3)
+        self.assertEqual(facetas['total'], 3)
+        self.assertEqual(facetas['marcas'], {'seachem': 2, 'tropica': 1})
+        self.assertEqual(facetas['precio_hasta'], Decimal('60.00'))
+        self.assertEqual(facetas['categorias'][self.acuarios.pk], 3)
+        self.assertEqual(facetas['categorias'][externos.pk], 1)
+        self.assertNotIn(filtros.pk, facetas['categorias'])
+    
+    def test_una_sola_consulta(self):
+        """Verifica que todos los conteos salen de una consulta agrupada."""
+        from django.http import QueryDict
+        from .facetas import Filtros, contar
+        
+        filtros = Filtros(QueryDict('marca=seachem&oferta=1&precio_hasta=30'))
+        queryset = Producto.objects.disponibles().con_datos_tarjeta()
+        
+        # Más la de las categorías inactivas
+        with self.assertNumQueries(2):
+            facetas = contar(queryset, filtros, self.acuarios)
+        
+        self.assertEqual(facetas['total'], 1)
+        self.assertEqual(facetas['marcas'], {'seachem': 1})
+
+
+class PaginacionCursorTest(TestCase):
+    """Pruebas para la paginación por cursor del listado de productos."""
+    
+    def setUp(self):
+        """Crea 30 productos, la mitad con la misma fecha de creación."""
+        invalidar_paginas()
+        self.categoria = Categoria.objects.create(nombre='Peces')
+        for numero in range(30):
+            producto = Producto.objects.create(nombre=f'Guppy {numero}', categoria=self.categoria)
+            Presentacion.objects.create(
+                producto=producto, nombre='Unidad', precio=Decimal('5.00'), stock=3
+            )
+        # Empates en fecha_creacion: el id desempata
+        primeros = Producto.objects.order_by('id').values_list('id', flat=True)[:15]
+        Producto.objects.filter(id__in=list(primeros)).update(
+            fecha_creacion=Producto.objects.get(id=primeros[0]).fecha_creacion
+        )
+        self.esperados = list(Producto.objects.order_by('-fecha_creacion', '-id'))
+        self.url = reverse('catalogo:producto_lista')
+    
+    def _recorrer(self, cursor_inicial=None, enlace='cursor_siguiente'):
+        """Sigue los enlaces de página y retorna los productos y las respuestas."""
+        productos, respuestas = [], []
+        cursor = cursor_inicial
+        while True:
+            response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+            respuestas.append(response)
+            pagina = response.context['page_obj']
+            productos.append(list(pagina.object_list))
+            cursor = getattr(pagina, enlace)
+            if cursor is None:
+                return productos, respuestas
+    
+    def test_recorre_todas_las_paginas(self):
+        """Verifica que las páginas no repiten ni saltan productos, en ambos sentidos."""
+        paginas, respuestas = self._recorrer()
+        
+        self.assertEqual([len(p) for p in paginas], [12, 12, 6])
+        self.assertEqual(sum(paginas, []), self.esperados)
+        self.assertEqual(respuestas[0].context['page_obj'].paginator.count, 30)
+        self.assertContains(respuestas[1], 'rel="prev"')
+        self.assertContains(respuestas[1], 'rel="next"')
+        
+        # Desde la última página hacia atrás
+        ultima = respuestas[-1].context['page_obj']
+        atras, _ = self._recorrer(ultima.cursor_anterior, enlace='cursor_anterior')
+        self.assertEqual(atras, [paginas[1], paginas[0]])
+    
+    def test_sin_offset_ni_count(self):
+        """Verifica que las páginas no usan OFFSET y que los conteos van a caché."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as primera:
+            response = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as segunda:
+            self.client.get(self.url, {'cursor': response.context['page_obj'].cursor_siguiente})
+        
+        consultas = [q['sql'] for q in primera.captured_queries + segunda.captured_queries]
+        self.assertFalse([sql for sql in consultas if 'OFFSET' in sql])
+        self.assertEqual(len([sql for sql in consultas if 'GROUP BY' in sql]), 1)
+    
+    def test_total_sin_subcategorias_inactivas(self):
+        """Verifica que el total y las páginas no cuentan las subcategorías inactivas."""
+        inactiva = Categoria.objects.create(
+            nombre='Guppys de cría', categoria_padre=self.categoria, activo=False
+        )
+        for numero in range(13):
+            producto = Producto.objects.create(nombre=f'Guppy cría {numero}', categoria=inactiva)
+            Presentacion.objects.create(
+                producto=producto, nombre='Unidad', precio=Decimal('5.00'), stock=3
+            )
+        url = reverse('catalogo:categoria_detalle', args=[self.categoria.slug])
+        
+        pagina = self.client.get(url).context['page_obj']
+        self.assertEqual(pagina.paginator.count, 30)
+        
+        # Con búsqueda se pagina por número: sin páginas de más
+        response = self.client.get(url, {'q': 'guppy', 'page': 3})
+        pagina = response.context['page_obj']
+        self.assertEqual(pagina.paginator.count, 30)
+        self.assertEqual(pagina.paginator.num_pages, 3)
+        self.assertEqual(len(pagina.object_list), 6)
+        self.assertFalse(pagina.has_next())
+    
+    def test_cursor_no_valido(self):
+        """Verifica que un cursor mal formado responde 404."""
+        for cursor in ('basura', 'WyJ4IiwgMV0', 'WyJuIiwgIm5vLWVzLWZlY2hhIiwgMV0'):
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class ConsultasDisponiblesTest(TestCase):
+    """Pruebas para los filtros de disponibilidad con subconsultas EXISTS."""
+    
+    def setUp(self):
+        """Crea productos con y sin presentaciones activas."""
+        categoria = Categoria.objects.create(nombre='Iluminación')
+        self.marca = Marca.objects.create(nombre='Chihiros')
+        self.sin_productos = Marca.objects.create(nombre='Sin stock')
+        
+        self.lampara = Producto.objects.create(
+            nombre='Lámpara WRGB', categoria=categoria, marca=self.marca
+        )
+        for nombre in ('30 cm', '60 cm', '90 cm'):
+            Presentacion.objects.create(
+                producto=self.lampara, nombre=nombre, precio=Decimal('80.00')
+            )
+        
+        inactiva = Producto.objects.create(
+            nombre='Lámpara antigua', categoria=categoria, marca=self.sin_productos
+        )
+        Presentacion.objects.create(
+            producto=inactiva, nombre='Unidad', precio=Decimal('10.00'), activo=False
+        )
+        Producto.objects.create(nombre='Sin presentaciones', categoria=categoria)
+    
+    def test_sin_duplicados(self):
+        """Verifica que cada producto aparece una vez aunque tenga varias presentaciones."""
+        self.assertEqual(list(Producto.objects.disponibles()), [self.lampara])
+        self.assertEqual(list(Marca.objects.con_productos()), [self.marca])
+    
+    def test_plan_sin_deduplicacion(self):
+        """Verifica en el plan de consulta que no hay paso para quitar duplicados."""
+        from django.db import connection
+        
+        consultas = [
+            Producto.objects.disponibles().con_datos_tarjeta(),
+            Marca.objects.filter(activo=True).con_productos().order_by('nombre'),
+        ]
+        if connection.vendor == 'postgresql':
+            # Unique o HashAggregate serían el DISTINCT
+            pasos = ('Unique', 'HashAggregate')
+            antes = Producto.objects.filter(presentaciones__activo=True).distinct().explain()
+        elif connection.vendor == 'sqlite':
+            pasos = ('USE TEMP B-TREE FOR DISTINCT',)
+            antes = Producto.objects.filter(presentaciones__activo=True).distinct().explain()
+        else:
+            self.skipTest(f'Sin comprobación de planes para {connection.vendor}')
+        
+        # La forma anterior (JOIN + distinct) sí necesita el paso
+        self.assertTrue(any(paso in antes for paso in pasos))
+        for queryset in consultas:
+            plan = queryset.explain()
+            for paso in pasos:
+                self.assertNotIn(paso, plan)
+
+
+class OrdenListadoTest(TestCase):
+    """Pruebas para los ordenamientos del listado (?orden=)."""
+    
+    def setUp(self):
+        """Crea productos con precios y descuentos distintos."""
+        invalidar_paginas()
+        self.categoria = Categoria.objects.create(nombre='Fertilizantes')
+        self.barato = self._crear('Barato', '10.00')
+        self.caro = self._crear('Caro', '90.00', oferta='45.00')
+        self.medio = self._crear('Medio', '40.00', oferta='36.00')
+        self.url = reverse('catalogo:producto_lista')
+    
+    def _crear(self, nombre, precio, oferta=None):
+        """Crea un producto activo con una presentación."""
+        producto = Producto.objects.create(nombre=nombre, categoria=self.categoria)
+        Presentacion.objects.create(
+            producto=producto, nombre='Unidad', precio=Decimal(precio),
+            precio_oferta=Decimal(oferta) if oferta else None
+        )
+        return producto
+    
+    def _listar(self, **parametros):
+        """Retorna los productos de la primera página del listado."""
+        return list(self.client.get(self.url, parametros).context['productos'])
+    
+    def test_descuento_max(self):
+        """Verifica que el descuento máximo sigue a las presentaciones."""
+        self.caro.refresh_from_db()
+        self.assertEqual(self.caro.descuento_max, 50)
+        
+        presentacion = Presentacion.objects.create(
+            producto=self.barato, nombre='Grande', precio=Decimal('20.00'),
+            precio_oferta=Decimal('15.00')
+        )
+        self.barato.refresh_from_db()
+        self.assertEqual(self.barato.descuento_max, 25)
+        
+        presentacion.delete()
+        self.barato.refresh_from_db()
+        self.assertEqual(self.barato.descuento_max, 0)
+    
+    def test_ordenes(self):
+        """Verifica cada ordenamiento y que un valor desconocido se ignora."""
+        self.assertEqual(self._listar(), [self.medio, self.caro, self.barato])
+        self.assertEqual(self._listar(orden='precio'), [self.barato, self.medio, self.caro])
+        self.assertEqual(self._listar(orden='precio_desc'), [self.caro, self.medio, self.barato])
+        self.assertEqual(self._listar(orden='descuento'), [self.caro, self.medio, self.barato])
+        self.assertEqual(self._listar(orden='nombre'), [self.medio, self.caro, self.barato])
+    
+    def test_orden_por_precio_con_cursor(self):
+        """Verifica que las páginas por precio no repiten productos con el mismo precio."""
+        for numero in range(20):
+            self._crear(f'Igual {numero}', '25.00')
+        esperados = list(
+            Producto.objects.disponibles().order_by('precio_min', 'id')
+        )
+        
+        productos = []
+        parametros = {'orden': 'precio'}
+        while True:
+            response = self.client.get(self.url, parametros)
+            pagina = response.context['page_obj']
+            productos.extend(pagina.object_list)
+            if not pagina.has_next():
+                break
+            parametros['cursor'] = pagina.cursor_siguiente
+        
+        self.assertEqual(productos, esperados)
+        self.assertContains(response, 'orden=precio&amp;cursor=')
+    
+    def test_orden_por_precio_sin_precio(self):
+        """Verifica que las páginas por precio recorren los productos sin precio_min."""
+        from django.db.models import F
+        
+        for numero in range(20):
+            self._crear(f'Igual {numero}', '25.00')
+        # Resumen sin precio: se ordena como el mayor precio
+        sin_precio = Producto.objects.filter(nombre__startswith='Igual').order_by('id')[:13]
+        Producto.objects.filter(pk__in=list(sin_precio.values_list('pk', flat=True))).update(
+            precio_min=None
+        )
+        
+        for orden, columnas in (
+            ('precio', (F('precio_min').asc(nulls_last=True), 'id')),
+            ('precio_desc', (F('precio_min').desc(nulls_first=True), '-id')),
+        ):
+            esperados = list(Producto.objects.disponibles().order_by(*columnas))
+            paginas = []
+            parametros = {'orden': orden}
+            while True:
+                pagina = self.client.get(self.url, parametros).context['page_obj']
+                paginas.append(list(pagina.object_list))
+                if not pagina.has_next():
+                    break
+                parametros['cursor'] = pagina.cursor_siguiente
+            self.assertEqual(sum(paginas, []), esperados)
+            
+            # Y de vuelta desde la última página
+            parametros['cursor'] = pagina.cursor_anterior
+            anterior = self.client.get(self.url, parametros).context['page_obj']
+            self.assertEqual(list(anterior.object_list), paginas[-2])
+    
+    def test_busqueda_ordenada(self):
+        """Verifica que una búsqueda puede ordenarse por precio en lugar de relevancia."""
+        response = self.client.get(self.url, {'q': 'caro barato', 'orden': 'precio'})
+        self.assertEqual(list(response.context['productos']), [])
+        
+        response = self.client.get(self.url, {'q': 'medio', 'orden': 'precio'})
+        self.assertTrue(response.context['paginacion_cursor'])
+        self.assertEqual(list(response.context['productos']), [self.medio])
+    
+    def test_orden_usa_indice(self):
+        """Verifica en SQLite que cada orden lee su índice sin ordenar en memoria."""
+        from django.db import connection
+        from .paginacion import PaginadorCursor
+        from .views import ProductoListView
+        
+        if connection.vendor != 'sqlite':
+            self.skipTest('El plan de consulta se comprueba en SQLite')
+        
+        indices = {
+            'recientes': 'catalogo_producto_recientes',
+            'precio': 'catalogo_producto_precio',
+            'precio_desc': 'catalogo_producto_precio',
+            'descuento': 'catalogo_producto_descuento',
+        }
+        for orden, (_, columnas) in ProductoListView.ordenes.items():
+            paginador = PaginadorCursor(Producto.objects.disponibles(), 12, columnas)
+            for hacia_atras in (False, True):
+                plan = paginador.ordenado(hacia_atras)[:13].explain()
+                self.assertIn(f'USING INDEX {indices[orden]}', plan)
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
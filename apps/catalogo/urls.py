@@ -1,8 +1,8 @@
 """
 Configuración de URLs para la aplicación de catálogo.
 
-Define las rutas para el listado de productos, filtrado por categorías
-y detalle de productos.
+Define las rutas para el listado de productos, filtrado por categorías,
+detalle de productos y miniaturas de imágenes.
 """
 
 from django.urls import path
@@ -31,4 +31,7 @@ urlpatterns = [
         views.ProductoDetailView.as_view(),
         name='producto_detalle'
     ),
+    
+    # Miniatura generada bajo demanda (URL firmada, ver utils.url_miniatura)
+    path('img/<str:tamaño>/<path:ruta>', views.miniatura, name='miniatura'),
 ]
@@ -2,13 +2,26 @@
 Utilidades para el procesamiento de imágenes.
 
 Este módulo contiene funciones para optimizar imágenes subidas,
-incluyendo conversión a WebP y redimensionamiento.
+incluyendo conversión a WebP (con versiones AVIF y JPEG),
+redimensionamiento, miniaturas bajo demanda y vistas previas de baja
+calidad (LQIP).
 """
 
+import base64
+import hashlib
 import os
+import posixpath
+import uuid
 from io import BytesIO
 from PIL import Image
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from .storage import es_nombre_por_contenido
 
 
 # Configuración de tamaños de imagen
@@ -22,6 +35,146 @@ IMAGE_SIZES = {
 # Calidad de compresión WebP (0-100)
 WEBP_QUALITY = 85
 
+# Calidad de las versiones alternativas que se entregan según el navegador.
+# En AVIF la misma calidad visual se logra con un valor más bajo.
+AVIF_QUALITY = 60
+JPEG_QUALITY = 85
+
+# Vista previa que se muestra mientras carga la imagen: un WebP diminuto
+# incrustado en la página como data URI (unos pocos cientos de bytes)
+LQIP_SIZE = (16, 16)
+LQIP_QUALITY = 40
+
+# Carpeta de MEDIA_ROOT donde se guardan las miniaturas bajo demanda
+# (ver generar_miniatura). Nginx las sirve directamente desde /img/.
+CARPETA_MINIATURAS = 'img'
+
+
+class ImagenDemasiadoGrande(ValueError):
+    """La imagen decodificada superaría IMAGEN_PIXELES_MAXIMOS."""
+
+
+def abrir_imagen(archivo, max_size=None):
+    """
+    Abre una imagen decodificando solo la resolución necesaria.
+    
+    Los JPEG se decodifican ya reducidos a 1/2, 1/4 u 1/8 con draft(),
+    al doble del tamaño final como hace Image.thumbnail(), y la imagen se
+    reduce antes de convertirla a RGB. Así una foto de 8000x6000 nunca
+    ocupa la memoria de su resolución completa.
+    
+    Args:
+        archivo: Ruta o archivo abierto con la imagen.
+        max_size (tuple): Tamaño máximo (ancho, alto); None para no reducir.
+    
+    Returns:
+        Image: Imagen cargada y reducida, en su modo original (o RGB/RGBA
+        si era de paleta).
+    
+    Raises:
+        ImagenDemasiadoGrande: Si los píxeles a decodificar superan
+            IMAGEN_PIXELES_MAXIMOS.
+    """
+    img = Image.open(archivo)
+    
+    if max_size:
+        _reducir_al_cargar(img, max_size)
+    
+    # Antes de decodificar: Image.open y draft solo leen la cabecera
+    verificar_pixeles(img)
+    
+    # Las imágenes de paleta no se pueden redimensionar con LANCZOS
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    
+    if max_size:
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return img
+
+
+def _reducir_al_cargar(img, max_size):
+    """
+    Configura el decodificador para cargar la imagen ya reducida.
+    
+    Solo tiene efecto en JPEG: draft() elige la mayor reducción (1/2, 1/4
+    u 1/8) que deja la imagen al menos al doble del tamaño final, como
+    Image.thumbnail(), para no perder calidad en el redimensionado.
+    """
+    escala = min(max_size[0] / img.width, max_size[1] / img.height, 1)
+    img.draft(None, (int(img.width * escala * 2), int(img.height * escala * 2)))
+
+
+def verificar_pixeles(img):
+    """
+    Verifica que una imagen abierta no supere el límite de píxeles.
+    
+    Args:
+        img: Imagen de Pillow abierta (no hace falta que esté cargada).
+    
+    Raises:
+        ImagenDemasiadoGrande: Si supera IMAGEN_PIXELES_MAXIMOS.
+    """
+    pixeles = img.width * img.height
+    if pixeles > settings.IMAGEN_PIXELES_MAXIMOS:
+        raise ImagenDemasiadoGrande(
+            f'La imagen tiene {img.width}x{img.height} píxeles; '
+            f'el máximo permitido es {settings.IMAGEN_PIXELES_MAXIMOS:,} píxeles'
+        )
+
+
+def validar_pixeles(archivo):
+    """
+    Validador de ImageField que rechaza las imágenes demasiado grandes.
+    
+    Solo lee la cabecera de los archivos recién subidos; los que ya están
+    guardados no se vuelven a abrir.
+    
+    Args:
+        archivo: Archivo del campo de imagen.
+    
+    Raises:
+        ValidationError: Si la imagen supera IMAGEN_PIXELES_MAXIMOS.
+    """
+    if getattr(archivo, '_committed', True):
+        return
+    
+    archivo.seek(0)
+    try:
+        with Image.open(archivo) as img:
+            # Los JPEG se decodificarán reducidos (ver abrir_imagen)
+            _reducir_al_cargar(img, IMAGE_SIZES['full'])
+            verificar_pixeles(img)
+    except ImagenDemasiadoGrande as e:
+        raise ValidationError(str(e))
+    except OSError:
+        # No es una imagen válida: lo informa la validación del propio ImageField
+        pass
+    finally:
+        archivo.seek(0)
+
+
+def _convertir_a_rgb(img):
+    """
+    Convierte una imagen a RGB, usando fondo blanco si tiene transparencia.
+    
+    Args:
+        img: Imagen de Pillow en cualquier modo.
+    
+    Returns:
+        Image: Imagen en modo RGB.
+    """
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    if img.mode in ('RGBA', 'LA'):
+        # Crear fondo blanco; la propia imagen sirve de máscara (usa su
+        # canal alfa sin copiar las bandas como haría split())
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
 
 def procesar_imagen(imagen_field, max_size=IMAGE_SIZES['full'], quality=WEBP_QUALITY):
     """
@@ -44,22 +197,8 @@ def procesar_imagen(imagen_field, max_size=IMAGE_SIZES['full'], quality=WEBP_QUA
         >>> nuevo_contenido, nuevo_nombre = procesar_imagen(self.imagen)
         >>> self.imagen.save(nuevo_nombre, nuevo_contenido, save=False)
     """
-    # Abrir la imagen con Pillow
-    img = Image.open(imagen_field)
-    
-    # Convertir a RGB si es necesario (para PNG con transparencia)
-    if img.mode in ('RGBA', 'LA', 'P'):
-        # Crear fondo blanco para imágenes con transparencia
-        background = Image.new('RGB', img.size, (255, 255, 255))
-        if img.mode == 'P':
-            img = img.convert('RGBA')
-        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-        img = background
-    elif img.mode != 'RGB':
-        img = img.convert('RGB')
-    
-    # Redimensionar si excede el tamaño máximo (mantiene proporción)
-    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    # Abrir la imagen ya reducida (mantiene proporción) y luego pasar a RGB
+    img = _convertir_a_rgb(abrir_imagen(imagen_field, max_size))
     
     # Guardar en formato WebP
     buffer = BytesIO()
@@ -75,6 +214,319 @@ def procesar_imagen(imagen_field, max_size=IMAGE_SIZES['full'], quality=WEBP_QUA
     return ContentFile(buffer.read()), nuevo_nombre
 
 
+def generar_variantes(imagen_field, quality=WEBP_QUALITY):
+    """
+    Genera una versión WebP de la imagen por cada tamaño de IMAGE_SIZES.
+    
+    Las variantes se guardan junto al archivo original con el nombre del
+    tamaño como sufijo (por ejemplo 'productos/filtro_card.webp'). El
+    tamaño 'full' corresponde al propio archivo, que procesar_imagen ya
+    limita a 1200px, y no se duplica. Tampoco se generan variantes que no
+    sean más pequeñas que el original.
+    
+    Args:
+        imagen_field: Campo ImageField ya guardado en el almacenamiento.
+        quality (int): Calidad de compresión WebP (0-100).
+    
+    Returns:
+        dict: Tamaño -> {'ruta': ruta en el almacenamiento, 'ancho': px}.
+    
+    Ejemplo:
+        >>> self.variantes = generar_variantes(self.imagen)
+    """
+    return generar_variantes_archivo(imagen_field.storage, imagen_field.name, quality)
+
+
+def generar_variantes_archivo(storage, nombre, quality=WEBP_QUALITY):
+    """
+    Genera las variantes de un archivo a partir de su nombre en el almacenamiento.
+    
+    Args:
+        storage: Almacenamiento de Django donde está el archivo.
+        nombre (str): Ruta del archivo dentro del almacenamiento.
+        quality (int): Calidad de compresión WebP (0-100).
+    
+    Returns:
+        dict: Tamaño -> {'ruta': ruta en el almacenamiento, 'ancho': px}.
+    """
+    base = os.path.splitext(nombre)[0]
+    
+    with storage.open(nombre, 'rb') as archivo:
+        original = _convertir_a_rgb(abrir_imagen(archivo))
+        original.load()
+    
+    variantes = {'full': {'ruta': nombre, 'ancho': original.width}}
+    guardar_alternativas(storage, nombre, original)
+    
+    for tamaño, max_size in IMAGE_SIZES.items():
+        if tamaño == 'full':
+            continue
+        
+        copia = original.copy()
+        copia.thumbnail(max_size, Image.Resampling.LANCZOS)
+        if copia.width >= original.width:
+            continue
+        
+        buffer = BytesIO()
+        copia.save(buffer, format='WEBP', quality=quality, optimize=True)
+        ruta = storage.save(f"{base}_{tamaño}.webp", ContentFile(buffer.getvalue()))
+        guardar_alternativas(storage, ruta, copia)
+        variantes[tamaño] = {'ruta': ruta, 'ancho': copia.width}
+    
+    return variantes
+
+
+def guardar_alternativas(storage, ruta, img):
+    """
+    Guarda las versiones AVIF y JPEG de un archivo WebP ya guardado.
+    
+    Se guardan junto al WebP como '<ruta>.avif' y '<ruta>.jpg'. La versión
+    AVIF solo se conserva si pesa menos que el WebP, así el formato que
+    elige formato_preferido() es siempre el más liviano que el navegador
+    acepta. El JPEG es para navegadores sin soporte de WebP.
+    
+    Solo se generan para los WebP guardados por contenido (ver storage.py),
+    que son los que Nginx negocia.
+    
+    Args:
+        storage: Almacenamiento de Django.
+        ruta (str): Ruta del WebP.
+        img: Imagen RGB con el mismo contenido que el WebP.
+    """
+    if not (ruta.endswith('.webp') and es_nombre_por_contenido(ruta)):
+        return
+    
+    buffer = BytesIO()
+    img.save(buffer, format='AVIF', quality=AVIF_QUALITY)
+    if buffer.tell() < storage.size(ruta):
+        storage.save(f'{ruta}.avif', ContentFile(buffer.getvalue()))
+    
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    storage.save(f'{ruta}.jpg', ContentFile(buffer.getvalue()))
+
+
+def generar_lqip(archivo):
+    """
+    Genera la vista previa de baja calidad (LQIP) de una imagen.
+    
+    Es la imagen reducida a LQIP_SIZE, en WebP y codificada como data URI,
+    para incrustarla en el HTML: la tarjeta muestra sus colores al instante,
+    sin otra petición, mientras el navegador descarga la imagen real.
+    
+    Args:
+        archivo: Ruta o archivo abierto con la imagen.
+    
+    Returns:
+        str: Data URI 'data:image/webp;base64,...'.
+    """
+    img = _convertir_a_rgb(abrir_imagen(archivo, LQIP_SIZE))
+    
+    buffer = BytesIO()
+    img.save(buffer, format='WEBP', quality=LQIP_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def tiene_alternativas(storage, ruta):
+    """Indica si un WebP ya tiene guardada su versión alternativa en JPEG."""
+    return storage.exists(f'{ruta}.jpg')
+
+
+def formato_preferido(accept):
+    """
+    Elige la versión de una imagen WebP que se entrega a un navegador.
+    
+    Es la misma regla que aplica Nginx en producción (map $formato_imagen
+    en nginx/conf.d/gardenaqua.conf).
+    
+    Args:
+        accept (str): Cabecera Accept de la petición.
+    
+    Returns:
+        str: Sufijo de la versión alternativa ('.avif' o '.jpg'), o '' para
+        entregar el propio WebP.
+    """
+    if 'image/avif' in accept:
+        return '.avif'
+    if 'image/webp' in accept:
+        return ''
+    return '.jpg'
+
+
+def firmar_miniatura(tamaño, ruta):
+    """
+    Calcula la firma de la URL de una miniatura.
+    
+    Solo las URL generadas por el sitio (ver url_miniatura) llevan una firma
+    válida, así nadie puede pedir miniaturas de archivos arbitrarios para
+    llenar el disco o saltarse la caché.
+    
+    Args:
+        tamaño (str): Clave de IMAGE_SIZES.
+        ruta (str): Ruta del archivo original en el almacenamiento.
+    
+    Returns:
+        str: Firma HMAC basada en SECRET_KEY.
+    """
+    return signing.Signer(salt='catalogo.miniaturas').signature(f'{tamaño}/{ruta}')
+
+
+def url_miniatura(ruta, tamaño):
+    """
+    Retorna la URL firmada de la miniatura de un archivo.
+    
+    Ejemplo:
+        >>> url_miniatura('productos/galeria/3a7b...webp', 'card')
+        '/img/card/productos/galeria/3a7b...webp?firma=...'
+    """
+    url = reverse('catalogo:miniatura', kwargs={'tamaño': tamaño, 'ruta': ruta})
+    return f'{url}?firma={firmar_miniatura(tamaño, ruta)}'
+
+
+def generar_miniatura(tamaño, ruta):
+    """
+    Genera la miniatura de un archivo, si no existe, y retorna su ruta en disco.
+    
+    La miniatura se convierte con procesar_imagen al tamaño de IMAGE_SIZES
+    y se guarda en MEDIA_ROOT/img/<tamaño>/<ruta>, la misma ruta que su URL,
+    para que las siguientes peticiones las sirva Nginx sin pasar por Django.
+    Se escribe con un nombre temporal y se renombra al terminar, así que
+    nunca se sirve a medio escribir.
+    
+    Args:
+        tamaño (str): Clave de IMAGE_SIZES.
+        ruta (str): Ruta del archivo original en el almacenamiento.
+    
+    Returns:
+        str: Ruta absoluta de la miniatura (contenido WebP).
+    
+    Raises:
+        FileNotFoundError: Si el archivo original no existe.
+    """
+    destino = os.path.join(settings.MEDIA_ROOT, CARPETA_MINIATURAS, tamaño, ruta)
+    if os.path.exists(destino):
+        return destino
+    
+    with default_storage.open(ruta, 'rb') as archivo:
+        contenido, _ = procesar_imagen(archivo, max_size=IMAGE_SIZES[tamaño])
+    
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f'{destino}.{uuid.uuid4().hex}.tmp'
+    with open(temporal, 'wb') as salida:
+        salida.write(contenido.read())
+    os.replace(temporal, destino)
+    return destino
+
+
+def convertir_archivo(nombre, convertir=True, quality=WEBP_QUALITY):
+    """
+    Convierte un archivo del almacenamiento a WebP y genera sus variantes.
+    
+    Pensada para ejecutarse en otro proceso (ver el comando
+    convertir_imagenes_webp): solo usa el almacenamiento, nunca la base de
+    datos, y retorna los errores en lugar de lanzarlos.
+    
+    Args:
+        nombre (str): Ruta del archivo dentro del almacenamiento.
+        convertir (bool): Si es False, el archivo ya es WebP y solo se
+            generan las variantes.
+        quality (int): Calidad de compresión WebP (0-100).
+    
+    Returns:
+        dict: 'nombre', 'variantes' y 'metadatos' nuevos, 'bytes_entrada'
+        y 'bytes_salida'; o 'error' con el mensaje si falló.
+    """
+    storage = default_storage
+    try:
+        bytes_entrada = storage.size(nombre)
+        nombre_nuevo = nombre
+        
+        if convertir:
+            with storage.open(nombre, 'rb') as archivo:
+                contenido, nuevo = procesar_imagen(archivo, quality=quality)
+            nombre_nuevo = storage.save(
+                posixpath.join(posixpath.dirname(nombre), nuevo), contenido
+            )
+        
+        variantes = generar_variantes_archivo(storage, nombre_nuevo, quality)
+        bytes_salida = sum(storage.size(datos['ruta']) for datos in variantes.values())
+        metadatos = leer_metadatos(storage, nombre_nuevo)
+    except Exception as e:
+        return {'error': str(e)}
+    
+    return {
+        'nombre': nombre_nuevo,
+        'variantes': variantes,
+        'metadatos': metadatos,
+        'bytes_entrada': bytes_entrada,
+        'bytes_salida': bytes_salida,
+    }
+
+
+def leer_metadatos(storage, nombre):
+    """
+    Lee las dimensiones, el peso, el hash de contenido y la vista previa
+    de un archivo.
+    
+    Pillow solo lee la cabecera para obtener las dimensiones; el archivo
+    completo se lee una vez para calcular el hash y generar la vista previa.
+    
+    Args:
+        storage: Almacenamiento de Django donde está el archivo.
+        nombre (str): Ruta del archivo dentro del almacenamiento.
+    
+    Returns:
+        dict: 'ancho' y 'alto' en píxeles, 'peso' en bytes, 'hash'
+        (SHA-256 en hexadecimal) y 'lqip' (ver generar_lqip).
+    """
+    with storage.open(nombre, 'rb') as archivo:
+        contenido = archivo.read()
+    
+    with Image.open(BytesIO(contenido)) as img:
+        ancho, alto = img.size
+    
+    return {
+        'ancho': ancho,
+        'alto': alto,
+        'peso': len(contenido),
+        'hash': hashlib.sha256(contenido).hexdigest(),
+        'lqip': generar_lqip(BytesIO(contenido)),
+    }
+
+
+def variantes_vigentes(imagen_field, variantes):
+    """
+    Indica si las variantes guardadas corresponden al archivo actual.
+    
+    Args:
+        imagen_field: Campo ImageField de Django.
+        variantes (dict): Variantes registradas en el modelo.
+    
+    Returns:
+        bool: True si las variantes se generaron a partir de este archivo.
+    """
+    if not imagen_field:
+        return not variantes
+    return variantes.get('full', {}).get('ruta') == imagen_field.name
+
+
+def url_variante(variantes, nombre):
+    """
+    Retorna la URL de una variante, o la del original si no existe.
+    
+    Args:
+        variantes (dict): Variantes registradas en el modelo.
+        nombre (str): Clave de IMAGE_SIZES ('thumbnail', 'card', ...).
+    
+    Returns:
+        str | None: URL de la variante, None si no hay variantes.
+    """
+    if not variantes:
+        return None
+    datos = variantes.get(nombre) or variantes.get('full')
+    return default_storage.url(datos['ruta'])
+
+
 def necesita_conversion(imagen_field):
     """
     Verifica si una imagen necesita ser convertida a WebP.
@@ -96,12 +548,23 @@ def obtener_dimensiones(imagen_field):
     """
     Obtiene las dimensiones de una imagen.
     
+    Si el registro ya tiene guardadas las dimensiones del archivo (campos
+    '<campo>_ancho' y '<campo>_alto'), las usa sin abrir la imagen.
+    
     Args:
         imagen_field: Campo ImageField de Django.
     
     Returns:
         tuple: (ancho, alto) de la imagen.
     """
+    instancia = getattr(imagen_field, 'instance', None)
+    if instancia is not None and getattr(imagen_field, '_committed', False):
+        campo = imagen_field.field.name
+        ancho = getattr(instancia, f'{campo}_ancho', None)
+        alto = getattr(instancia, f'{campo}_alto', None)
+        if ancho and alto:
+            return ancho, alto
+    
     with Image.open(imagen_field) as img:
         return img.size
 
@@ -5,9 +5,23 @@ Este módulo contiene las vistas para mostrar el catálogo de productos,
 filtrar por categorías y ver los detalles de cada producto.
 """
 
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView
+from django.views.static import serve
+from django_ckeditor_5.views import upload_file
 
+from .busqueda import buscar
+from .cache import cache_pagina_catalogo, consulta_en_cache
+from .facetas import Filtros, contar, url_alternar_marca
 from .models import (
     Categoria, 
     Marca, 
@@ -16,78 +30,180 @@ from .models import (
     VideoProducto, 
     EspecificacionProducto
 )
+from .paginacion import PaginadorCursor
+from .storage import es_nombre_por_contenido
+from .utils import (
+    IMAGE_SIZES,
+    ImagenDemasiadoGrande,
+    firmar_miniatura,
+    formato_preferido,
+    generar_miniatura,
+)
 
 
+# Parámetros GET del listado; con cualquier otro la página no se cachea
+PARAMETROS_LISTADO = (
+    'q', 'orden', 'cursor', 'page',
+    'marca', 'precio_desde', 'precio_hasta', 'oferta', 'stock',
+)
+
+
+@method_decorator(cache_pagina_catalogo(parametros=PARAMETROS_LISTADO), name='dispatch')
 class ProductoListView(ListView):
     """
     Vista para mostrar el listado de productos.
     
-    Permite filtrar productos por categoría y muestra solo
-    los productos activos que tienen al menos una presentación disponible.
+    Permite filtrar productos por categoría y por facetas (marcas, rango
+    de precio, oferta y stock; ver facetas.py), y buscarlos por texto
+    (parámetro 'q' del formulario de la cabecera). Muestra solo los
+    productos activos que tienen al menos una presentación disponible.
+    
+    El parámetro 'orden' elige el ordenamiento (ver ordenes). Cada uno usa
+    columnas desnormalizadas de Producto con su propio índice y se pagina
+    por cursor (ver paginacion.py), así ninguna página cuesta más que la
+    primera. Los resultados de una búsqueda sin 'orden' se ordenan por
+    relevancia y se paginan por número de página. El total de productos sale
+    de los conteos de facetas, guardados en caché para todo el listado.
     """
     model = Producto
     template_name = 'catalogo/producto_lista.html'
     context_object_name = 'productos'
     paginate_by = 12
     
+    # Ordenamientos de ?orden=: valor -> (etiqueta, columnas del cursor).
+    # Cada uno tiene su índice en Producto.Meta.indexes.
+    ordenes = {
+        'recientes': ('Más recientes', ('-fecha_creacion', '-id')),
+        'precio': ('Precio: menor a mayor', ('precio_min', 'id')),
+        'precio_desc': ('Precio: mayor a menor', ('-precio_min', '-id')),
+        'descuento': ('Mayor descuento', ('-descuento_max', '-id')),
+    }
+    
     def get_queryset(self):
         """
         Obtiene los productos filtrados.
         
         Filtra por categoría si se proporciona el slug en la URL.
-        Si la categoría es padre, incluye productos de todas sus subcategorías.
+        Si la categoría es padre, incluye productos de todas sus subcategorías
+        (a cualquier nivel de profundidad).
+        Si hay búsqueda y no se eligió otro orden, los ordena por relevancia
+        (ver busqueda.buscar).
         Solo muestra productos activos con presentaciones activas.
         """
-        queryset = Producto.objects.filter(
-            activo=True,
-            presentaciones__activo=True
-        ).distinct().select_related('categoria', 'marca').prefetch_related('presentaciones')
+        queryset = Producto.objects.disponibles().con_datos_tarjeta()
+        
+        # Búsqueda de texto completo
+        self.busqueda = self.request.GET.get('q', '').strip()
+        if self.busqueda:
+            queryset = buscar(queryset, self.busqueda)
+        
+        # Ordenamiento elegido (None: relevancia de la búsqueda)
+        self.orden = self.request.GET.get('orden')
+        if self.orden not in self.ordenes:
+            self.orden = None if self.busqueda else 'recientes'
+        
+        # Los conteos de las facetas se calculan sin la categoría ni los filtros
+        self.filtros = Filtros(self.request.GET)
+        self.queryset_facetas = queryset
         
         # Filtrar por categoría si se proporciona
+        self.categoria_actual = None
         categoria_slug = self.kwargs.get('categoria_slug')
         if categoria_slug:
-            categoria = get_object_or_404(Categoria, slug=categoria_slug, activo=True)
-            
-            # Obtener IDs de la categoría y todas sus subcategorías
-            categorias_ids = [categoria.id]
-            subcategorias = categoria.subcategorias.filter(activo=True)
-            if subcategorias.exists():
-                categorias_ids.extend(subcategorias.values_list('id', flat=True))
+            self.categoria_actual = get_object_or_404(
+                Categoria, slug=categoria_slug, activo=True
+            )
             
-            queryset = queryset.filter(categoria_id__in=categorias_ids)
+            # IDs de la categoría y de todo su subárbol (a cualquier profundidad)
+            queryset = queryset.filter(
+                categoria_id__in=self.categoria_actual.obtener_ids_subarbol()
+            )
+        
+        self.facetas = self.contar_facetas()
+        return self.filtros.filtrar(queryset)
+    
+    def contar_facetas(self):
+        """
+        Cuenta los productos de cada faceta, con caché por listado.
         
-        # Filtrar por marca si se proporciona
-        marca_slug = self.request.GET.get('marca')
-        if marca_slug:
-            queryset = queryset.filter(marca__slug=marca_slug)
+        Todas las páginas de un mismo listado (misma URL salvo el cursor, el
+        número de página o el orden) comparten los conteos.
+        """
+        parametros = self.request.GET.copy()
+        for clave in ('cursor', 'page', 'orden'):
+            parametros.pop(clave, None)
+        return consulta_en_cache(
+            'facetas',
+            f'{self.request.path}?{parametros.urlencode()}',
+            lambda: contar(self.queryset_facetas, self.filtros, self.categoria_actual)
+        )
+    
+    def get_paginator(self, *args, **kwargs):
+        """Usa el total de los conteos de facetas en lugar de un COUNT."""
+        paginator = super().get_paginator(*args, **kwargs)
+        paginator.count = self.facetas['total']
+        return paginator
+    
+    def paginate_queryset(self, queryset, page_size):
+        """Pagina por cursor, salvo los resultados ordenados por relevancia."""
+        if self.orden is None:
+            return super().paginate_queryset(queryset, page_size)
         
-        return queryset
+        _, columnas = self.ordenes[self.orden]
+        paginador = PaginadorCursor(
+            queryset, page_size, columnas, count=self.facetas['total']
+        )
+        pagina = paginador.pagina(self.request.GET.get('cursor'))
+        return paginador, pagina, pagina.object_list, pagina.has_other_pages()
     
     def get_context_data(self, **kwargs):
-        """Agrega las marcas y filtros actuales al contexto."""
+        """Agrega las facetas con sus conteos y los filtros actuales al contexto."""
         context = super().get_context_data(**kwargs)
+        context['paginacion_cursor'] = self.orden is not None
+        context['orden_actual'] = self.orden
+        context['ordenes'] = [
+            (clave, etiqueta) for clave, (etiqueta, _) in self.ordenes.items()
+        ]
         
-        # Las categorías ya vienen del context_processor 'categorias'
-        # Solo agregamos las marcas activas
-        context['marcas'] = Marca.objects.filter(activo=True)
+        # Las categorías ya vienen del context_processor 'categorias';
+        # aquí se agregan los conteos de todas las facetas
+        facetas = self.facetas
+        context['facetas'] = facetas
+        context['filtros'] = self.filtros
         
-        # Categoría actual (si hay filtro)
-        categoria_slug = self.kwargs.get('categoria_slug')
-        if categoria_slug:
-            context['categoria_actual'] = get_object_or_404(
-                Categoria, slug=categoria_slug, activo=True
-            )
+        # Marcas con productos en el listado (y las elegidas, aunque no tengan)
+        context['marcas'] = [
+            {
+                'marca': marca,
+                'total': facetas['marcas'][marca.slug],
+                'activa': marca.slug in self.filtros.marcas,
+                'url': url_alternar_marca(self.request.GET, marca.slug),
+            }
+            for marca in Marca.objects.filter(activo=True)
+            if facetas['marcas'][marca.slug] or marca.slug in self.filtros.marcas
+        ]
+        context['marcas_actuales'] = [m for m in context['marcas'] if m['activa']]
+        
+        # Parámetros que el formulario de precio debe conservar
+        context['parametros_precio'] = [
+            (clave, valor)
+            for clave, valores in self.request.GET.lists()
+            if clave not in ('precio_desde', 'precio_hasta', 'page', 'cursor')
+            for valor in valores
+        ]
         
-        # Marca actual (si hay filtro)
-        marca_slug = self.request.GET.get('marca')
-        if marca_slug:
-            context['marca_actual'] = Marca.objects.filter(
-                slug=marca_slug, activo=True
-            ).first()
+        # Categoría actual (si hay filtro) y sus ancestros para el breadcrumb
+        if self.categoria_actual:
+            context['categoria_actual'] = self.categoria_actual
+            context['categoria_ancestros'] = self.categoria_actual.obtener_ancestros()
+        
+        # Texto buscado (si hay búsqueda)
+        context['busqueda'] = self.busqueda
         
         return context
 
 
+@method_decorator(cache_pagina_catalogo, name='dispatch')
 class ProductoDetailView(DetailView):
     """
     Vista para mostrar el detalle de un producto.
@@ -102,14 +218,7 @@ class ProductoDetailView(DetailView):
     
     def get_queryset(self):
         """Solo muestra productos activos."""
-        return Producto.objects.filter(activo=True).select_related(
-            'categoria', 'marca'
-        ).prefetch_related(
-            'presentaciones', 
-            'imagenes', 
-            'videos', 
-            'especificaciones'
-        )
+        return Producto.objects.filter(activo=True).con_datos_tarjeta()
     
     def get_context_data(self, **kwargs):
         """
@@ -123,8 +232,11 @@ class ProductoDetailView(DetailView):
         """
         context = super().get_context_data(**kwargs)
         
+        # Ancestros de la categoría para el breadcrumb
+        context['categoria_ancestros'] = self.object.categoria.obtener_ancestros()
+        
         # Presentaciones activas del producto
-        context['presentaciones'] = self.object.presentaciones.filter(activo=True)
+        context['presentaciones'] = self.object.presentaciones_activas
         
         # Imágenes para la galería (parte superior)
         context['imagenes_galeria'] = self.object.imagenes_galeria
@@ -132,22 +244,19 @@ class ProductoDetailView(DetailView):
         # Imágenes para la descripción (pestaña descripción)
         context['imagenes_descripcion'] = self.object.imagenes_descripcion
         
-        # Videos del producto
-        context['videos'] = self.object.videos.all().order_by('orden')
-        
-        # Especificaciones técnicas
-        context['especificaciones'] = self.object.especificaciones.all().order_by('orden')
+        # Videos y especificaciones (el modelo ya los ordena por 'orden')
+        context['videos'] = self.object.videos.all()
+        context['especificaciones'] = self.object.especificaciones.all()
         
         # Productos relacionados (misma categoría)
-        context['productos_relacionados'] = Producto.objects.filter(
-            categoria=self.object.categoria,
-            activo=True,
-            presentaciones__activo=True
-        ).exclude(pk=self.object.pk).distinct()[:4]
+        context['productos_relacionados'] = Producto.objects.disponibles().filter(
+            categoria=self.object.categoria
+        ).exclude(pk=self.object.pk).con_datos_tarjeta()[:4]
         
         return context
 
 
+@cache_pagina_catalogo
 def inicio(request):
     """
     Vista de la página de inicio.
@@ -155,24 +264,17 @@ def inicio(request):
     Muestra productos destacados, categorías principales y marcas.
     """
     # Productos destacados
-    productos_destacados = Producto.objects.filter(
-        activo=True,
-        destacado=True,
-        presentaciones__activo=True
-    ).distinct().select_related('categoria', 'marca').prefetch_related('presentaciones')[:8]
+    productos_destacados = Producto.objects.disponibles().filter(
+        destacado=True
+    ).con_datos_tarjeta()[:8]
     
     # Productos recientes
-    productos_recientes = Producto.objects.filter(
-        activo=True,
-        presentaciones__activo=True
-    ).distinct().select_related('categoria', 'marca').prefetch_related('presentaciones').order_by('-fecha_creacion')[:8]
+    productos_recientes = Producto.objects.disponibles().con_datos_tarjeta().order_by(
+        '-fecha_creacion'
+    )[:8]
     
     # Marcas activas con productos
-    marcas = Marca.objects.filter(
-        activo=True,
-        productos__activo=True,
-        productos__presentaciones__activo=True
-    ).distinct().order_by('nombre')[:8]
+    marcas = Marca.objects.filter(activo=True).con_productos().order_by('nombre')[:8]
     
     # Las categorías ya vienen del context_processor 'categorias'
     context = {
@@ -182,3 +284,81 @@ def inicio(request):
     }
     
     return render(request, 'catalogo/inicio.html', context)
+
+
+def media_negociada(request, ruta):
+    """
+    Sirve los archivos multimedia en desarrollo (DEBUG).
+    
+    Para los WebP guardados por contenido entrega la versión AVIF o JPEG
+    que corresponde a la cabecera Accept, igual que Nginx en producción.
+    
+    Args:
+        request: Petición HTTP.
+        ruta (str): Ruta del archivo dentro de MEDIA_ROOT.
+    """
+    if not (ruta.endswith('.webp') and es_nombre_por_contenido(ruta)):
+        return serve(request, ruta, document_root=settings.MEDIA_ROOT)
+    
+    sufijo = formato_preferido(request.headers.get('Accept', ''))
+    if sufijo and default_storage.exists(f'{ruta}{sufijo}'):
+        ruta = f'{ruta}{sufijo}'
+    response = serve(request, ruta, document_root=settings.MEDIA_ROOT)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def subir_imagen_editor(request):
+    """
+    Recibe las imágenes que se suben desde CKEditor 5.
+    
+    Usa la vista de django-ckeditor-5, que guarda la imagen con
+    storage.AlmacenamientoCKEditor. Si la imagen supera
+    IMAGEN_PIXELES_MAXIMOS responde con el error en el formato que muestra
+    el editor, como el formulario de las imágenes de productos, en vez de
+    un error 500.
+    
+    Args:
+        request: Petición HTTP con el archivo en 'upload'.
+    """
+    try:
+        return upload_file(request)
+    except ImagenDemasiadoGrande as e:
+        return JsonResponse({'error': {'message': str(e)}}, status=400)
+
+
+def miniatura(request, tamaño, ruta):
+    """
+    Entrega una miniatura de una imagen, generándola la primera vez.
+    
+    La miniatura queda guardada en MEDIA_ROOT/img/ con la misma ruta que la
+    URL y Nginx sirve las siguientes peticiones sin llegar a Django (ver
+    utils.generar_miniatura). Así, un nuevo tamaño en IMAGE_SIZES está
+    disponible sin volver a convertir todas las imágenes.
+    
+    La URL debe llevar la firma que genera utils.url_miniatura.
+    
+    Args:
+        request: Petición HTTP.
+        tamaño (str): Clave de IMAGE_SIZES.
+        ruta (str): Ruta del archivo original en el almacenamiento.
+    
+    Raises:
+        Http404: Si el tamaño no existe o el archivo original no existe.
+        PermissionDenied: Si la firma no es válida.
+    """
+    if tamaño not in IMAGE_SIZES:
+        raise Http404('Tamaño de imagen desconocido')
+    if posixpath.normpath(ruta) != ruta or ruta.startswith(('/', '..')):
+        raise Http404('Ruta no válida')
+    if not constant_time_compare(request.GET.get('firma', ''), firmar_miniatura(tamaño, ruta)):
+        raise PermissionDenied('Firma no válida')
+    
+    try:
+        destino = generar_miniatura(tamaño, ruta)
+    except FileNotFoundError:
+        raise Http404('La imagen no existe')
+    
+    response = FileResponse(open(destino, 'rb'), content_type='image/webp')
+    patch_cache_control(response, public=True, max_age=2592000)
+    return response
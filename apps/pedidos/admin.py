@@ -3,8 +3,9 @@ Configuración del admin para la app pedidos.
 """
 from django.contrib import admin
 from django.contrib import messages
-from .models import Pedido, ItemPedido
-from .emails import enviar_actualizacion_estado
+from django.utils import timezone
+from .models import Pedido, ItemPedido, CorreoPendiente
+from .emails import encolar_actualizacion_estado
 
 
 class ItemPedidoInline(admin.TabularInline):
@@ -30,7 +31,7 @@ class PedidoAdmin(admin.ModelAdmin):
     """
     Configuración del admin para Pedido.
     
-    Al cambiar el estado del pedido, se envía automáticamente
+    Al cambiar el estado del pedido, se encola automáticamente
     un email de notificación al cliente.
     """
     list_display = [
@@ -77,7 +78,7 @@ class PedidoAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         """
-        Sobrescribe el método save_model para enviar email
+        Sobrescribe el método save_model para encolar un email
         cuando el estado del pedido cambia.
         
         Args:
@@ -93,18 +94,12 @@ class PedidoAdmin(admin.ModelAdmin):
             # Guardar el modelo
             super().save_model(request, obj, form, change)
             
-            # Enviar notificación con el estado anterior
-            try:
-                enviar_actualizacion_estado(obj, estado_anterior)
-                messages.success(
-                    request, 
-                    f'Se ha enviado un email de notificación a {obj.email}'
-                )
-            except Exception as e:
-                messages.warning(
-                    request, 
-                    f'El pedido se guardó pero hubo un error al enviar el email: {e}'
-                )
+            # Encolar la notificación con el estado anterior
+            encolar_actualizacion_estado(obj, estado_anterior)
+            messages.success(
+                request, 
+                f'Se enviará un email de notificación a {obj.email}'
+            )
         else:
             super().save_model(request, obj, form, change)
 
@@ -129,3 +124,34 @@ class ItemPedidoAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    """
+    Configuración del admin para la bandeja de salida de correos.
+    
+    Permite revisar los envíos fallidos y programar un nuevo intento.
+    """
+    list_display = ['asunto', 'pedido', 'estado', 'intentos', 'proximo_intento', 'creado', 'enviado']
+    list_filter = ['estado', 'creado']
+    search_fields = ['asunto', 'pedido__numero_pedido']
+    readonly_fields = [
+        'pedido', 'destinatarios', 'asunto', 'html', 'responder_a', 'estado',
+        'intentos', 'proximo_intento', 'ultimo_error', 'resend_id', 'creado', 'enviado'
+    ]
+    actions = ['reintentar']
+    
+    def has_add_permission(self, request):
+        """Los correos solo se crean al encolarlos desde el código."""
+        return False
+    
+    @admin.action(description='Reintentar envío ahora')
+    def reintentar(self, request, queryset):
+        """Vuelve a poner en cola los correos seleccionados que no se enviaron."""
+        cantidad = queryset.exclude(estado='enviado').update(
+            estado='pendiente',
+            intentos=0,
+            proximo_intento=timezone.now(),
+        )
+        messages.success(request, f'{cantidad} correos vuelven a la cola de envío')
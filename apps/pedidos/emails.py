@@ -6,149 +6,177 @@ Este módulo maneja todos los emails transaccionales del sistema de pedidos:
 - Notificación de nuevo pedido al admin
 - Actualización de estado del pedido
 
+Los correos no se envían durante la petición: se renderizan y se guardan
+en la bandeja de salida (CorreoPendiente) dentro de la misma transacción
+que el pedido. El comando 'enviar_correos' los envía por lotes.
+
 Documentación de Resend: https://resend.com/docs/send-with-python
 """
+import hashlib
 import urllib.parse
 import resend
 from django.conf import settings
 from django.template.loader import render_to_string
 
+from .models import CorreoPendiente
+
 
 # Configurar API Key de Resend
 resend.api_key = settings.RESEND_API_KEY
 
 
-def enviar_confirmacion_pedido(pedido):
+def encolar_correo(destinatarios, asunto, html, pedido=None, responder_a=''):
+    """
+    Guarda un correo en la bandeja de salida.
+    
+    Args:
+        destinatarios (list): Direcciones de destino.
+        asunto (str): Asunto del correo.
+        html (str): Contenido HTML renderizado.
+        pedido: Pedido relacionado (opcional).
+        responder_a (str): Dirección de respuesta (opcional).
+    
+    Returns:
+        CorreoPendiente: El correo encolado.
+    """
+    return CorreoPendiente.objects.create(
+        pedido=pedido,
+        destinatarios=list(destinatarios),
+        asunto=asunto,
+        html=html,
+        responder_a=responder_a or '',
+    )
+
+
+def encolar_confirmacion_pedido(pedido):
     """
-    Envía el correo de confirmación al cliente después de crear un pedido.
+    Encola el correo de confirmación al cliente después de crear un pedido.
     
     Args:
         pedido: Instancia del modelo Pedido.
     
     Returns:
-        dict | None: Respuesta de Resend si se envió, None si hubo error.
+        CorreoPendiente: El correo encolado.
     """
-    try:
-        # Contexto para la plantilla
-        context = {
-            'pedido': pedido,
-            'items': pedido.items.all(),
-            'site_name': settings.SITE_NAME,
-            'site_url': settings.SITE_URL,
-            'whatsapp_number': settings.WHATSAPP_NUMBER,
-            'whatsapp_link': generar_link_whatsapp(pedido),
-        }
-        
-        # Renderizar plantilla HTML
-        html_content = render_to_string('pedidos/emails/confirmacion.html', context)
-        
-        # Enviar email con Resend
-        params = {
-            "from": settings.RESEND_FROM_EMAIL,
-            "to": [pedido.email],
-            "reply_to": settings.RESEND_REPLY_TO,
-            "subject": f"✅ Pedido {pedido.numero_pedido} - Confirmación",
-            "html": html_content,
-        }
-        
-        response = resend.Emails.send(params)
-        print(f"✅ Email de confirmación enviado a {pedido.email}: {response}")
-        return response
-        
-    except Exception as e:
-        print(f"❌ Error al enviar email de confirmación: {e}")
-        return None
+    # Contexto para la plantilla
+    context = {
+        'pedido': pedido,
+        'items': pedido.items.all(),
+        'site_name': settings.SITE_NAME,
+        'site_url': settings.SITE_URL,
+        'whatsapp_number': settings.WHATSAPP_NUMBER,
+        'whatsapp_link': generar_link_whatsapp(pedido),
+    }
+    
+    # Renderizar plantilla HTML
+    html_content = render_to_string('pedidos/emails/confirmacion.html', context)
+    
+    return encolar_correo(
+        [pedido.email],
+        f"✅ Pedido {pedido.numero_pedido} - Confirmación",
+        html_content,
+        pedido=pedido,
+        responder_a=settings.RESEND_REPLY_TO,
+    )
 
 
-def enviar_notificacion_admin(pedido):
+def encolar_notificacion_admin(pedido):
     """
-    Envía notificación al administrador cuando hay un nuevo pedido.
+    Encola la notificación al administrador cuando hay un nuevo pedido.
     
     Args:
         pedido: Instancia del modelo Pedido.
     
     Returns:
-        dict | None: Respuesta de Resend si se envió, None si hubo error.
+        CorreoPendiente | None: El correo encolado, None si no hay ADMIN_EMAIL.
     """
     if not settings.ADMIN_EMAIL:
         print("⚠️ ADMIN_EMAIL no configurado, no se envía notificación")
         return None
-        
-    try:
-        context = {
-            'pedido': pedido,
-            'items': pedido.items.all(),
-            'site_name': settings.SITE_NAME,
-            'site_url': settings.SITE_URL,
-        }
-        
-        html_content = render_to_string('pedidos/emails/notificacion_admin.html', context)
-        
-        params = {
-            "from": settings.RESEND_FROM_EMAIL,
-            "to": [settings.ADMIN_EMAIL],
-            "subject": f"🛒 Nuevo Pedido {pedido.numero_pedido} - S/{pedido.total}",
-            "html": html_content,
-        }
-        
-        response = resend.Emails.send(params)
-        print(f"✅ Notificación enviada al admin: {response}")
-        return response
-        
-    except Exception as e:
-        print(f"❌ Error al enviar notificación al admin: {e}")
-        return None
+    
+    context = {
+        'pedido': pedido,
+        'items': pedido.items.all(),
+        'site_name': settings.SITE_NAME,
+        'site_url': settings.SITE_URL,
+    }
+    
+    html_content = render_to_string('pedidos/emails/notificacion_admin.html', context)
+    
+    return encolar_correo(
+        [settings.ADMIN_EMAIL],
+        f"🛒 Nuevo Pedido {pedido.numero_pedido} - S/{pedido.total}",
+        html_content,
+        pedido=pedido,
+    )
 
 
-def enviar_actualizacion_estado(pedido, estado_anterior):
+def encolar_actualizacion_estado(pedido, estado_anterior):
     """
-    Envía un correo cuando el estado del pedido cambia.
+    Encola un correo para avisar al cliente que el estado del pedido cambió.
     
     Args:
         pedido: Instancia del modelo Pedido.
         estado_anterior: Estado previo del pedido.
     
     Returns:
-        dict | None: Respuesta de Resend si se envió, None si hubo error.
+        CorreoPendiente: El correo encolado.
     """
-    try:
-        context = {
-            'pedido': pedido,
-            'estado_anterior': estado_anterior,
-            'estado_anterior_display': dict(pedido.ESTADO_CHOICES).get(estado_anterior, estado_anterior),
-            'site_name': settings.SITE_NAME,
-            'site_url': settings.SITE_URL,
-            'whatsapp_number': settings.WHATSAPP_NUMBER,
-        }
-        
-        html_content = render_to_string('pedidos/emails/actualizacion_estado.html', context)
-        
-        # Emoji según el estado
-        emojis = {
-            'pendiente': '⏳',
-            'pagado': '💳',
-            'procesando': '📦',
-            'enviado': '🚚',
-            'entregado': '✅',
-            'cancelado': '❌',
-        }
-        emoji = emojis.get(pedido.estado, '📋')
-        
-        params = {
-            "from": settings.RESEND_FROM_EMAIL,
-            "to": [pedido.email],
-            "reply_to": settings.RESEND_REPLY_TO,
-            "subject": f"{emoji} Tu pedido {pedido.numero_pedido} - {pedido.get_estado_display()}",
-            "html": html_content,
-        }
-        
-        response = resend.Emails.send(params)
-        print(f"✅ Email de actualización enviado a {pedido.email}: {response}")
-        return response
-        
-    except Exception as e:
-        print(f"❌ Error al enviar email de actualización: {e}")
-        return None
+    context = {
+        'pedido': pedido,
+        'estado_anterior': estado_anterior,
+        'estado_anterior_display': dict(pedido.ESTADO_CHOICES).get(estado_anterior, estado_anterior),
+        'site_name': settings.SITE_NAME,
+        'site_url': settings.SITE_URL,
+        'whatsapp_number': settings.WHATSAPP_NUMBER,
+    }
+    
+    html_content = render_to_string('pedidos/emails/actualizacion_estado.html', context)
+    
+    # Emoji según el estado
+    emojis = {
+        'pendiente': '⏳',
+        'pagado': '💳',
+        'procesando': '📦',
+        'enviado': '🚚',
+        'entregado': '✅',
+        'cancelado': '❌',
+    }
+    emoji = emojis.get(pedido.estado, '📋')
+    
+    return encolar_correo(
+        [pedido.email],
+        f"{emoji} Tu pedido {pedido.numero_pedido} - {pedido.get_estado_display()}",
+        html_content,
+        pedido=pedido,
+        responder_a=settings.RESEND_REPLY_TO,
+    )
+
+
+def enviar_lote(correos):
+    """
+    Envía varios correos de la bandeja de salida en una sola llamada a Resend.
+    
+    La clave de idempotencia depende de los correos del lote, de modo que
+    reintentar el mismo lote no duplica los envíos.
+    
+    Args:
+        correos (list): Instancias de CorreoPendiente (máximo 100).
+    
+    Returns:
+        list: IDs asignados por Resend, en el mismo orden que los correos.
+    
+    Raises:
+        resend.exceptions.ResendError: Si Resend rechaza el lote.
+    """
+    ids = '-'.join(str(correo.pk) for correo in correos)
+    clave = hashlib.sha256(ids.encode('utf-8')).hexdigest()
+    
+    respuesta = resend.Batch.send(
+        [correo.como_parametros() for correo in correos],
+        {'idempotency_key': f'correos-{clave}'},
+    )
+    return [dato.get('id', '') for dato in respuesta.get('data', [])]
 
 
 def generar_link_whatsapp(pedido):
@@ -0,0 +1 @@
+# Archivo vacío para que Python reconozca este directorio como un paquete.
@@ -0,0 +1,175 @@
+"""
+Comando de Django que envía los correos de la bandeja de salida.
+
+Se ejecuta como un proceso aparte de Gunicorn. Toma los correos pendientes
+por lotes, los envía con la API de lotes de Resend y reintenta los que
+fallan con espera exponencial. Si un lote falla, sus correos se envían
+uno a uno para que un correo inválido no arrastre a los demás.
+
+Uso:
+    python manage.py enviar_correos              # Proceso continuo
+    python manage.py enviar_correos --una-vez    # Vacía la bandeja y termina
+    python manage.py enviar_correos --lote 20 --intervalo 10
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.pedidos.emails import enviar_lote
+from apps.pedidos.models import CorreoPendiente
+
+
+# Tiempo que un lote queda reservado para el proceso que lo tomó
+RESERVA = timedelta(minutes=5)
+
+# Espera antes del primer reintento; se duplica en cada intento
+ESPERA_BASE = timedelta(seconds=30)
+
+# Espera máxima entre reintentos
+ESPERA_MAXIMA = timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    """Comando para enviar los correos encolados."""
+    
+    help = 'Envía por lotes los correos pendientes de la bandeja de salida'
+    
+    def add_arguments(self, parser):
+        """Define los argumentos del comando."""
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=50,
+            help='Correos por llamada a Resend (máximo 100)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando no hay correos pendientes',
+        )
+        parser.add_argument(
+            '--max-intentos',
+            type=int,
+            default=8,
+            help='Intentos antes de marcar un correo como fallido',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Envía los correos disponibles y termina',
+        )
+    
+    def handle(self, *args, **options):
+        """Ejecuta el envío de correos."""
+        lote = max(1, min(options['lote'], 100))
+        max_intentos = options['max_intentos']
+        
+        try:
+            while True:
+                correos = self._reservar(lote)
+                if correos:
+                    self._enviar(correos, max_intentos)
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('\n⏹️  Envío de correos detenido')
+    
+    def _reservar(self, lote):
+        """
+        Toma un lote de correos listos para enviar.
+        
+        Los correos se bloquean con skip_locked para que varios procesos no
+        tomen los mismos, y se aplaza su próximo intento para que queden
+        reservados aunque el proceso termine a mitad del envío.
+        
+        Args:
+            lote (int): Cantidad máxima de correos.
+        
+        Returns:
+            list: Instancias de CorreoPendiente reservadas.
+        """
+        ahora = timezone.now()
+        with transaction.atomic():
+            correos = list(
+                CorreoPendiente.objects.select_for_update(skip_locked=True)
+                .filter(estado='pendiente', proximo_intento__lte=ahora)
+                .order_by('proximo_intento', 'pk')[:lote]
+            )
+            if correos:
+                CorreoPendiente.objects.filter(
+                    pk__in=[correo.pk for correo in correos]
+                ).update(proximo_intento=ahora + RESERVA)
+        return correos
+    
+    def _enviar(self, correos, max_intentos):
+        """
+        Envía un lote y registra el resultado de cada correo.
+        
+        Si Resend rechaza el lote (basta un destinatario mal escrito para
+        que falle entero), los correos se envían uno a uno: así solo el que
+        falla se reintenta o queda como fallido.
+        
+        Args:
+            correos (list): Correos reservados.
+            max_intentos (int): Intentos antes de marcar como fallido.
+        """
+        try:
+            ids = enviar_lote(correos)
+        except Exception as e:
+            if len(correos) > 1:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'⚠️  Falló el lote de {len(correos)} correos ({e}), se envían uno a uno'
+                    )
+                )
+                for correo in correos:
+                    self._enviar([correo], max_intentos)
+                return
+            self._registrar_error(correos, e, max_intentos)
+            return
+        
+        ahora = timezone.now()
+        for correo, resend_id in zip(correos, ids + [''] * len(correos)):
+            correo.intentos += 1
+            correo.estado = 'enviado'
+            correo.enviado = ahora
+            correo.resend_id = resend_id
+            correo.ultimo_error = ''
+        CorreoPendiente.objects.bulk_update(
+            correos, ['intentos', 'estado', 'enviado', 'resend_id', 'ultimo_error']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {len(correos)} correos enviados')
+        )
+    
+    def _registrar_error(self, correos, error, max_intentos):
+        """
+        Programa el reintento de los correos, o los marca como fallidos.
+        
+        Args:
+            correos (list): Correos que no se pudieron enviar.
+            error (Exception): Error de Resend.
+            max_intentos (int): Intentos antes de marcar como fallido.
+        """
+        ahora = timezone.now()
+        for correo in correos:
+            correo.intentos += 1
+            correo.ultimo_error = str(error)
+            if correo.intentos >= max_intentos:
+                correo.estado = 'fallido'
+            else:
+                espera = min(ESPERA_BASE * 2 ** (correo.intentos - 1), ESPERA_MAXIMA)
+                correo.proximo_intento = ahora + espera
+        CorreoPendiente.objects.bulk_update(
+            correos, ['intentos', 'ultimo_error', 'estado', 'proximo_intento']
+        )
+        self.stdout.write(
+            self.style.ERROR(f'❌ Error al enviar {len(correos)} correos: {error}')
+        )
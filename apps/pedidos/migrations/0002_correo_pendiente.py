@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatarios', models.JSONField(verbose_name='Destinatarios')),
+                ('asunto', models.CharField(max_length=300, verbose_name='Asunto')),
+                ('html', models.TextField(verbose_name='Contenido HTML')),
+                ('responder_a', models.CharField(blank=True, max_length=254, verbose_name='Responder a')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('resend_id', models.CharField(blank=True, max_length=100, verbose_name='ID de Resend')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('enviado', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de envío')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='correos', to='pedidos.pedido', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Correo pendiente',
+                'verbose_name_plural': 'Correos pendientes',
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='pedidos_cor_estado_f625db_idx')],
+            },
+        ),
+    ]
@@ -5,12 +5,19 @@ Permite procesar pedidos sin necesidad de registro de usuario.
 Solo se requieren datos de contacto y envío.
 """
 import uuid
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import RegexValidator
+from django.utils import timezone
 
 from apps.catalogo.models import Presentacion
 
 
+class StockInsuficiente(ValueError):
+    """Se lanza cuando una presentación no tiene stock para completar el pedido."""
+
+
 class Pedido(models.Model):
     """
     Modelo para los pedidos de la tienda.
@@ -150,6 +157,90 @@ class Pedido(models.Model):
         """Calcula y guarda el total del pedido."""
         self.total = sum(item.subtotal for item in self.items.all())
         self.save(update_fields=['total'])
+    
+    @classmethod
+    def crear_desde_carrito(cls, carrito, **datos_cliente):
+        """
+        Crea un pedido con sus items y descuenta el stock de forma segura.
+        
+        Bloquea las filas de las presentaciones involucradas con
+        select_for_update (en orden de id para evitar interbloqueos), valida
+        el stock con los valores bloqueados, crea los items con bulk_create y
+        descuenta el stock con expresiones F() que solo actualizan la columna
+        'stock'. El total se calcula en memoria.
+        
+        Args:
+            carrito: Instancia de Carrito con los items a comprar.
+            **datos_cliente: Campos de contacto y envío del pedido.
+        
+        Returns:
+            Pedido: El pedido creado.
+        
+        Raises:
+            StockInsuficiente: Si alguna presentación no tiene stock suficiente.
+        """
+        cantidades = {
+            int(presentacion_id): datos['cantidad']
+            for presentacion_id, datos in carrito.carrito.items()
+        }
+        precios = {
+            item['presentacion'].pk: item['precio'] for item in carrito
+        }
+        
+        with transaction.atomic():
+            presentaciones = list(
+                Presentacion.objects.select_for_update(of=('self',))
+                .select_related('producto')
+                .filter(pk__in=precios)
+                .order_by('pk')
+            )
+            
+            for presentacion in presentaciones:
+                if cantidades[presentacion.pk] > presentacion.stock:
+                    raise StockInsuficiente(
+                        f'Stock insuficiente para {presentacion.producto.nombre} - {presentacion.nombre}'
+                    )
+            
+            items = [
+                ItemPedido(
+                    presentacion=presentacion,
+                    producto_nombre=presentacion.producto.nombre,
+                    presentacion_nombre=presentacion.nombre,
+                    precio=precios[presentacion.pk],
+                    cantidad=cantidades[presentacion.pk],
+                )
+                for presentacion in presentaciones
+            ]
+            
+            pedido = cls(**datos_cliente)
+            pedido.total = sum(item.subtotal for item in items)
+            pedido.save()
+            
+            for item in items:
+                item.pedido = pedido
+            ItemPedido.objects.bulk_create(items)
+            
+            # Descontar stock; la condición stock__gte protege también a las
+            # bases de datos que ignoran select_for_update (SQLite)
+            agotados = set()
+            for presentacion in presentaciones:
+                cantidad = cantidades[presentacion.pk]
+                actualizadas = Presentacion.objects.filter(
+                    pk=presentacion.pk, stock__gte=cantidad
+                ).update(stock=F('stock') - cantidad)
+                if not actualizadas:
+                    raise StockInsuficiente(
+                        f'Stock insuficiente para {presentacion.producto.nombre} - {presentacion.nombre}'
+                    )
+                if presentacion.stock == cantidad:
+                    agotados.add(presentacion.producto)
+            
+            # Las páginas en caché solo cambian si alguna presentación se
+            # agotó: actualizar_resumen() las invalida al confirmar el pedido
+            for producto in agotados:
+                producto.actualizar_resumen()
+        
+        return pedido
 
 
 class ItemPedido(models.Model):
@@ -212,3 +303,117 @@ class ItemPedido(models.Model):
     def subtotal(self):
         """Calcula el subtotal del item."""
         return self.precio * self.cantidad
+
+
+class CorreoPendiente(models.Model):
+    """
+    Bandeja de salida de correos transaccionales.
+    
+    Los correos se guardan en la misma transacción que el pedido y los
+    envía el comando 'enviar_correos', fuera del ciclo de la petición.
+    
+    Atributos:
+        pedido (ForeignKey): Pedido relacionado (opcional).
+        destinatarios (list): Direcciones de correo de destino.
+        asunto (str): Asunto del correo.
+        html (str): Contenido HTML ya renderizado.
+        responder_a (str): Dirección de respuesta (opcional).
+        estado (str): pendiente, enviado o fallido.
+        intentos (int): Envíos intentados hasta ahora.
+        proximo_intento (datetime): Momento a partir del cual puede enviarse.
+        ultimo_error (str): Mensaje del último error de envío.
+        resend_id (str): Identificador asignado por Resend.
+        creado (datetime): Fecha de creación.
+        enviado (datetime): Fecha de envío.
+    """
+    
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+    
+    pedido = models.ForeignKey(
+        Pedido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='correos',
+        verbose_name='Pedido'
+    )
+    destinatarios = models.JSONField(
+        verbose_name='Destinatarios'
+    )
+    asunto = models.CharField(
+        max_length=300,
+        verbose_name='Asunto'
+    )
+    html = models.TextField(
+        verbose_name='Contenido HTML'
+    )
+    responder_a = models.CharField(
+        max_length=254,
+        blank=True,
+        verbose_name='Responder a'
+    )
+    estado = models.CharField(
+        max_length=10,
+        choices=ESTADO_CHOICES,
+        default='pendiente',
+        verbose_name='Estado'
+    )
+    intentos = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Intentos'
+    )
+    proximo_intento = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Próximo intento'
+    )
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name='Último error'
+    )
+    resend_id = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='ID de Resend'
+    )
+    creado = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+    enviado = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de envío'
+    )
+    
+    class Meta:
+        verbose_name = 'Correo pendiente'
+        verbose_name_plural = 'Correos pendientes'
+        ordering = ['-creado']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento']),
+        ]
+    
+    def __str__(self):
+        """Retorna el asunto y los destinatarios."""
+        return f"{self.asunto} → {', '.join(self.destinatarios)}"
+    
+    def como_parametros(self):
+        """
+        Retorna el correo en el formato que espera la API de Resend.
+        
+        Returns:
+            dict: Parámetros para resend.Emails.send o resend.Batch.send.
+        """
+        params = {
+            'from': settings.RESEND_FROM_EMAIL,
+            'to': self.destinatarios,
+            'subject': self.asunto,
+            'html': self.html,
+        }
+        if self.responder_a:
+            params['reply_to'] = self.responder_a
+        return params
@@ -1,3 +1,443 @@
-from django.test import TestCase
+"""
+Pruebas unitarias para la aplicación de pedidos.
 
-# Create your tests here.
+Este módulo contiene las pruebas para la creación de pedidos desde el
+carrito y la vista de checkout.
+"""
+
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from decimal import Decimal
+
+import resend
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.carrito.carrito import Carrito
+from apps.catalogo.models import Categoria, Producto, Presentacion
+from .emails import encolar_correo
+from .models import Pedido, ItemPedido, CorreoPendiente, StockInsuficiente
+
+
+DATOS_CLIENTE = {
+    'nombre': 'Ana Torres',
+    'email': 'ana@example.com',
+    'direccion': 'Av. Principal 123',
+    'ciudad': 'Lima',
+    'codigo_postal': '15001',
+}
+
+
+def crear_carrito(*lineas):
+    """
+    Crea un carrito en una sesión nueva.
+
+    Args:
+        *lineas: Tuplas (presentacion, cantidad).
+
+    Returns:
+        Carrito: Carrito con las líneas indicadas.
+    """
+    request = RequestFactory().get('/')
+    request.session = SessionStore()
+    carrito = Carrito(request)
+    for presentacion, cantidad in lineas:
+        carrito.agregar(presentacion, cantidad)
+    return carrito
+
+
+class CrearPedidoTest(TestCase):
+    """Pruebas para Pedido.crear_desde_carrito."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        categoria = Categoria.objects.create(nombre='Iluminación')
+        self.producto = Producto.objects.create(
+            nombre='Lámpara LED',
+            categoria=categoria,
+            descripcion_corta='Lámpara para acuario plantado'
+        )
+        self.pequena = Presentacion.objects.create(
+            producto=self.producto,
+            nombre='30 cm',
+            precio=Decimal('80.00'),
+            stock=5
+        )
+        self.grande = Presentacion.objects.create(
+            producto=self.producto,
+            nombre='60 cm',
+            precio=Decimal('150.00'),
+            precio_oferta=Decimal('130.00'),
+            stock=2
+        )
+
+    def test_crea_items_y_descuenta_stock(self):
+        """Verifica que se crean los items, el total y se descuenta el stock."""
+        carrito = crear_carrito((self.pequena, 2), (self.grande, 1))
+
+        pedido = Pedido.crear_desde_carrito(carrito, **DATOS_CLIENTE)
+
+        self.assertEqual(pedido.total, Decimal('290.00'))
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).total, Decimal('290.00'))
+        self.assertEqual(pedido.items.count(), 2)
+        self.assertEqual(
+            ItemPedido.objects.get(pedido=pedido, presentacion=self.grande).precio,
+            Decimal('130.00')
+        )
+        self.pequena.refresh_from_db()
+        self.grande.refresh_from_db()
+        self.assertEqual(self.pequena.stock, 3)
+        self.assertEqual(self.grande.stock, 1)
+
+    def test_stock_insuficiente_no_crea_nada(self):
+        """Verifica que sin stock suficiente no se crea el pedido ni cambia el stock."""
+        carrito = crear_carrito((self.pequena, 1), (self.grande, 2))
+        Presentacion.objects.filter(pk=self.grande.pk).update(stock=1)
+
+        with self.assertRaises(StockInsuficiente):
+            Pedido.crear_desde_carrito(carrito, **DATOS_CLIENTE)
+
+        self.assertFalse(Pedido.objects.exists())
+        self.pequena.refresh_from_db()
+        self.assertEqual(self.pequena.stock, 5)
+
+    def test_agotar_actualiza_resumen(self):
+        """Verifica que agotar la última presentación actualiza el resumen del producto."""
+        carrito = crear_carrito((self.pequena, 5), (self.grande, 2))
+
+        Pedido.crear_desde_carrito(carrito, **DATOS_CLIENTE)
+
+        self.producto.refresh_from_db()
+        self.assertFalse(self.producto.con_stock)
+
+    def test_solo_agotar_invalida_paginas(self):
+        """Verifica que el pedido solo invalida las páginas en caché si algo se agotó."""
+        from apps.catalogo.cache import version_paginas
+
+        version = version_paginas()
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.crear_desde_carrito(crear_carrito((self.pequena, 1)), **DATOS_CLIENTE)
+        self.assertEqual(version_paginas(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.crear_desde_carrito(crear_carrito((self.grande, 2)), **DATOS_CLIENTE)
+        self.assertNotEqual(version_paginas(), version)
+
+    def test_items_en_un_solo_insert(self):
+        """Verifica que los items se insertan juntos y el stock no usa save()."""
+        carrito = crear_carrito((self.pequena, 1), (self.grande, 1))
+        list(carrito)
+
+        with CaptureQueriesContext(connection) as consultas:
+            Pedido.crear_desde_carrito(carrito, **DATOS_CLIENTE)
+
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        inserts = [s for s in sql if s.startswith('INSERT')]
+        updates = [s for s in sql if s.startswith('UPDATE')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(len(updates), 2)
+        for update in updates:
+            self.assertIn('SET "stock" = ', update)
+            self.assertNotIn('"precio"', update.split('WHERE')[0])
+
+
+class CheckoutViewTest(TestCase):
+    """Pruebas para la vista de checkout."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        categoria = Categoria.objects.create(nombre='Alimento')
+        producto = Producto.objects.create(
+            nombre='Escamas tropicales',
+            categoria=categoria,
+            descripcion_corta='Alimento en escamas'
+        )
+        self.presentacion = Presentacion.objects.create(
+            producto=producto,
+            nombre='100 g',
+            precio=Decimal('25.00'),
+            stock=3
+        )
+
+    @override_settings(ADMIN_EMAIL='admin@example.com')
+    def test_checkout_crea_pedido(self):
+        """Verifica que el checkout crea el pedido, vacía el carrito y encola los correos."""
+        self.client.post(
+            reverse('carrito:agregar', args=[self.presentacion.id]),
+            {'cantidad': 2}
+        )
+
+        response = self.client.post(reverse('pedidos:checkout'), DATOS_CLIENTE)
+
+        pedido = Pedido.objects.get()
+        self.assertRedirects(
+            response,
+            reverse('pedidos:confirmacion', args=[pedido.numero_pedido])
+        )
+        self.assertEqual(pedido.total, Decimal('50.00'))
+        self.assertNotIn('carrito', self.client.session)
+        correos = CorreoPendiente.objects.filter(pedido=pedido, estado='pendiente')
+        self.assertEqual(
+            sorted(correo.destinatarios[0] for correo in correos),
+            ['admin@example.com', 'ana@example.com']
+        )
+
+    def test_checkout_sin_stock(self):
+        """Verifica que el checkout muestra el error cuando falta stock."""
+        self.client.post(
+            reverse('carrito:agregar', args=[self.presentacion.id]),
+            {'cantidad': 3}
+        )
+        Presentacion.objects.filter(pk=self.presentacion.pk).update(stock=1)
+
+        response = self.client.post(reverse('pedidos:checkout'), DATOS_CLIENTE)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Stock insuficiente')
+        self.assertFalse(Pedido.objects.exists())
+
+
+class CheckoutConcurrenteTest(TransactionTestCase):
+    """Pruebas de compras simultáneas de una misma presentación."""
+
+    COMPRADORES = 10
+    STOCK = 4
+
+    def setUp(self):
+        """Crea una presentación con poco stock."""
+        categoria = Categoria.objects.create(nombre='Sustratos')
+        producto = Producto.objects.create(
+            nombre='Sustrato nutritivo',
+            categoria=categoria,
+            descripcion_corta='Sustrato para plantas'
+        )
+        self.presentacion = Presentacion.objects.create(
+            producto=producto,
+            nombre='5 kg',
+            precio=Decimal('60.00'),
+            stock=self.STOCK
+        )
+
+    def test_no_vende_mas_que_el_stock(self):
+        """Verifica que muchos compradores simultáneos no sobrevenden el stock."""
+        inicio = threading.Barrier(self.COMPRADORES)
+        resultados = []
+
+        def comprar():
+            try:
+                carrito = crear_carrito((self.presentacion, 1))
+                list(carrito)
+                inicio.wait()
+                for _ in range(100):
+                    try:
+                        Pedido.crear_desde_carrito(carrito, **DATOS_CLIENTE)
+                        resultados.append(True)
+                        return
+                    except OperationalError:
+                        # SQLite no bloquea filas: reintentar si la tabla está ocupada
+                        time.sleep(0.01)
+            except StockInsuficiente:
+                resultados.append(False)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar) for _ in range(self.COMPRADORES)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        vendidos = resultados.count(True)
+        self.presentacion.refresh_from_db()
+
+        self.assertEqual(len(resultados), self.COMPRADORES)
+        self.assertEqual(vendidos, self.STOCK)
+        self.assertEqual(self.presentacion.stock, 0)
+        self.assertEqual(Pedido.objects.count(), vendidos)
+        self.assertEqual(ItemPedido.objects.count(), vendidos)
+
+
+class ResendFalso(BaseHTTPRequestHandler):
+    """
+    Servidor HTTP local que imita la API de lotes de Resend.
+
+    Guarda cada lote recibido en 'lotes' y responde con error mientras
+    'fallos' sea mayor que cero. Rechaza, como Resend, los lotes con algún
+    destinatario de 'rechazados'.
+    """
+
+    lotes = []
+    fallos = 0
+    rechazados = set()
+
+    def do_POST(self):
+        """Responde a POST /emails/batch."""
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if any(set(correo['to']) & ResendFalso.rechazados for correo in cuerpo):
+            self._responder(422, {
+                'statusCode': 422,
+                'name': 'validation_error',
+                'message': 'Invalid `to` field',
+            })
+            return
+        if ResendFalso.fallos > 0:
+            ResendFalso.fallos -= 1
+            self._responder(500, {
+                'statusCode': 500,
+                'name': 'application_error',
+                'message': 'Servicio no disponible',
+            })
+            return
+        ResendFalso.lotes.append({
+            'ruta': self.path,
+            'clave': self.headers.get('Idempotency-Key'),
+            'correos': cuerpo,
+        })
+        self._responder(200, {
+            'data': [{'id': f'resend-{len(ResendFalso.lotes)}-{i}'} for i in range(len(cuerpo))]
+        })
+
+    def _responder(self, codigo, datos):
+        """Envía una respuesta JSON."""
+        contenido = json.dumps(datos).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        """Silencia el registro de peticiones."""
+
+
+class EnviarCorreosTest(TestCase):
+    """Pruebas para la bandeja de salida y el comando enviar_correos."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Inicia el servidor falso de Resend."""
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ResendFalso)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.api_url_original = resend.api_url
+        resend.api_url = f'http://127.0.0.1:{cls.servidor.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        """Detiene el servidor falso de Resend."""
+        resend.api_url = cls.api_url_original
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        """Limpia el registro del servidor falso y crea un pedido."""
+        ResendFalso.lotes = []
+        ResendFalso.fallos = 0
+        ResendFalso.rechazados = set()
+        self.pedido = Pedido.objects.create(**DATOS_CLIENTE)
+
+    def _enviar(self, *args):
+        """Ejecuta el comando una vez y retorna su salida."""
+        salida = StringIO()
+        call_command('enviar_correos', '--una-vez', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_envia_por_lotes(self):
+        """Verifica que los correos se envían agrupados y se marcan como enviados."""
+        for i in range(5):
+            encolar_correo([f'cliente{i}@example.com'], f'Correo {i}', '<p>Hola</p>', pedido=self.pedido)
+
+        self._enviar('--lote', '2')
+
+        self.assertEqual([len(lote['correos']) for lote in ResendFalso.lotes], [2, 2, 1])
+        self.assertEqual(ResendFalso.lotes[0]['ruta'], '/emails/batch')
+        self.assertTrue(ResendFalso.lotes[0]['clave'].startswith('correos-'))
+        self.assertFalse(CorreoPendiente.objects.exclude(estado='enviado').exists())
+        self.assertEqual(
+            CorreoPendiente.objects.order_by('pk').first().resend_id,
+            'resend-1-0'
+        )
+
+    def test_reintenta_con_espera(self):
+        """Verifica que un error programa un reintento con espera exponencial."""
+        correo = encolar_correo(['ana@example.com'], 'Confirmación', '<p>Hola</p>')
+        ResendFalso.fallos = 1
+
+        self._enviar()
+
+        correo.refresh_from_db()
+        self.assertEqual(correo.estado, 'pendiente')
+        self.assertEqual(correo.intentos, 1)
+        self.assertIn('Servicio no disponible', correo.ultimo_error)
+        self.assertGreater(correo.proximo_intento, timezone.now() + timedelta(seconds=20))
+
+        # Cuando llega la hora del reintento, se envía
+        CorreoPendiente.objects.update(proximo_intento=timezone.now())
+        self._enviar()
+
+        correo.refresh_from_db()
+        self.assertEqual(correo.estado, 'enviado')
+        self.assertEqual(correo.intentos, 2)
+
+    def test_marca_fallido_tras_max_intentos(self):
+        """Verifica que se deja de reintentar después del máximo de intentos."""
+        correo = encolar_correo(['ana@example.com'], 'Confirmación', '<p>Hola</p>')
+        ResendFalso.fallos = 1
+
+        self._enviar('--max-intentos', '1')
+
+        correo.refresh_from_db()
+        self.assertEqual(correo.estado, 'fallido')
+        self.assertEqual(ResendFalso.lotes, [])
+
+    def test_correo_invalido_no_bloquea_el_lote(self):
+        """Verifica que si el lote falla, solo el correo inválido queda sin enviar."""
+        for destinatario in ('ana@example.com', 'mal@@example', 'luis@example.com'):
+            encolar_correo([destinatario], 'Confirmación', '<p>Hola</p>', pedido=self.pedido)
+        ResendFalso.rechazados = {'mal@@example'}
+
+        self._enviar('--max-intentos', '1')
+
+        estados = dict(CorreoPendiente.objects.values_list('destinatarios__0', 'estado'))
+        self.assertEqual(estados, {
+            'ana@example.com': 'enviado',
+            'mal@@example': 'fallido',
+            'luis@example.com': 'enviado',
+        })
+        self.assertEqual([len(lote['correos']) for lote in ResendFalso.lotes], [1, 1])
+        self.assertIn('Invalid', CorreoPendiente.objects.get(estado='fallido').ultimo_error)
+
+    @override_settings(ADMIN_EMAIL='')
+    def test_cambio_de_estado_en_admin_encola(self):
+        """Verifica que cambiar el estado desde el admin encola el correo sin enviarlo."""
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave-segura')
+        self.client.force_login(admin)
+        datos = dict(DATOS_CLIENTE, estado='enviado', telefono='', notas='')
+        datos.update({
+            'items-TOTAL_FORMS': '0',
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+        })
+
+        self.client.post(
+            reverse('admin:pedidos_pedido_change', args=[self.pedido.pk]),
+            datos
+        )
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, 'enviado')
+        correo = CorreoPendiente.objects.get(pedido=self.pedido)
+        self.assertEqual(correo.estado, 'pendiente')
+        self.assertEqual(ResendFalso.lotes, [])
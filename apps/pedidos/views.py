@@ -6,9 +6,9 @@ from django.contrib import messages
 from django.db import transaction
 
 from apps.carrito.carrito import Carrito
-from .models import Pedido, ItemPedido
+from .models import Pedido
 from .forms import CheckoutForm
-from .emails import enviar_confirmacion_pedido, enviar_notificacion_admin, generar_link_whatsapp
+from .emails import encolar_confirmacion_pedido, encolar_notificacion_admin, generar_link_whatsapp
 
 
 def checkout(request):
@@ -30,8 +30,9 @@ def checkout(request):
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    # Crear el pedido
-                    pedido = Pedido.objects.create(
+                    # Crear el pedido, sus items y descontar stock
+                    pedido = Pedido.crear_desde_carrito(
+                        carrito,
                         nombre=form.cleaned_data['nombre'],
                         email=form.cleaned_data['email'],
                         telefono=form.cleaned_data.get('telefono', ''),
@@ -41,39 +42,12 @@ def checkout(request):
                         notas=form.cleaned_data.get('notas', ''),
                     )
                     
-                    # Crear los items del pedido
-                    for item in carrito:
-                        presentacion = item['presentacion']
-                        
-                        # Verificar stock
-                        if item['cantidad'] > presentacion.stock:
-                            raise ValueError(
-                                f'Stock insuficiente para {presentacion.producto.nombre} - {presentacion.nombre}'
-                            )
-                        
-                        # Crear item
-                        ItemPedido.objects.create(
-                            pedido=pedido,
-                            presentacion=presentacion,
-                            producto_nombre=presentacion.producto.nombre,
-                            presentacion_nombre=presentacion.nombre,
-                            precio=item['precio'],
-                            cantidad=item['cantidad'],
-                        )
-                        
-                        # Actualizar stock
-                        presentacion.stock -= item['cantidad']
-                        presentacion.save()
-                    
-                    # Calcular total
-                    pedido.calcular_total()
-                    
                     # Limpiar carrito
                     carrito.limpiar()
                     
-                    # Enviar emails
-                    enviar_confirmacion_pedido(pedido)  # Al cliente
-                    enviar_notificacion_admin(pedido)   # Al admin
+                    # Encolar emails; los envía el comando enviar_correos
+                    encolar_confirmacion_pedido(pedido)  # Al cliente
+                    encolar_notificacion_admin(pedido)   # Al admin
                     
                     messages.success(request, f'¡Pedido {pedido.numero_pedido} creado exitosamente!')
                     return redirect('pedidos:confirmacion', numero_pedido=pedido.numero_pedido)
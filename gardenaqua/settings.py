@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 
 import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Cargar variables de entorno desde .env
@@ -115,6 +116,41 @@ DATABASES = {
 }
 
 
+# =============================================================================
+# CACHÉ
+# =============================================================================
+# En desarrollo basta con la caché en memoria. En producción la caché DEBE
+# ser compartida por todos los procesos y contenedores (web, correos e
+# imagenes): las páginas, las tarjetas y el menú de categorías se invalidan
+# cambiando una versión guardada en ella, y un cambio guardado por un worker
+# tiene que verlo Gunicorn. Se recomienda DatabaseCache sobre PostgreSQL
+# (tabla creada con 'manage.py createcachetable'), Redis o Memcached.
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'gardenaqua'),
+    }
+}
+
+# Backends de caché que no se comparten entre procesos (no válidos sin DEBUG)
+CACHES_NO_COMPARTIDAS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Tiempo máximo (segundos) que una página del catálogo se sirve desde caché.
+# Los cambios hechos con save() en los modelos del catálogo la invalidan antes.
+CACHE_PAGINAS_SEGUNDOS = int(os.environ.get('CACHE_PAGINAS_SEGUNDOS', 600))
+
+# Cada cuántos segundos un proceso comprueba en la caché si el menú de
+# categorías cambió. Entretanto lo sirve de memoria sin consultar la caché.
+CACHE_NAVEGACION_SEGUNDOS = int(os.environ.get('CACHE_NAVEGACION_SEGUNDOS', 30))
+
+
 # =============================================================================
 # VALIDACIÓN DE CONTRASEÑAS
 # =============================================================================
@@ -162,6 +198,21 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Los archivos subidos se nombran por el hash de su contenido: las copias
+# repetidas se reutilizan y sus URLs pueden cachearse de forma permanente
+STORAGES = {
+    'default': {
+        'BACKEND': 'apps.catalogo.storage.AlmacenamientoPorContenido',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Píxeles máximos que se decodifican en memoria al procesar una imagen
+# subida (los JPEG cuentan ya reducidos). 40 MP en RGBA son unos 160 MB.
+IMAGEN_PIXELES_MAXIMOS = int(os.environ.get('IMAGEN_PIXELES_MAXIMOS', 40_000_000))
+
 
 # =============================================================================
 # CONFIGURACIÓN DE CAMPO DE CLAVE PRIMARIA
@@ -204,7 +255,8 @@ SITE_DESCRIPTION = 'Tu tienda especializada en acuarios y productos para peces'
 # CONFIGURACIÓN DE CKEDITOR 5
 # =============================================================================
 
-CKEDITOR_5_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+# Las imágenes del editor se optimizan a WebP como las del catálogo
+CKEDITOR_5_FILE_STORAGE = "apps.catalogo.storage.AlmacenamientoCKEditor"
 CKEDITOR_5_UPLOAD_PATH = "ckeditor/"
 
 CKEDITOR_5_CONFIGS = {
@@ -249,6 +301,14 @@ CKEDITOR_5_CONFIGS = {
 # Configuraciones adicionales para entorno de producción
 
 if not DEBUG:
+    # La caché en memoria es propia de cada proceso: las invalidaciones
+    # no llegarían a los demás workers ni contenedores (ver CACHÉ)
+    if CACHES['default']['BACKEND'] in CACHES_NO_COMPARTIDAS:
+        raise ImproperlyConfigured(
+            f"CACHE_BACKEND={CACHES['default']['BACKEND']} no se comparte entre "
+            "procesos. En producción use DatabaseCache, Redis o Memcached."
+        )
+    
     # Seguridad HTTPS (configurables por variable de entorno)
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
     SECURE_SSL_REDIRECT = os.environ.get('SECURE_SSL_REDIRECT', 'False') == 'True'
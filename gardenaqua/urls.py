@@ -8,16 +8,21 @@ Para más información, ver:
     https://docs.djangoproject.com/en/5.2/topics/http/urls/
 """
 
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from apps.catalogo.views import media_negociada, subir_imagen_editor
 
 urlpatterns = [
     # Panel de administración
     path('admin/', admin.site.urls),
     
-    # CKEditor 5
+    # CKEditor 5 (la subida de imágenes responde los errores de tamaño)
+    path('ckeditor5/image_upload/', subir_imagen_editor, name='ck_editor_5_upload_file'),
     path('ckeditor5/', include('django_ckeditor_5.urls')),
     
     # Aplicaciones del proyecto
@@ -26,7 +31,9 @@ urlpatterns = [
     path('pedido/', include('apps.pedidos.urls', namespace='pedidos')),
 ]
 
-# Servir archivos multimedia en desarrollo
+# Servir archivos multimedia en desarrollo (eligiendo AVIF/WebP/JPEG como Nginx)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<ruta>.*)$', media_negociada),
+    ]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
@@ -0,0 +1,175 @@
+"""
+Benchmark de memoria del procesamiento de imágenes subidas.
+
+Compara el pico de memoria (RSS máximo) de convertir una imagen grande a
+WebP con el método anterior, que decodificaba la imagen completa y la
+convertía a RGB antes de reducirla, y con utils.procesar_imagen, que la
+decodifica reducida y limita los píxeles (IMAGEN_PIXELES_MAXIMOS).
+
+Cada medición se hace en un proceso nuevo, porque el RSS máximo de un
+proceso nunca baja.
+
+Uso:
+    python scripts/benchmark_imagenes.py
+    python scripts/benchmark_imagenes.py --ancho 8000 --alto 6000
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+import django
+
+# Configurar Django
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gardenaqua.settings')
+django.setup()
+
+from django.conf import settings
+from PIL import Image
+
+from apps.catalogo.utils import IMAGE_SIZES, WEBP_QUALITY, procesar_imagen
+
+
+def procesar_imagen_anterior(ruta):
+    """Convierte la imagen como lo hacía procesar_imagen antes del cambio."""
+    img = Image.open(ruta)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail(IMAGE_SIZES['full'], Image.Resampling.LANCZOS)
+    
+    buffer = BytesIO()
+    img.save(buffer, format='WEBP', quality=WEBP_QUALITY, optimize=True)
+
+
+def procesar_imagen_actual(ruta):
+    """Convierte la imagen con utils.procesar_imagen."""
+    with open(ruta, 'rb') as archivo:
+        procesar_imagen(archivo)
+
+
+def rss_maximo():
+    """
+    Retorna el RSS máximo del proceso en MB.
+    
+    En Linux se lee VmHWM de /proc, porque ru_maxrss conserva el máximo del
+    proceso padre a través de fork y exec.
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as estado:
+            for linea in estado:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def medir(funcion, ruta):
+    """
+    Ejecuta una conversión y mide la memoria del proceso.
+    
+    Returns:
+        dict: 'pico' (MB de RSS máximo), 'incremento' (MB sobre el RSS antes
+        de convertir), 'segundos' o 'error'.
+    """
+    antes = rss_maximo()
+    inicio = time.perf_counter()
+    try:
+        funcion(ruta)
+    except Exception as e:
+        return {'error': str(e)}
+    segundos = time.perf_counter() - inicio
+    pico = rss_maximo()
+    
+    return {
+        'pico': pico,
+        'incremento': pico - antes,
+        'segundos': segundos,
+    }
+
+
+def medir_en_proceso_nuevo(funcion, ruta):
+    """Mide una conversión en un proceso recién creado."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(medir, funcion, ruta).result()
+
+
+def crear_imagenes(carpeta, ancho, alto):
+    """
+    Crea las imágenes de prueba del tamaño indicado.
+    
+    Returns:
+        list: (descripción, ruta) de una foto JPEG RGB, un JPEG CMYK (como
+        las fotos de catálogo que envían algunas marcas), un PNG con
+        transparencia a la mitad de tamaño y otro a tamaño completo.
+    """
+    degradado = Image.linear_gradient('L').resize((ancho, alto))
+    ruido = Image.effect_noise((ancho, alto), 40)
+    invertido = degradado.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    alfa = Image.radial_gradient('L').resize((ancho, alto))
+    
+    foto = os.path.join(carpeta, 'foto.jpg')
+    Image.merge('RGB', (degradado, ruido, invertido)).save(foto, quality=90)
+    
+    cmyk = os.path.join(carpeta, 'cmyk.jpg')
+    Image.merge('CMYK', (degradado, ruido, invertido, ruido)).save(cmyk, quality=90)
+    
+    png = os.path.join(carpeta, 'transparente.png')
+    mitad = (ancho // 2, alto // 2)
+    Image.merge('RGBA', tuple(banda.resize(mitad) for banda in (degradado, ruido, invertido, alfa))).save(png)
+    
+    png_grande = os.path.join(carpeta, 'transparente-grande.png')
+    Image.merge('RGBA', (degradado, ruido, invertido, alfa)).save(png_grande)
+    
+    return [
+        ('JPEG RGB', foto),
+        ('JPEG CMYK', cmyk),
+        ('PNG con alfa', png),
+        ('PNG con alfa', png_grande),
+    ]
+
+
+def main():
+    """Ejecuta el benchmark e imprime los resultados."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ancho', type=int, default=8000)
+    parser.add_argument('--alto', type=int, default=6000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as carpeta:
+        imagenes = crear_imagenes(carpeta, args.ancho, args.alto)
+        
+        print(f'RSS máximo por imagen (límite: {settings.IMAGEN_PIXELES_MAXIMOS:,} píxeles)\n')
+        print(f'{"Imagen":<14}{"Método":<10}{"Pico MB":>10}{"Incremento MB":>16}{"Segundos":>10}')
+        for nombre, ruta in imagenes:
+            with Image.open(ruta) as img:
+                nombre = f'{nombre} {img.width}x{img.height}'
+            print(nombre)
+            for metodo, funcion in (('anterior', procesar_imagen_anterior), ('actual', procesar_imagen_actual)):
+                resultado = medir_en_proceso_nuevo(funcion, ruta)
+                if 'error' in resultado:
+                    print(f'{"":<14}{metodo:<10}  rechazada: {resultado["error"]}')
+                    continue
+                print(
+                    f'{"":<14}{metodo:<10}{resultado["pico"]:>10.0f}'
+                    f'{resultado["incremento"]:>16.0f}{resultado["segundos"]:>10.2f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -29,11 +29,9 @@ if filtros:
         categorias_ids.extend(subcategorias.values_list('id', flat=True))
     print(f'IDs a buscar: {categorias_ids}')
     
-    productos = Producto.objects.filter(
-        activo=True,
-        presentaciones__activo=True,
+    productos = Producto.objects.disponibles().filter(
         categoria_id__in=categorias_ids
-    ).distinct()
+    )
     print(f'Productos encontrados: {productos.count()}')
     for p in productos:
         print(f'  - {p.nombre}')
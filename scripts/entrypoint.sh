@@ -19,6 +19,10 @@ echo "✅ Base de datos lista"
 echo "📦 Ejecutando migraciones..."
 python manage.py migrate --noinput
 
+# Tabla de la caché compartida (si CACHE_BACKEND es DatabaseCache)
+echo "🗄️  Creando tabla de caché..."
+python manage.py createcachetable
+
 # Recolectar archivos estáticos
 echo "📁 Recolectando archivos estáticos..."
 python manage.py collectstatic --noinput